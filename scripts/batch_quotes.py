@@ -0,0 +1,117 @@
+import time
+from datetime import datetime
+
+from fetch_engine import EST, FetchEngine, Provider
+from response_cache import QUOTE_TTL
+from session_pool import shared_pool
+
+# Batched multi-symbol quotes from Yahoo's v7 quote endpoint.
+#
+# One request returns price, previous close, day range, volume, market cap and
+# 52-week / moving-average stats for a few hundred symbols, which is what
+# fast_info needs several requests per symbol for. Rows use the same columns as
+# latest_prices.csv. Symbols the endpoint drops are returned as `missing` so
+# the caller can fall back to per-symbol fetching. Each quote carries the time
+# it was fetched (FETCHED_AT, epoch seconds), cached ones included, and rows are
+# stamped with that rather than the time they were read.
+
+QUOTE_URL = "https://query1.finance.yahoo.com/v7/finance/quote"
+BATCH_SIZE = 200
+FETCHED_AT = '_fetched_at'
+
+# latest_prices.csv column -> v7 quote field
+QUOTE_FIELDS = {
+    'Price': 'regularMarketPrice',
+    'Type': 'quoteType',
+    'Exchange': 'exchange',
+    'Prev Close': 'regularMarketPreviousClose',
+    'Open': 'regularMarketOpen',
+    'High': 'regularMarketDayHigh',
+    'Low': 'regularMarketDayLow',
+    'Mkt Cap': 'marketCap',
+    'Vol': 'regularMarketVolume',
+    '10d Avg Vol': 'averageDailyVolume10Day',
+    '3m Avg Vol': 'averageDailyVolume3Month',
+    'Sh': 'sharesOutstanding',
+    '52w High': 'fiftyTwoWeekHigh',
+    '52w Low': 'fiftyTwoWeekLow',
+    '52w Chg': 'fiftyTwoWeekChangePercent',
+    '50d Avg': 'fiftyDayAverage',
+    '200d Avg': 'twoHundredDayAverage',
+}
+
+
+def chunk_list(lst, n):
+    for i in range(0, len(lst), n):
+        yield lst[i:i + n]
+
+
+def fetch_raw_quotes(symbols, pool=None, timeout=30):
+    pool = pool or shared_pool()
+    data = pool.get_json(QUOTE_URL, params={'symbols': ",".join(symbols), 'formatted': 'false'}, timeout=timeout)
+    results = (data.get('quoteResponse') or {}).get('result') or []
+    return {q['symbol'].upper(): q for q in results if q.get('symbol')}
+
+
+def quote_to_row(ticker, quote, timestamp):
+    row = {'Ticker': ticker}
+    for col, field in QUOTE_FIELDS.items():
+        row[col] = quote.get(field)
+    # fast_info.year_change is a fraction, the quote endpoint reports percent
+    if row['52w Chg'] is not None:
+        row['52w Chg'] = row['52w Chg'] / 100
+    row['Timestamp'] = timestamp
+    return row
+
+
+class QuoteBatchProvider(Provider):
+    name = "yahoo.v7.quote"
+
+    def __init__(self, pool=None):
+        self.pool = pool or shared_pool()
+
+    # key is a tuple of symbols, returns {ticker: raw quote} for the symbols Yahoo answered
+    def fetch(self, batch):
+        quotes = fetch_raw_quotes(batch, pool=self.pool)
+        now = time.time()
+        return {t: {**quotes[t.upper()], FETCHED_AT: now} for t in batch if t.upper() in quotes}
+
+
+# With a cache, symbols quoted within ttl are served from disk and only the rest are requested
+def fetch_quote_map(tickers, controller=None, batch_size=BATCH_SIZE, pool=None, cache=None, ttl=QUOTE_TTL):
+    quotes = {}
+    if cache is not None:
+        for t in tickers:
+            quote = cache.get("yahoo", "v7.quote", t)
+            if quote is not None:
+                quotes[t] = quote
+    remaining = [t for t in tickers if t not in quotes]
+
+    batches = [tuple(b) for b in chunk_list(remaining, batch_size)]
+    engine = FetchEngine(QuoteBatchProvider(pool=pool), concurrency=2, controller=controller,
+                         retries=3, timeout=60, desc="Batch quotes", verbose=False)
+    chunks, _ = engine.run(batches) if batches else ([], [])
+
+    for chunk in chunks:
+        quotes.update(chunk)
+        if cache is not None:
+            for t, quote in chunk.items():
+                cache.put("yahoo", "v7.quote", t, quote, ttl)
+    return quotes
+
+
+# Eastern time of the fetch; a quote cached without one counts as a full TTL old
+def quote_timestamp(quote, ttl=QUOTE_TTL):
+    return datetime.fromtimestamp(quote.get(FETCHED_AT) or time.time() - ttl, EST)
+
+
+def fetch_batch_quotes(tickers, controller=None, batch_size=BATCH_SIZE, pool=None, cache=None):
+    quotes = fetch_quote_map(tickers, controller=controller, batch_size=batch_size, pool=pool, cache=cache)
+    rows, missing = [], []
+    for ticker in tickers:
+        quote = quotes.get(ticker)
+        if quote and quote.get('regularMarketPrice') is not None:
+            rows.append(quote_to_row(ticker, quote, quote_timestamp(quote)))
+        else:
+            missing.append(ticker)
+    return rows, missing
@@ -0,0 +1,140 @@
+import asyncio
+import time
+
+# Adaptive concurrency (AIMD) shared by all fetch scripts.
+#
+# Instead of a fixed MAX_WORKERS the controller keeps a concurrency limit that
+# grows by `increase` after every healthy round (one round = `limit` finished
+# requests) and is multiplied by `decrease` whenever the provider throttles us.
+# Throttles from requests started before the last cut are ignored, so a burst
+# of 429s from one round only cuts the limit once (like TCP's once per RTT).
+# Until the first throttle the limit doubles per round (slow start) so a
+# healthy provider is found quickly.
+# At the floor a throttle pauses everyone for an escalating cooldown instead
+# of a fixed 15 minute sleep.
+
+
+class RateLimitError(Exception):
+    pass
+
+
+THROTTLE_MARKERS = ("too many requests", "rate limit", "429", "empty response")
+
+
+def is_throttle_error(error):
+    if isinstance(error, RateLimitError) or type(error).__name__ == "YFRateLimitError":
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in THROTTLE_MARKERS)
+
+
+class AIMDController:
+    def __init__(self, initial=4, minimum=1, maximum=32, increase=1.0, decrease=0.5,
+                 max_error_rate=0.2, latency_target=None, cooldown=(30, 900)):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.increase = increase
+        self.decrease = decrease
+        self.max_error_rate = max_error_rate
+        self.latency_target = latency_target
+        self.cooldown = cooldown
+
+        self.in_flight = 0
+        self.epoch = 0
+        self.latency = None  # EWMA of request latency in seconds
+        self.throttles = 0
+        self.peak = self.limit
+        self._slow_start = True
+        self._round_ok = 0
+        self._round_err = 0
+        self._cooldown_step = 0
+        self._paused_until = 0.0
+        self._cond = None
+        self._cond_loop = None
+
+    # asyncio primitives are bound to one loop; each engine run gets its own
+    def _condition(self):
+        loop = asyncio.get_running_loop()
+        if self._cond is None or self._cond_loop is not loop:
+            self._cond = asyncio.Condition()
+            self._cond_loop = loop
+        return self._cond
+
+    async def acquire(self):
+        cond = self._condition()
+        while True:
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            async with cond:
+                await cond.wait_for(lambda: self.in_flight < int(self.limit))
+                if self._paused_until <= time.monotonic():
+                    self.in_flight += 1
+                    return self.epoch, time.monotonic()
+
+    async def release(self, ticket, outcome):
+        epoch, started = ticket
+        self.in_flight -= 1
+        self.record(outcome, latency=time.monotonic() - started, epoch=epoch)
+        cond = self._condition()
+        async with cond:
+            cond.notify_all()
+
+    # outcome is 'ok', 'error' or 'throttled'
+    def record(self, outcome, latency=None, epoch=None):
+        if outcome == 'throttled':
+            self.throttles += 1
+            if epoch is None or epoch == self.epoch:
+                self._cut()
+            return
+
+        if latency is not None:
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+        if outcome == 'ok':
+            self._round_ok += 1
+            self._cooldown_step = 0
+        else:
+            self._round_err += 1
+
+        finished = self._round_ok + self._round_err
+        if finished >= int(self.limit):
+            error_rate = self._round_err / finished
+            slow = self.latency_target is not None and self.latency is not None and self.latency > self.latency_target
+            if error_rate <= self.max_error_rate and not slow:
+                grown = self.limit * 2 if self._slow_start else self.limit + self.increase
+                self.limit = min(self.maximum, grown)
+                self.peak = max(self.peak, self.limit)
+            self._round_ok = self._round_err = 0
+
+    def _cut(self):
+        at_floor = self.limit <= self.minimum
+        self.limit = max(self.minimum, self.limit * self.decrease)
+        self._slow_start = False
+        self.epoch += 1
+        self._round_ok = self._round_err = 0
+        if at_floor:
+            self._paused_until = time.monotonic() + self.cooldown_delay()
+
+    # For synchronous callers (pre-flight checks): cut the limit and return how long to wait
+    def backoff(self):
+        self.throttles += 1
+        self.limit = max(self.minimum, self.limit * self.decrease)
+        self._slow_start = False
+        self.epoch += 1
+        return self.cooldown_delay()
+
+    # Escalating wait (30s, 60s, 120s ... capped) used when even the floor is throttled
+    def cooldown_delay(self):
+        base, cap = self.cooldown
+        delay = min(cap, base * 2 ** self._cooldown_step)
+        self._cooldown_step += 1
+        return delay
+
+    def stats(self):
+        return {
+            'limit': int(self.limit),
+            'peak': int(self.peak),
+            'throttles': self.throttles,
+            'latency': round(self.latency, 3) if self.latency is not None else None,
+        }
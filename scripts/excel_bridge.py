@@ -0,0 +1,304 @@
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+
+from excel_writer import DeltaWriter, bulk_write
+
+# One long-lived process that owns the Excel connection for every script.
+#
+# Scripts used to attach to (or launch) Excel themselves on every run, and the
+# full-metrics writers left a hidden xw.App behind each time. Now they call
+# submit(sheet, df, ...), which hands the frame to the bridge over a local
+# multiprocessing connection (127.0.0.1, authenticated with a per-machine key
+# in Locks/) and returns as soon as the job is queued. The bridge keeps the
+# workbook handle between jobs and applies them one at a time on its main
+# thread (COM objects belong to the thread that created them). Jobs for the
+# same workbook + sheet coalesce while queued: a newer frame replaces the
+# pending one, so only the latest version is pushed, and waiters of the
+# replaced job are answered with the newer job's result.
+#
+# The first submit() with no bridge running starts one in the background; if
+# it can't be reached the job is written in-process instead, the old way.
+#
+#   python excel_bridge.py            run the bridge (what submit() starts)
+#   python excel_bridge.py --status   queue / throughput counters
+#   python excel_bridge.py --stop     finish the queue and exit
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.abspath(os.path.join(BASE_DIR, ".."))
+SCREENER_PATH = os.path.join(ROOT_DIR, "Screener.xlsm")
+KEY_PATH = os.path.join(ROOT_DIR, "Locks", "excel_bridge.key")
+LOG_PATH = os.path.join(ROOT_DIR, "Logs", "excel_bridge.log")
+
+ADDRESS = ('127.0.0.1', 47631)
+START_TIMEOUT = 20
+# Longest a wait=True submit blocks for its job (a full data_FullMetrics rewrite takes minutes).
+# The client gives the bridge START_TIMEOUT more to send its own timeout reply.
+WAIT_TIMEOUT = 600
+TIMEOUT_REPLY = {'ok': False, 'error': 'timeout'}
+
+
+def _authkey():
+    if not os.path.exists(KEY_PATH):
+        os.makedirs(os.path.dirname(KEY_PATH), exist_ok=True)
+        try:
+            with open(KEY_PATH, "xb") as f:
+                f.write(os.urandom(32))
+        except FileExistsError:
+            pass
+    with open(KEY_PATH, "rb") as f:
+        return f.read()
+
+
+# ---- Applying jobs to the workbook ----
+class ExcelSession:
+    def __init__(self):
+        self._books = {}
+        self._delta = {}
+
+    # The open workbook (in any running Excel), else open it, starting Excel if none is running
+    def book(self, path):
+        import xlwings as xw
+        wb = self._books.get(path)
+        if wb is not None:
+            try:
+                wb.name
+                return wb
+            except Exception:
+                # Closed by the user or Excel restarted
+                self.forget(path)
+        name = os.path.basename(path)
+        for app in xw.apps:
+            for book in app.books:
+                if book.name == name:
+                    self._books[path] = book
+                    return book
+        app = xw.apps.active if xw.apps.count else xw.App(visible=True, add_book=False)
+        wb = app.books.open(path)
+        self._books[path] = wb
+        return wb
+
+    # Drop the cached handle after a failed job; the next one looks the workbook up again
+    def forget(self, path):
+        self._books.pop(path, None)
+
+    # mode 'bulk' clears and rewrites the sheet, 'delta' writes only what changed since the last push
+    def apply(self, job):
+        wb = self.book(job['workbook'])
+        sht = wb.sheets[job['sheet']]
+        if job['mode'] == 'delta':
+            writer = self._delta.setdefault((job['sheet'], job['key']), DeltaWriter(job['sheet'], key=job['key']))
+            cells, writes, full = writer.write(sht, job['frame'])
+            result = {'cells': cells, 'writes': writes, 'full': full}
+        else:
+            result = {'rows_per_sec': bulk_write(sht, job['frame'], verbose=False)}
+        if job['save']:
+            wb.save()
+        result['rows'] = len(job['frame'])
+        return result
+
+
+# ---- Coalescing queue ----
+class Waiter:
+    def __init__(self):
+        self.event = threading.Event()
+        self.reply = None
+
+    def finish(self, reply):
+        self.reply = reply
+        self.event.set()
+
+
+class JobQueue:
+    def __init__(self):
+        self._jobs = {}
+        self._cond = threading.Condition()
+        self.coalesced = 0
+
+    # A pending job for the same workbook + sheet is replaced in place (keeping its turn)
+    def put(self, job, waiter=None):
+        key = (job['workbook'], job['sheet'])
+        job['waiters'] = [waiter] if waiter is not None else []
+        with self._cond:
+            old = self._jobs.get(key)
+            if old is not None:
+                job['save'] = job['save'] or old['save']
+                job['waiters'] = old['waiters'] + job['waiters']
+                self.coalesced += 1
+            self._jobs[key] = job
+            self._cond.notify()
+
+    def get(self, timeout=1.0):
+        with self._cond:
+            if not self._jobs and not self._cond.wait(timeout):
+                return None
+            if not self._jobs:
+                return None
+            return self._jobs.pop(next(iter(self._jobs)))
+
+    def __len__(self):
+        with self._cond:
+            return len(self._jobs)
+
+
+class ExcelBridge:
+    def __init__(self, address=ADDRESS):
+        self.address = address
+        self.queue = JobQueue()
+        self.session = ExcelSession()
+        self.stopping = threading.Event()
+        self.done = 0
+        self.failed = 0
+        self.rows = 0
+        self.started = time.time()
+
+    def stats(self):
+        return {'pending': len(self.queue), 'done': self.done, 'failed': self.failed, 'rows': self.rows,
+                'coalesced': self.queue.coalesced, 'uptime': round(time.time() - self.started)}
+
+    def _handle(self, conn):
+        try:
+            while True:
+                try:
+                    msg = conn.recv()
+                except EOFError:
+                    return
+                op = msg.get('op')
+                if op == 'write':
+                    waiter = Waiter() if msg.get('wait') else None
+                    self.queue.put(msg, waiter)
+                    if waiter is None:
+                        conn.send({'ok': True, 'queued': True})
+                    else:
+                        # On timeout the job stays queued; only this caller stops waiting for it
+                        conn.send(waiter.reply if waiter.event.wait(WAIT_TIMEOUT) else TIMEOUT_REPLY)
+                elif op == 'status':
+                    conn.send({'ok': True, **self.stats()})
+                elif op == 'stop':
+                    self.stopping.set()
+                    conn.send({'ok': True})
+                else:
+                    conn.send({'ok': False, 'error': f"Unknown op {op!r}"})
+        except (OSError, EOFError):
+            pass
+        finally:
+            conn.close()
+
+    def _accept(self, listener):
+        while not self.stopping.is_set():
+            try:
+                conn = listener.accept()
+            except Exception:
+                # Failed handshake (wrong key) or the listener closing
+                continue
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    # Runs on the main thread, which owns the COM objects
+    def serve(self):
+        listener = Listener(self.address, authkey=_authkey())
+        threading.Thread(target=self._accept, args=(listener,), daemon=True).start()
+        print(f"🌉 Excel bridge listening on {self.address[0]}:{self.address[1]}", flush=True)
+        try:
+            while not (self.stopping.is_set() and not len(self.queue)):
+                job = self.queue.get()
+                if job is None:
+                    continue
+                start = time.perf_counter()
+                try:
+                    reply = {'ok': True, **self.session.apply(job)}
+                    self.done += 1
+                    self.rows += reply['rows']
+                    print(f"✅ {job['sheet']}: {reply['rows']:,} rows ({job['mode']}) in "
+                          f"{time.perf_counter() - start:.2f}s", flush=True)
+                except Exception as e:
+                    self.failed += 1
+                    self.session.forget(job['workbook'])
+                    reply = {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+                    print(f"❌ {job['sheet']}: {reply['error']}", flush=True)
+                for waiter in job['waiters']:
+                    waiter.finish(reply)
+        finally:
+            listener.close()
+        print("👋 Excel bridge stopped", flush=True)
+
+
+# ---- Client side ----
+def _connect(address=ADDRESS):
+    try:
+        return Client(address, authkey=_authkey())
+    except (ConnectionRefusedError, OSError):
+        return None
+
+
+# The bridge's reply, or TIMEOUT_REPLY if none comes within timeout
+def _reply(conn, timeout=WAIT_TIMEOUT + START_TIMEOUT):
+    if not conn.poll(timeout):
+        return dict(TIMEOUT_REPLY)
+    return conn.recv()
+
+
+def start_bridge():
+    os.makedirs(os.path.dirname(LOG_PATH), exist_ok=True)
+    log = open(LOG_PATH, "a")
+    kwargs = {'cwd': BASE_DIR, 'stdin': subprocess.DEVNULL, 'stdout': log, 'stderr': subprocess.STDOUT}
+    if os.name == "nt":
+        kwargs['creationflags'] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs['start_new_session'] = True
+    subprocess.Popen([sys.executable, os.path.abspath(__file__)], **kwargs)
+    log.close()
+
+
+def _bridge_connection(start=True):
+    conn = _connect()
+    if conn is None and start:
+        start_bridge()
+        deadline = time.time() + START_TIMEOUT
+        while conn is None and time.time() < deadline:
+            time.sleep(0.25)
+            conn = _connect()
+    return conn
+
+
+# Queue df for sheet in the workbook. wait=True blocks until it (or a newer job for the
+# same sheet that replaced it) has been written and returns the bridge's reply.
+def submit(sheet, df, mode='bulk', workbook=SCREENER_PATH, save=False, wait=False, key='Ticker', start=True):
+    job = {'op': 'write', 'sheet': sheet, 'frame': df, 'mode': mode, 'workbook': os.path.abspath(workbook),
+           'save': save, 'wait': wait, 'key': key}
+    conn = _bridge_connection(start)
+    if conn is None:
+        print("⚠️ Excel bridge unavailable; writing in this process")
+        return {'ok': True, **ExcelSession().apply(job)}
+    with conn:
+        conn.send(job)
+        return _reply(conn)
+
+
+def _request(op):
+    conn = _connect()
+    if conn is None:
+        return None
+    with conn:
+        conn.send({'op': op})
+        return _reply(conn, START_TIMEOUT)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Long-lived Excel writer shared by the fetch scripts")
+    parser.add_argument('--status', action='store_true', help='Print the running bridge\'s counters')
+    parser.add_argument('--stop', action='store_true', help='Ask the running bridge to finish its queue and exit')
+    args = parser.parse_args()
+
+    if args.status or args.stop:
+        reply = _request('stop' if args.stop else 'status')
+        print(reply if reply is not None else "No Excel bridge running")
+    else:
+        try:
+            ExcelBridge().serve()
+        except OSError as e:
+            # Another bridge already holds the address
+            print(f"Excel bridge not started: {e}")
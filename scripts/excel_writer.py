@@ -0,0 +1,203 @@
+import os
+import pickle
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from publish import atomic_path
+from shared_limiter import _lock_file, _unlock_file
+
+# Writes of DataFrames into workbook sheets through xlwings.
+#
+# excel_values() turns a frame into what Excel should hold, column by column
+# (NaN / NaT -> empty, tz-aware datetimes -> Eastern wall time, categoricals
+# -> plain values), so nothing is converted cell by cell on the COM side.
+#
+# DeltaWriter keeps, per sheet, the values it last pushed (Source Data/Excel,
+# shared by every script writing that sheet under a file lock). A refresh
+# whose key column and header match the last push only writes the cells that
+# changed, as contiguous column runs; the sheet is cleared and rewritten only
+# when the row set itself changes or the sheet no longer looks like what was
+# pushed (another writer, a manual edit of the layout).
+#
+# bulk_write() is the path for whole tables (data_FullMetrics, ~10k x 90): the
+# values are converted once up front, then written in row chunks of about
+# CHUNK_CELLS cells as plain Python values, which xlwings hands to COM without
+# its per-cell numpy / pandas converters. Every write here runs inside
+# suspended(), with calculation on manual and screen updating and events off,
+# so the workbook recalculates once at the end instead of once per range; the
+# previous settings come back even when a write fails.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.abspath(os.path.join(BASE_DIR, ".."))
+STATE_DIR = os.path.join(ROOT_DIR, "Source Data", "Excel")
+LOCK_DIR = os.path.join(ROOT_DIR, "Locks")
+
+# Unchanged cells bridged to merge two changed runs (one COM call beats several small ones)
+RUN_GAP = 4
+# Past this fraction of changed cells one full-range write is cheaper than many runs
+DELTA_LIMIT = 0.5
+# Cells per range write in bulk writes: large enough to amortize a COM round trip,
+# small enough that one marshalled array stays a few MB
+CHUNK_CELLS = 200_000
+
+
+# Frame -> 2D object array of Excel-ready values
+def excel_values(df):
+    out = np.empty(df.shape, dtype=object)
+    for j, col in enumerate(df.columns):
+        values = df[col]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype(object)
+        if pd.api.types.is_datetime64_any_dtype(values):
+            if values.dt.tz is not None:
+                values = values.dt.tz_convert("US/Eastern").dt.tz_localize(None)
+            # pd.Timestamp is a datetime, which xlwings writes as an Excel date
+            column = values.to_numpy(dtype=object, copy=True)
+        elif pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+            column = values.to_numpy(dtype=np.float64, na_value=np.nan).astype(object)
+        else:
+            column = values.to_numpy(dtype=object, copy=True)
+        column[pd.isna(values).to_numpy()] = None
+        out[:, j] = column
+    return out
+
+
+# Calculation, events and screen updating off for the duration; restored even on error
+@contextmanager
+def suspended(app):
+    saved = (app.calculation, app.screen_updating, app.enable_events)
+    app.screen_updating = False
+    app.enable_events = False
+    app.calculation = 'manual'
+    try:
+        yield app
+    finally:
+        app.calculation, app.screen_updating, app.enable_events = saved
+
+
+# Rows of values written from first_row (1-based) down, chunk_rows rows per range write
+def write_rows(sht, values, first_row=2, chunk_rows=None):
+    chunk_rows = chunk_rows or max(1, CHUNK_CELLS // max(1, values.shape[1]))
+    writes = 0
+    for i in range(0, len(values), chunk_rows):
+        sht.range((first_row + i, 1)).value = values[i:i + chunk_rows].tolist()
+        writes += 1
+    return writes
+
+
+# Clear the sheet and write df (header in row 1); returns rows per second
+def bulk_write(sht, df, chunk_rows=None, verbose=True):
+    start = time.perf_counter()
+    values = excel_values(df)
+    with suspended(sht.book.app):
+        sht.used_range.clear_contents()
+        sht.range("A1").value = [str(c) for c in df.columns]
+        writes = write_rows(sht, values, chunk_rows=chunk_rows)
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    rate = len(df) / elapsed
+    if verbose:
+        print(f"📊 {sht.name}: {len(df):,} rows x {df.shape[1]} columns in {writes} writes, "
+              f"{elapsed:.2f}s ({rate:,.0f} rows/s)")
+    return rate
+
+
+# Changed cells between two equally shaped value arrays (None == None)
+def changed_cells(old, new):
+    old_null = pd.isna(old)
+    new_null = pd.isna(new)
+    same = (old_null & new_null) | (~old_null & ~new_null & (old == new))
+    return ~same
+
+
+# Row positions -> [(first, last)] runs, bridging gaps of up to `gap` unchanged rows
+def row_runs(rows, gap=RUN_GAP):
+    if not len(rows):
+        return []
+    breaks = np.flatnonzero(np.diff(rows) > gap + 1)
+    starts = np.concatenate([[rows[0]], rows[breaks + 1]])
+    ends = np.concatenate([rows[breaks], [rows[-1]]])
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+class DeltaWriter:
+    def __init__(self, sheet_name, key='Ticker', state_dir=STATE_DIR):
+        os.makedirs(state_dir, exist_ok=True)
+        os.makedirs(LOCK_DIR, exist_ok=True)
+        self.sheet_name = sheet_name
+        self.key = key
+        self.state_path = os.path.join(state_dir, f"{sheet_name}.pkl")
+        self.lock_path = os.path.join(LOCK_DIR, f"excel_{sheet_name}.lock")
+        self._thread_lock = threading.Lock()
+
+    def _load_state(self):
+        if not os.path.exists(self.state_path):
+            return None
+        try:
+            with open(self.state_path, "rb") as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+    def _save_state(self, state):
+        with atomic_path(self.state_path) as tmp:
+            with open(tmp, "wb") as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def forget(self):
+        if os.path.exists(self.state_path):
+            os.remove(self.state_path)
+
+    # The sheet still has the header and row count of the last push
+    def _sheet_matches(self, sht, state):
+        header = sht.range((1, 1), (1, len(state['columns']))).value
+        header = header if isinstance(header, list) else [header]
+        last_row = sht.range((sht.cells.last_cell.row, 1)).end('up').row
+        return header == state['columns'] and last_row == len(state['keys']) + 1
+
+    def _write_full(self, sht, df, values):
+        sht.used_range.clear_contents()
+        sht.range("A1").value = [str(c) for c in df.columns]
+        return write_rows(sht, values) + 1
+
+    # Push df to the sheet; returns (cells written, COM writes, full rewrite?)
+    def write(self, sht, df, full=False):
+        values = excel_values(df)
+        columns = [str(c) for c in df.columns]
+        keys = df[self.key].astype(object).tolist() if self.key in df.columns else list(range(len(df)))
+
+        with self._thread_lock, open(self.lock_path, "a+") as lock:
+            _lock_file(lock)
+            try:
+                state = None if full else self._load_state()
+                rewrite = (state is None or state['columns'] != columns or state['keys'] != keys
+                           or not self._sheet_matches(sht, state))
+                with suspended(sht.book.app):
+                    if rewrite:
+                        result = (values.size, self._write_full(sht, df, values), True)
+                    else:
+                        result = self._write_delta(sht, state['values'], values)
+                self._save_state({'columns': columns, 'keys': keys, 'values': values})
+            finally:
+                _unlock_file(lock)
+        return result
+
+    def _write_delta(self, sht, old, new):
+        changed = changed_cells(old, new)
+        n_changed = int(changed.sum())
+        if n_changed == 0:
+            return 0, 0, False
+        if n_changed > DELTA_LIMIT * new.size:
+            return new.size, write_rows(sht, new), False
+
+        cells = writes = 0
+        for j in np.flatnonzero(changed.any(axis=0)):
+            for first, last in row_runs(np.flatnonzero(changed[:, j])):
+                # Row 1 is the header; a column run is written as a vertical block
+                sht.range((first + 2, j + 1), (last + 2, j + 1)).value = new[first:last + 1, j:j + 1].tolist()
+                cells += last - first + 1
+                writes += 1
+        return cells, writes, False
@@ -3,11 +3,15 @@ import yfinance as yf
 import pandas as pd
 import time
 from tqdm import tqdm
-import shutil
 import argparse
 import os
 from datetime import datetime
 
+from freshness import EST
+from price_store import export_prices, load_prices, upsert_prices
+from sinks import Target, open_sinks
+from snapshot_log import SnapshotLog
+
 # CLI setup
 parser = argparse.ArgumentParser(description="Fetch latest stock prices.")
 parser.add_argument('--commit', action='store_true', help='Overwrite old_prices.csv with latest data')
@@ -24,8 +28,11 @@ def rel(*parts):
 SEC_JSON_PATH = rel("Source Data", "company_tickers.json")
 FAILED_LOG_PATH = rel("Logs", "latest_prices_failed_tickers.csv")
 OUTPUT_CSV_PATH = rel("Source Data", "latest_prices.csv")
-OLD_PRICES = rel("Source Data", "old_latest_prices.csv")
 FLAG_PATH = rel("Flags", f"all_prices_done_{os.getpid()}.flag")
+EXCEL_PATH = rel("Screener.xlsm")
+
+# latest_prices.csv and the data_LatestPrices sheet, unless SCREENER_SINKS names others
+SINKS = open_sinks(('csv', 'xlsx'))
 
 # Load tickers from JSON
 with open(SEC_JSON_PATH, 'r') as f:
@@ -34,6 +41,11 @@ with open(SEC_JSON_PATH, 'r') as f:
 tickers = ['APUS'] + [v['ticker'] for v in data.values()]
 total = len(tickers)
 
+# Eastern wall time, like the other price scripts: the store keeps whichever row is newer
+def get_est_timestamp():
+    return datetime.now(EST).strftime("%Y-%m-%d %H:%M:%S")
+
+
 all_prices = []
 failed = []
 
@@ -49,7 +61,7 @@ for ticker in tickers:
         all_prices.append({
             'Ticker': ticker,
             'Price': price,
-            'Timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            'Timestamp': get_est_timestamp()
         })
     except Exception as e:
         print(f"Failed for {ticker}: {e}")
@@ -61,7 +73,7 @@ for ticker in tickers:
         all_prices.append({
             'Ticker': ticker,
             'Price': None,
-            'Timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            'Timestamp': get_est_timestamp()
         })
     pbar.update(1)
     pbar.set_description(f"Scanned {pbar.n} / {total} companies")
@@ -75,40 +87,22 @@ if failed:
     fail_df.to_csv(FAILED_LOG_PATH, mode='a', index=False, header=not file_exists)
     print(f"Logged {len(failed)} failed tickers to {FAILED_LOG_PATH}")
 
-# Step 0: Load current latest prices (if any)
-if os.path.exists(OUTPUT_CSV_PATH):
-    existing_df = pd.read_csv(OUTPUT_CSV_PATH)
-else:
-    existing_df = pd.DataFrame(columns=["Ticker", "Price", "Timestamp"])
-
-existing_dict = existing_df.set_index("Ticker").to_dict("index")
-
-# Step 1: Archive existing latest_prices.csv as old_prices.csv BEFORE writing new data
-if os.path.exists(OUTPUT_CSV_PATH):
-    shutil.copyfile(OUTPUT_CSV_PATH, OLD_PRICES)
-    print(f"📦 Archived previous latest_prices.csv to old_prices.csv")
-
-# Step 2: Save merged data
-merged_rows = []
-
-for row in all_prices:
-    ticker = row["Ticker"]
-    price = row["Price"]
-    timestamp = row["Timestamp"]
-
-    if price is None and ticker in existing_dict:
-        merged_rows.append({
-            "Ticker": ticker,
-            "Price": existing_dict[ticker].get("Price"),
-            "Timestamp": existing_dict[ticker].get("Timestamp")
-        })
-    else:
-        merged_rows.append(row)
-
-# Save merged result
-df_final = pd.DataFrame(merged_rows)
-df_final.to_csv(OUTPUT_CSV_PATH, index=False)
-print(f"✅ Saved latest prices to {OUTPUT_CSV_PATH}")
+# Step 1: Versioned history of the table (replaces the old_latest_prices copy)
+SNAPSHOTS = SnapshotLog('latest_prices')
+SNAPSHOTS.seed(load_prices())
+
+# Step 2: Merge into the store; failed tickers keep their stored price and timestamp
+changed = upsert_prices(pd.DataFrame(all_prices))
+print(f"💾 Upserted {changed} of {len(all_prices)} rows")
+# The store's own Parquet export; the CSV and the sheet go out through the sinks
+df_final = export_prices(csv=False)
+results = SINKS.publish(Target('latest_prices', csv=OUTPUT_CSV_PATH, sheet='data_LatestPrices', workbook=EXCEL_PATH,
+                               mode='delta', wait=True), df_final)
+reply = results.get('xlsx')
+if isinstance(reply, dict):
+    print(f"📊 data_LatestPrices: {reply['cells']} cells in {reply['writes']} writes{' (full rewrite)' if reply['full'] else ''}")
+run, cells, keyframe = SNAPSHOTS.record(df_final)
+print(f"🗃️ Snapshot run {run}: {cells} cells{' (keyframe)' if keyframe else ' changed'}")
 
 # Write the flag LAST, after everything is done
 with open(FLAG_PATH, "w") as f:
@@ -1,8 +1,23 @@
 import os.path
-import yfinance as yf
+import argparse
+from datetime import datetime, timedelta
 import pandas as pd
-from tqdm import tqdm
-import time
+from concurrency import AIMDController
+from fetch_engine import FetchEngine
+from freshness import EST
+from history_store import append_history, compact, last_bars
+from minute_panel import extend_panel
+from price_store import load_prices
+from providers import HistoryBatchProvider
+from session_pool import shared_pool
+from shared_limiter import shared_limiter
+
+# CLI setup
+parser = argparse.ArgumentParser(description="Fetch 1m history into the consolidated history store.")
+parser.add_argument('--full', action='store_true', help='Refetch the whole 7 day window instead of only bars newer than the last stored one')
+parser.add_argument('--batch-size', type=int, default=50, help='Tickers per yf.download call')
+parser.add_argument('--concurrency', type=int, default=4, help='Most batches in flight at once')
+args = parser.parse_args()
 
 # Set up file paths, mostly not used, but generally useful
 SCRIPT_DIR = os.path.abspath(os.path.dirname(__file__))
@@ -17,24 +32,82 @@ SOUND = os.path.join(SOUND_DIR, "success_jingle.wav")
 FILTERED_TICKERS_PATH = os.path.join(SRC_DIR, "filtered_tickers.csv")
 LATEST_PRICES_PATH = os.path.join(SRC_DIR, "latest_prices.csv")
 
-# Read in Ticker list from latest_prices.csv
-tickers = pd.read_csv(LATEST_PRICES_PATH)
-tickers = tickers['Ticker'].tolist()
-
-# Create the iterable function to get OHLC data
-def fetch_and_save_history(ticker):
-    data = yf.Ticker(ticker).history(period="7d", interval="1m")
-    data = pd.DataFrame(data)
-    data.reset_index(inplace=True)
-    data = data[['Datetime', 'Volume', 'Open', 'High', 'Low', 'Close', 'Dividends', 'Stock Splits']]
-    data.rename(columns={'Datetime': "Date"}, inplace=True)
-
-    FILE = os.path.join(HIST_DIR, f"{ticker}_history.csv")
-    data.to_csv(FILE)
-    #print(data)
-
-with tqdm(tickers, desc="Processing", ncols=200) as pbar:
-    for ticker in tickers:
-        pbar.set_description(f"{ticker}")
-        fetch_and_save_history(ticker)
-        pbar.update(1)
+# yf.download reuses one pooled keep-alive session
+shared_pool(size=1)
+# Machine-wide request budget / circuit breaker shared with the other fetch scripts (one token per symbol)
+LIMITER = shared_limiter()
+# Batches in flight adapt between 1 and --concurrency; throttles cut it
+CONTROLLER = AIMDController(initial=min(2, args.concurrency), maximum=args.concurrency)
+
+# Read in Ticker list from the latest prices store
+tickers = load_prices(['Ticker'])['Ticker'].tolist()
+
+# Bars are appended to the consolidated store (history_store.py) every FLUSH_EVERY tickers
+FLUSH_EVERY = 100
+# Yahoo serves 1m bars for the last 7 days; older stored bars need a full window fetch
+WINDOW = timedelta(days=7)
+
+# Incremental mode: only bars from the newest stored one onwards. The boundary
+# bar (possibly still forming when stored) is fetched again and the store keeps
+# the newer copy.
+last_stored = pd.Series(dtype='datetime64[ns, US/Eastern]') if args.full else last_bars(tickers)
+now = datetime.now(EST)
+
+# yf.download takes one start per call, so batches share one: tickers needing the
+# whole window go together, incremental ones are sorted by their newest stored
+# bar so each batch's earliest start refetches little
+def plan_batches(tickers, size):
+    last = last_stored.reindex(pd.Index(tickers).drop_duplicates())
+    full = last.isna() | (now - last >= WINDOW)
+    batches = []
+    window = list(last.index[full])
+    for i in range(0, len(window), size):
+        batches.append((None, tuple(window[i:i + size])))
+    incremental = last[~full].sort_values()
+    for i in range(0, len(incremental), size):
+        chunk = incremental.iloc[i:i + size]
+        batches.append((chunk.min(), tuple(chunk.index)))
+    return batches
+
+pending = []
+pending_tickers = 0
+touched = set()
+new_bars = 0
+missing = []
+
+# Each finished batch is split per ticker, trimmed to bars from that ticker's last stored
+# one, and buffered; the store gets one append per FLUSH_EVERY tickers
+def on_batch(batch, bars, fail):
+    global pending, pending_tickers, new_bars
+    if bars is None:
+        missing.extend(batch[1])
+        return
+    last = bars['Ticker'].map(last_stored)
+    bars = bars[last.isna() | (pd.to_datetime(bars['Date'], utc=True) >= last)]
+    missing.extend(set(batch[1]) - set(bars['Ticker']))
+    pending.append(bars)
+    pending_tickers += len(batch[1])
+    new_bars += len(bars)
+    if pending_tickers >= FLUSH_EVERY:
+        touched.update(append_history(pd.concat(pending, ignore_index=True)))
+        pending, pending_tickers = [], 0
+
+batches = plan_batches(tickers, args.batch_size)
+print(f"Incremental: {len(last_stored)} of {len(tickers)} tickers have stored bars" if not args.full else "Full 7 day refetch")
+print(f"📦 {len(batches)} batches of up to {args.batch_size} tickers, at most {args.concurrency} in flight")
+engine = FetchEngine(HistoryBatchProvider(), controller=CONTROLLER, retries=3, timeout=300, backoff=(5, 10),
+                     desc="Batches", limiter=LIMITER)
+_, failed_batches = engine.run(batches, on_result=on_batch, keep_rows=False)
+
+if pending:
+    touched.update(append_history(pd.concat(pending, ignore_index=True)))
+if missing:
+    print(f"⚠️ No bars for {len(missing)} tickers ({len(failed_batches)} batches failed after retries)")
+
+# Fold this run's part files into one file per date
+compact(sorted(touched))
+print(f"✅ Stored {new_bars} 1m bars for {len(tickers)} tickers across {len(touched)} dates")
+
+# Keep the memory-mapped minute panel in step with the store
+n_days, n_tickers = extend_panel()
+print(f"🧮 Minute panel: +{n_days} days, +{n_tickers} tickers")
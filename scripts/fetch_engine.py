@@ -0,0 +1,195 @@
+import asyncio
+import argparse
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pytz
+from tqdm import tqdm
+
+from concurrency import AIMDController, RateLimitError, is_throttle_error
+from shared_limiter import shared_limiter
+
+# Shared async fetch engine used by every fetch script.
+#
+# A provider knows how to turn one key (usually a ticker) into a row. The engine
+# takes care of concurrency (through an AIMDController), per-request timeouts and
+# retry backoff, so backoff waits never park a worker thread with time.sleep.
+# Every request also goes through the machine-wide limiter (shared_limiter.py)
+# so concurrent scripts share one request budget and one circuit breaker.
+
+EST = pytz.timezone("US/Eastern")
+
+
+def get_est_timestamp():
+    return datetime.now(EST).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class Provider:
+    # Subclasses implement fetch(key) (blocking, runs in a worker thread) or
+    # override afetch(key) directly when they are natively async.
+    name = "provider"
+
+    def fetch(self, key):
+        raise NotImplementedError
+
+    # Requests one key costs against the shared limiter (a batch key costs one per symbol)
+    def cost(self, key):
+        return 1
+
+    async def afetch(self, key):
+        return await asyncio.get_running_loop().run_in_executor(None, self.fetch, key)
+
+    # Row kept in the results when every attempt failed (None = drop it)
+    def failed_row(self, key):
+        return None
+
+    def failure_record(self, key, error):
+        return {'Ticker': key, 'Reason': str(error), 'When': get_est_timestamp()}
+
+
+class FetchEngine:
+    # Pass a shared controller to adapt concurrency; otherwise it adapts between 1 and `concurrency`.
+    # limiter defaults to the machine-wide shared limiter; False disables it (offline benchmarks)
+    def __init__(self, provider, concurrency=5, controller=None, retries=3, timeout=20, max_total_wait=None,
+                 backoff=(1.5, 3.5), desc="Fetching", verbose=True, limiter=None):
+        self.provider = provider
+        self.controller = controller or AIMDController(initial=concurrency, maximum=concurrency)
+        self.limiter = shared_limiter() if limiter is None else limiter
+        self.retries = retries
+        self.timeout = timeout
+        self.max_total_wait = max_total_wait
+        self.backoff = backoff
+        self.desc = desc
+        self.verbose = verbose
+
+    def _log(self, msg):
+        if self.verbose:
+            tqdm.write(msg)
+
+    async def _fetch_one(self, key):
+        start_time = time.monotonic()
+        for attempt in range(1, self.retries + 1):
+            # Only hold a slot while a request is in flight, never while backing off
+            ticket = await self.controller.acquire()
+            outcome = 'error'
+            try:
+                if self.limiter:
+                    await self.limiter.aacquire(self.provider.cost(key))
+                row = await asyncio.wait_for(self.provider.afetch(key), self.timeout)
+                outcome = 'ok'
+                return row, None
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    e = TimeoutError(f"Timed out after {self.timeout}s")
+                if is_throttle_error(e):
+                    outcome = 'throttled'
+                elapsed = time.monotonic() - start_time
+                out_of_time = self.max_total_wait is not None and elapsed > self.max_total_wait
+                if out_of_time or attempt == self.retries:
+                    self._log(f"❌ {key}: {e} (after {elapsed:.1f}s)")
+                    return self.provider.failed_row(key), self.provider.failure_record(key, e)
+                wait = random.uniform(*self.backoff) * attempt
+                self._log(f"⚠️ {key}: retry {attempt}, waiting {wait:.1f}s")
+            finally:
+                await self.controller.release(ticket, outcome)
+                if self.limiter:
+                    self.limiter.record(outcome)
+            await asyncio.sleep(wait)
+
+    # keep_rows=False hands rows to on_result only (large per-key frames streamed to a store)
+    async def run_async(self, keys, on_result=None, keep_rows=True):
+        loop = asyncio.get_running_loop()
+        # Blocking providers run in this pool; size it to the controller's ceiling
+        # instead of the CPU-based default so the controller is the only bound.
+        executor = ThreadPoolExecutor(max_workers=max(1, self.controller.maximum))
+        loop.set_default_executor(executor)
+
+        rows, failures = [], []
+
+        async def worker(key):
+            row, fail = await self._fetch_one(key)
+            return key, row, fail
+
+        try:
+            tasks = [asyncio.ensure_future(worker(k)) for k in keys]
+            with tqdm(total=len(tasks), desc=self.desc) as pbar:
+                for next_done in asyncio.as_completed(tasks):
+                    key, row, fail = await next_done
+                    if row is not None and keep_rows:
+                        rows.append(row)
+                    if fail:
+                        failures.append(fail)
+                    if on_result is not None:
+                        on_result(key, row, fail)
+                    pbar.set_postfix(workers=int(self.controller.limit), refresh=False)
+                    pbar.update(1)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        return rows, failures
+
+    def run(self, keys, on_result=None, keep_rows=True):
+        return asyncio.run(self.run_async(list(keys), on_result=on_result, keep_rows=keep_rows))
+
+
+def run_fetch(keys, provider, **kwargs):
+    return FetchEngine(provider, **kwargs).run(keys)
+
+
+# ---- Offline mock provider for throughput testing ----
+# rate_limit simulates a provider that answers 429 once more than rate_limit
+# requests arrive within one second.
+class MockProvider(Provider):
+    name = "mock"
+
+    def __init__(self, latency=0.2, jitter=0.1, failure_rate=0.0, rate_limit=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.rate_limit = rate_limit
+        self.calls = 0
+        self.throttled = 0
+        self._window_start = 0.0
+        self._window_calls = 0
+
+    async def afetch(self, key):
+        self.calls += 1
+        if self.rate_limit is not None:
+            now = time.monotonic()
+            if now - self._window_start >= 1.0:
+                self._window_start, self._window_calls = now, 0
+            self._window_calls += 1
+            if self._window_calls > self.rate_limit:
+                self.throttled += 1
+                await asyncio.sleep(self.latency / 4)
+                raise RateLimitError("429 Too Many Requests")
+        await asyncio.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+        if random.random() < self.failure_rate:
+            raise Exception("Mock failure")
+        return {'Ticker': key, 'Price': round(random.uniform(1, 500), 2), 'Timestamp': get_est_timestamp()}
+
+
+def benchmark(n, concurrency, max_concurrency, latency, failure_rate, rate_limit):
+    provider = MockProvider(latency=latency, failure_rate=failure_rate, rate_limit=rate_limit)
+    controller = AIMDController(initial=concurrency, maximum=max_concurrency, cooldown=(1, 10))
+    engine = FetchEngine(provider, controller=controller, retries=5, backoff=(0.05, 0.1), limiter=False,
+                         desc="Mock fetch", verbose=False)
+    start = time.perf_counter()
+    rows, failures = engine.run([f"T{i:05d}" for i in range(n)])
+    elapsed = time.perf_counter() - start
+    print(f"✅ {len(rows)} rows | ❌ {len(failures)} failed | {provider.calls} calls "
+          f"({provider.throttled} throttled) in {elapsed:.2f}s ({n / elapsed:,.0f} tickers/s)")
+    print(f"📈 Controller: {controller.stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the fetch engine against the offline mock provider.")
+    parser.add_argument('--tickers', type=int, default=10000)
+    parser.add_argument('--concurrency', type=int, default=4, help='Starting concurrency')
+    parser.add_argument('--max-concurrency', type=int, default=256)
+    parser.add_argument('--latency', type=float, default=0.2, help='Mean simulated request latency in seconds')
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit', type=int, default=None, help='Simulated provider limit in requests/sec')
+    args = parser.parse_args()
+    benchmark(args.tickers, args.concurrency, args.max_concurrency, args.latency, args.failure_rate, args.rate_limit)
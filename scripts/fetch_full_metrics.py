@@ -3,24 +3,42 @@ from tqdm import tqdm
 import numpy as np
 import requests
 from collections import defaultdict
-import random
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
 import pytz
 from datetime import datetime, timedelta
 import yfinance as yf
 import sys
-import platform
-import winsound
-import xlwings as xw
 import os
 import sys
+import argparse
 from curl_cffi import requests
+from batch_quotes import fetch_quote_map
+from concurrency import AIMDController
+from fetch_engine import FetchEngine
+from notify import beep, play_sound
+from providers import InfoProvider, fetch_info
+from publish import publish_csv
+from response_cache import shared_cache
+from row_journal import RowJournal
+from schema import RENAME_MAP, read_table
+from session_pool import shared_pool
+from sinks import Target, open_sinks
+from symbol_table import shared_symbols
+from refresh_tiers import (category_ttls, load_ledger, save_ledger, stamp, plan_refresh,
+                           quote_info_frame, merge_tiered, recalc_quote_dependent, QUOTE_COLUMN)
 
 # Change working dir to the folder of the script so relative paths work
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
 print(f"Current working dir: {os.getcwd()}", file=sys.stderr)
 
+# CLI setup
+parser = argparse.ArgumentParser(description="Fetch full metrics for the SEC universe.")
+parser.add_argument('--tiered', action='store_true',
+                    help='Only refetch tickers whose dictionary.csv categories have expired (see refresh_tiers.CATEGORY_TTL) and merge into full_metrics.csv')
+parser.add_argument('--no-cache', action='store_true', help='Ignore the on-disk response cache and fetch everything from Yahoo')
+parser.add_argument('--fresh', action='store_true', help='Discard the row journal of an interrupted run instead of resuming it')
+args = parser.parse_args()
+
 
 # Set timestamps to EST (Market Time)
 def get_est_timestamp():
@@ -43,6 +61,8 @@ SEC_CSV_PATH = rel("Source Data", "sec_company_list.csv")
 DICT_CSV_PATH = rel("Source Data", "dictionary.csv")
 FAILED_LOG_PATH = rel("Logs", "full_metrics_failed_tickers.csv")
 OUTPUT_CSV_PATH = rel("Source Data", "full_metrics.csv")
+REFRESH_LEDGER_PATH = rel("Source Data", "full_metrics_refresh.csv")
+JOURNAL_PATH = rel("Source Data", "full_metrics_journal.jsonl")
 SPLITS_FOLDER = rel("Source Data", "Splits")
 FLAG_PATH = rel("Flags", "full_metrics.flag")
 PRIVATE_PATH = rel("Source Data", "private_list.csv")
@@ -65,8 +85,19 @@ with open(SEC_JSON_PATH, "w") as f:
     f.write(response.text)
 print("Downloaded and saved company_tickers.json")
 
-#NUM_SESSIONS = 5
-#session_pool = [requests.Session(impersonate="chrome") for _ in range(NUM_SESSIONS)]
+# Pooled Yahoo sessions: TLS + cookie/crumb negotiated once per session, not per ticker
+NUM_SESSIONS = 5
+POOL = shared_pool(size=NUM_SESSIONS)
+# On-disk get_info cache: re-runs and transform tweaks within 12h read it instead of the API
+CACHE = None if args.no_cache else shared_cache()
+# Output tables go to the full-metrics CSV and data_ sheet unless SCREENER_SINKS says otherwise
+SINKS = open_sinks(('csv', 'xlsx'))
+# Completed rows are journaled as they finish; an interrupted run resumes from here
+JOURNAL = RowJournal(JOURNAL_PATH)
+if args.fresh:
+    JOURNAL.reset()
+elif JOURNAL.exists():
+    print(f"♻️ Resuming interrupted run: {len(JOURNAL)} tickers already journaled")
 
 
 data = response.json()
@@ -82,9 +113,13 @@ df = df.dropna(subset=['Ticker'])
 df["CIK"] = df["CIK"].astype(str).str.zfill(10)
 
 # Save SEC company list CSV
-df.to_csv(SEC_CSV_PATH, index=False)
+publish_csv(df, SEC_CSV_PATH, index=False)
 print(f"✅ Saved {len(df)} tickers from SEC to CSV")
 
+# Stable integer IDs (CIK-based where the SEC list has one) key the joins below
+SYMBOLS = shared_symbols()
+df['ID'] = SYMBOLS.assign(df['Ticker'], df['CIK'])
+
 # Read back all CSV's
 csv_paths = [
     SEC_CSV_PATH,
@@ -98,7 +133,7 @@ csv_paths = [
 dfs = []
 for path in csv_paths:
     if os.path.exists(path):
-        tmp_df = pd.read_csv(path)
+        tmp_df = read_table(path)
         if 'Ticker' in tmp_df.columns:
             tmp_df['Ticker'] = tmp_df['Ticker'].astype(str).str.upper()
             dfs.append(tmp_df)
@@ -115,6 +150,8 @@ print(f"Combined tickers from all sources: {len(combined_df)} unique tickers")
 
 # Create final ticker list
 tickers = combined_df['Ticker'].dropna().unique()
+SYMBOLS.assign(tickers)
+ticker_set = set(tickers)
 
 
 
@@ -141,81 +178,71 @@ tickers = combined_df['Ticker'].dropna().unique()
 
 
 
+# Adaptive concurrency shared by the retries, the pre-flight check and the main fetch.
+# Grows while Yahoo keeps answering and backs off on 429s / empty get_info responses.
+CONTROLLER = AIMDController(initial=2, maximum=16)
+
 # --- *** ADDED: Retry previously failed tickers first *** ---
 if os.path.exists(FAILED_LOG_PATH):
     failed_df = pd.read_csv(FAILED_LOG_PATH)
     failed_tickers = failed_df['Ticker'].dropna().unique().tolist()
-    # Filter to only tickers still in the SEC list
-    failed_tickers = [t for t in failed_tickers if t in tickers]
+    # Filter to only tickers still in the SEC list (and not already journaled by an interrupted run)
+    journaled = JOURNAL.completed()
+    failed_tickers = [t for t in failed_tickers if t in ticker_set and t not in journaled]
     print(f"Retrying {len(failed_tickers)} previously failed tickers...")
 else:
     failed_tickers = []
 
 def retry_failed_tickers(failure_list, max_retries=3):
-    recovered_rows = []
-    final_failures = []
-
-    for ticker in tqdm(failure_list, desc="🔁 Retrying failed tickers"):
-        for attempt in range(1, max_retries + 1):
-            try:
-                info = yf.Ticker(ticker).get_info()
-                if info:
-                    row = {"Ticker": ticker, "Timestamp": get_est_timestamp()}
-                    # Flatten dict: only keep str, int, float, bool, None
-                    for k, v in info.items():
-                        if isinstance(v, (str, int, float, bool)) or v is None:
-                            row[k] = v
-                    recovered_rows.append(row)
-                    tqdm.write(f"✅ Recovered {ticker} on attempt {attempt}")
-                    break
-            except Exception as e:
-                if attempt == max_retries:
-                    tqdm.write(f"❌ {ticker} failed: {e}")
-                    final_failures.append({"Ticker": ticker, "Error": str(e)})
-                else:
-                    time.sleep(0.5 * (2 ** (attempt - 1)))
+    # Accepts plain tickers (failed log) or failure dicts (main fetch)
+    retry_tickers = [f['Ticker'] if isinstance(f, dict) else f for f in failure_list]
+    engine = FetchEngine(InfoProvider(cache=CACHE), controller=CONTROLLER, retries=max_retries,
+                         backoff=(0.5, 1.0), desc="🔁 Retrying failed tickers")
+    rows, final_failures = engine.run(retry_tickers)
+
+    # Failed tickers come back as Ticker/Timestamp stubs, keep only real recoveries
+    still_failed = {f['Ticker'] for f in final_failures}
+    recovered_rows = [row for row in rows if row['Ticker'] not in still_failed]
+    for row in recovered_rows:
+        tqdm.write(f"✅ Recovered {row['Ticker']}")
     return recovered_rows, final_failures
 
 recovered_rows, final_failures = retry_failed_tickers(failed_tickers, max_retries=3)
 
-# Initialize results list starting with recovered failed tickers (so they’re not lost)
-results = recovered_rows.copy()
+# Journal recovered failed tickers first (so they’re not lost)
+JOURNAL.extend(recovered_rows)
 
 
 
 
 # Exclude recovered tickers from main fetch (already got fresh data for those)
-recovered_tickers = [row['Ticker'] for row in recovered_rows]
+recovered_tickers = {row['Ticker'] for row in recovered_rows}
 tickers_to_fetch = [t for t in tickers if t not in recovered_tickers]
+
+# Tiered mode: full get_info only where a category expired, batch quotes for daily trading fields
+quote_tickers = []
+if args.tiered:
+    now = get_est_timestamp()
+    ttls = category_ttls(DICT_CSV_PATH)
+    ledger = load_ledger(REFRESH_LEDGER_PATH, ttls)
+    if os.path.exists(OUTPUT_CSV_PATH):
+        existing_final = read_table(OUTPUT_CSV_PATH)
+    else:
+        existing_final = pd.DataFrame(columns=['Ticker'])
+    latest_qtr = None
+    if 'Latest Qtr' in existing_final.columns:
+        latest_qtr = pd.to_datetime(existing_final.set_index('Ticker')['Latest Qtr'], errors='coerce').dt.tz_localize('US/Eastern')
+        latest_qtr = latest_qtr[~latest_qtr.index.duplicated(keep='last')]
+    tickers_to_fetch, quote_tickers = plan_refresh(ledger, tickers_to_fetch, ttls, now, latest_qtr)
+    print(f"🗂️ Tiered refresh: {len(tickers_to_fetch)} full, {len(quote_tickers)} quote-only, "
+          f"{len(tickers) - len(tickers_to_fetch) - len(quote_tickers)} still fresh")
+
+# Skip tickers an interrupted run already completed
+completed = JOURNAL.completed()
+tickers_to_fetch = [t for t in tickers_to_fetch if t not in completed]
+
 print(f"Will fetch {len(tickers_to_fetch)} fresh tickers.")
 
-# ---- BATCHED yfinance fetch ----
-def fetch_ticker_info(ticker, retries=3, max_total_wait=15):
-    start_time = time.time()
-    for attempt in range(1, retries + 1):
-        try:
-            info = yf.Ticker(ticker).get_info()
-            if not info:
-                raise Exception("Empty response (possible rate limit)")
-
-            # Flatten dict into row
-            row = {'Ticker': ticker, 'Timestamp': get_est_timestamp()}
-            for k, v in info.items():
-                # Optionally filter out nested dicts/lists you don't want
-                if isinstance(v, (str, int, float, bool)) or v is None:
-                    row[k] = v
-                # Otherwise skip nested dict/list for now
-            return row, None
-        except Exception as e:
-            elapsed = time.time() - start_time
-            if elapsed > max_total_wait or attempt == retries:
-                tqdm.write(f"❌ {ticker}: {e} (after {elapsed:.1f}s)")
-                row = {'Ticker': ticker, 'Timestamp': get_est_timestamp()}
-                return row, {'Ticker': ticker, 'Error': str(e)}
-            else:
-                wait = random.uniform(1.5, 3.5) * attempt
-                tqdm.write(f"⚠️ {ticker}: retry {attempt}, waiting {wait:.1f}s")
-                time.sleep(wait)
 def countdown_timer(seconds):
     for remaining in range(seconds, 0, -1):
         mins, secs = divmod(remaining, 60)
@@ -224,20 +251,14 @@ def countdown_timer(seconds):
         time.sleep(1)
     print("\r✅ Retry time reached!                 ")
 
-def beep():
-    if platform.system() == "Windows":
-        import winsound
-        winsound.Beep(1000, 500)
-    else:
-        print("\a", end="")  # System bell (may or may not work depending on terminal)
 
-def preflight_test(tickers=['AAPL', 'MSFT', 'APUS'], max_retries=3, wait_minutes=15):
+def preflight_test(tickers=['AAPL', 'MSFT', 'APUS'], max_retries=6):
     for attempt in range(1, max_retries + 1):
         print(f"🔎 Pre-flight test attempt {attempt} for tickers: {tickers}")
         failures = []
         for ticker in tickers:
             try:
-                info = yf.Ticker(ticker).get_info()
+                info = fetch_info(ticker, pool=POOL)
                 if info and info != {}:
                     print(f"✅ {ticker} fetch successful. Proceeding with full fetch.")
                     return True
@@ -249,8 +270,9 @@ def preflight_test(tickers=['AAPL', 'MSFT', 'APUS'], max_retries=3, wait_minutes
 
         if len(failures) == len(tickers):  # both/all tickers failed
             if attempt < max_retries:
-                wait_time = wait_minutes * 60
-                print(f"⏳ Both failed. Waiting {wait_minutes} minutes before retrying pre-flight test...")
+                # Escalating cooldown (30s, 1m, 2m ... 15m) instead of a flat 15 minute wait
+                wait_time = int(CONTROLLER.backoff())
+                print(f"⏳ All failed. Waiting {wait_time}s before retrying pre-flight test...")
                 countdown_timer(wait_time)
                 beep()
             else:
@@ -265,37 +287,28 @@ if not preflight_test():
     exit(1)
 
 
-MAX_WORKERS = 1
-first_failures = []
-success_count = 0
-fail_count = 0
-
-with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-    futures = {executor.submit(fetch_ticker_info, t): t for t in tickers_to_fetch}
-
-    with tqdm(total=len(futures), desc="Multithreaded Fetch") as pbar:
-        for future in as_completed(futures):
-            row, fail = future.result()
-            results.append(row)
-            if fail:
-                first_failures.append(fail)
-                fail_count += 1
-            else:
-                success_count += 1
-            pbar.update(1)
+# ---- Async yfinance fetch (failed tickers keep a Ticker/Timestamp stub row) ----
+engine = FetchEngine(InfoProvider(cache=CACHE), controller=CONTROLLER, retries=3, max_total_wait=15, desc="Async Fetch")
+rows, first_failures = engine.run(tickers_to_fetch, on_result=JOURNAL.on_result)
+fail_count = len(first_failures)
+success_count = len(tickers_to_fetch) - fail_count
 
 print(f"\n✅ Done! Fetched: {success_count} | ❌ Failed: {fail_count} | Total requested: {len(tickers_to_fetch)}")
-print(f"Total results length (including skipped + recovered): {len(results)}")
+print(f"🗄️ Cache: {CACHE.stats() if CACHE else 'off'}")
+print(f"📈 Concurrency: {CONTROLLER.stats()} | 🔌 Sessions: {POOL.metrics()}")
+print(f"Journaled rows (including resumed + recovered): {len(JOURNAL)}")
 
 # Retry logic for failed tickers from this main fetch
 recovered_rows_2, final_failures = retry_failed_tickers(first_failures, max_retries=3)
-results.extend(recovered_rows_2)
-
-# Create output df, drop duplicates keeping last (favoring recovered/new data)
-output_df = pd.DataFrame(results).drop_duplicates(subset="Ticker", keep="last")
+JOURNAL.extend(recovered_rows_2)
+JOURNAL.close()
 
-# Merge with SEC info df to keep all company metadata
-df_merged = pd.merge(output_df, df, on='Ticker', how='left')
+# Quote-only refresh of the daily trading fields (hundreds of tickers per request)
+quote_updates = None
+if quote_tickers:
+    quotes = fetch_quote_map(quote_tickers, controller=CONTROLLER, pool=POOL, cache=CACHE)
+    quote_updates = quote_info_frame(quotes)
+    print(f"📦 Quote refresh: {len(quote_updates)} of {len(quote_tickers)} tickers")
 
 # Log remaining failures if any
 if final_failures:
@@ -308,23 +321,11 @@ else:
     print("🎉 All tickers recovered after retries!")
 
 print("\n🔍 df columns:", df.columns.tolist())
-print("🔍 output_df columns:", output_df.columns.tolist())
 print("🧪 df Ticker dtype:", df['Ticker'].dtype)
-print("🧪 output_df Ticker dtype:", output_df['Ticker'].dtype)
 
 # Rename columns with short names
 #df_merged.rename(columns=short_name_map, inplace=True)
 
-# Date conversion for selected columns
-for col in ['Split Date', 'FY End', 'Next FY', 'Latest Qtr']:
-    if col in df_merged.columns:
-        try:
-            df_merged[col] = pd.to_numeric(df_merged[col], errors='coerce')
-            df_merged.loc[~np.isfinite(df_merged[col]), col] = np.nan
-            df_merged[col] = pd.to_datetime(df_merged[col], unit='s', errors='coerce').dt.strftime('%Y-%m-%d')
-        except Exception as e:
-            print(f"⚠️ Error parsing column {col}: {e}")
-
 # Calculated fields helper
 def add_calculated_fields(df):
     def safe_div(x, y):
@@ -352,33 +353,59 @@ def add_calculated_fields(df):
     return df
 
 
-def write_to_excel(df, workbook_path, sheet_name="data_FullMetrics"):
-    app = xw.App(visible=False)
-    wb = xw.Book(workbook_path)
-    sht = wb.sheets[sheet_name]
-
-    sht.used_range.clear_contents()
 
-    # Start writing at A2 (headers), data below
-    sht.range("A1").value = df.columns.tolist()
-    sht.range("A2").value = df.values
 
-    wb.save()
 
+# get_info key -> column name (shared with the typed loaders in schema.py)
+rename_map = RENAME_MAP
 
+ordered_columns = ['Ticker', 'Name', 'CIK', 'Industry', 'Sector', 'Country', 'State', 'Employees', 'Type', 'Exchange', 'Prev Close', 'Open', 'Low', 'High', 'Vol', 'Beta', '52w Low', '52w High', '52w % Chg', 'Mkt Cap', 'EV', 'Sh', 'Float', 'Short Int', 'Short Int PM', 'Quick R', 'Curr R', 'Cash', 'Debt', 'Net Debt', 'D/E', 'D/EBITDA', 'Rev', 'Gr P', 'EBITDA', 'Op P', 'Net Inc', 'ROA', 'ROE', 'EPS (TTM)', 'EPS (FWD)', 'Gr M', 'EBITDA M', 'Op M', 'Net Inc M', 'Op CF', 'FCF', 'Op CF M', 'FCF M', 'EPS Gr %', 'EPS Qtr Gr %', 'Rev Gr %', 'Rev/Sh', 'FCF/Sh', 'Cash/Sh', 'BV/Sh', 'P/E (TTM)', 'P/E (FWD)', 'P/S (TTM)', 'P/B', 'PEG R', 'EV/Rev', 'EV/FCF', 'EV/EBITDA', 'Div Rate', 'Div Yield', 'Target Low', 'Target High', 'Target Mean', 'Target Median', 'Avg Rating', 'Rec', 'Analysts', '50d Avg', '50d Chg', '50d % Chg', '200d Avg', '200d Chg', '200d % Chg', 'Split', 'Split Date', 'Audit Risk', 'Board Risk', 'SH Rights Risk', 'Comp Risk', 'Total Risk', 'Insider %', 'Inst %', 'FY End', 'Next FY', 'Latest Qtr']
 
+# Journal chunk -> final rows (every step is per row, so chunks transform independently)
+def transform_chunk(output_df):
+    # Merge with SEC info df to keep all company metadata (integer join on instrument ID)
+    output_df['ID'] = SYMBOLS.ids(output_df['Ticker'])
+    df_merged = pd.merge(output_df, df.drop(columns='Ticker'), on='ID', how='left')
 
-df_merged = add_calculated_fields(df_merged)
+    # Date conversion for selected columns
+    for col in ['Split Date', 'FY End', 'Next FY', 'Latest Qtr']:
+        if col in df_merged.columns:
+            try:
+                df_merged[col] = pd.to_numeric(df_merged[col], errors='coerce')
+                df_merged.loc[~np.isfinite(df_merged[col]), col] = np.nan
+                df_merged[col] = pd.to_datetime(df_merged[col], unit='s', errors='coerce').dt.strftime('%Y-%m-%d')
+            except Exception as e:
+                print(f"⚠️ Error parsing column {col}: {e}")
 
-rename_map = {'industry': 'Industry', 'sector': 'Sector', 'country': 'Country', 'state': 'State', 'fullTimeEmployees': 'Employees', 'quoteType': 'Type', 'fullExchangeName': 'Exchange', 'previousClose': 'Prev Close', 'open': 'Open', 'dayLow': 'Low', 'dayHigh': 'High', 'volume': 'Vol', 'beta': 'Beta', 'fiftyTwoWeekLow': '52w Low', 'fiftyTwoWeekHigh': '52w High', '52WeekChange': '52w % Chg', 'marketCap': 'Mkt Cap', 'enterpriseValue': 'EV', 'sharesOutstanding': 'Sh', 'floatShares': 'Float', 'sharesShort': 'Short Int', 'sharesShortPriorMonth': 'Short Int PM', 'quickRatio': 'Quick R', 'currentRatio': 'Curr R', 'totalCash': 'Cash', 'totalDebt': 'Debt', 'debtToEquity': 'D/E', 'totalRevenue': 'Rev', 'grossProfits': 'Gr P', 'ebitda': 'EBITDA', 'netIncomeToCommon': 'Net Inc', 'returnOnAssets': 'ROA', 'returnOnEquity': 'ROE', 'trailingEps': 'EPS (TTM)', 'forwardEps': 'EPS (FWD)', 'grossMargins': 'Gr M', 'ebitdaMargins': 'EBITDA M', 'operatingMargins': 'Op M', 'profitMargins': 'Net Inc M', 'operatingCashflow': 'Op CF', 'freeCashflow': 'FCF', 'earningsGrowth': 'EPS Gr %', 'earningsQuarterlyGrowth': 'EPS Qtr Gr %', 'revenueGrowth': 'Rev Gr %', 'revenuePerShare': 'Rev/Sh', 'totalCashPerShare': 'Cash/Sh', 'bookValue': 'BV/Sh', 'trailingPE': 'P/E (TTM)', 'forwardPE': 'P/E (FWD)', 'priceToSalesTrailing12Months': 'P/S (TTM)', 'priceToBook': 'P/B', 'enterpriseToRevenue': 'EV/Rev', 'enterpriseToEbitda': 'EV/EBITDA', 'trailingAnnualDividendRate': 'Div Rate', 'trailingAnnualDividendYield': 'Div Yield', 'targetLowPrice': 'Target Low', 'targetHighPrice': 'Target High', 'targetMeanPrice': 'Target Mean', 'targetMedianPrice': 'Target Median', 'recommendationMean': 'Avg Rating', 'recommendationKey': 'Rec', 'numberOfAnalystOpinions': 'Analysts', 'fiftyDayAverage': '50d Avg', 'fiftyDayAverageChange': '50d Chg', 'fiftyDayAverageChangePercent': '50d % Chg', 'twoHundredDayAverage': '200d Avg', 'twoHundredDayAverageChange': '200d Chg', 'twoHundredDayAverageChangePercent': '200d % Chg', 'lastSplitFactor': 'Split', 'lastSplitDate': 'Split Date', 'auditRisk': 'Audit Risk', 'boardRisk': 'Board Risk', 'shareHolderRightsRisk': 'SH Rights Risk', 'compensationRisk': 'Comp Risk', 'overallRisk': 'Total Risk', 'heldPercentInsiders': 'Insider %', 'heldPercentInstitutions': 'Inst %', 'lastFiscalYearEnd': 'FY End', 'nextFiscalYearEnd': 'Next FY', 'mostRecentQuarter': 'Latest Qtr'}
+    df_merged = add_calculated_fields(df_merged)
+    df_merged.rename(columns=rename_map, inplace=True)
+    df_merged = df_merged[[c for c in ordered_columns if c in df_merged.columns]]
+    return df_merged[df_merged.get("Type", pd.Series(index=df_merged.index, dtype=object)).str.casefold().eq("equity")]
 
-df_merged.rename(columns=rename_map, inplace=True)
 
-ordered_columns = ['Ticker', 'Name', 'CIK', 'Industry', 'Sector', 'Country', 'State', 'Employees', 'Type', 'Exchange', 'Prev Close', 'Open', 'Low', 'High', 'Vol', 'Beta', '52w Low', '52w High', '52w % Chg', 'Mkt Cap', 'EV', 'Sh', 'Float', 'Short Int', 'Short Int PM', 'Quick R', 'Curr R', 'Cash', 'Debt', 'Net Debt', 'D/E', 'D/EBITDA', 'Rev', 'Gr P', 'EBITDA', 'Op P', 'Net Inc', 'ROA', 'ROE', 'EPS (TTM)', 'EPS (FWD)', 'Gr M', 'EBITDA M', 'Op M', 'Net Inc M', 'Op CF', 'FCF', 'Op CF M', 'FCF M', 'EPS Gr %', 'EPS Qtr Gr %', 'Rev Gr %', 'Rev/Sh', 'FCF/Sh', 'Cash/Sh', 'BV/Sh', 'P/E (TTM)', 'P/E (FWD)', 'P/S (TTM)', 'P/B', 'PEG R', 'EV/Rev', 'EV/FCF', 'EV/EBITDA', 'Div Rate', 'Div Yield', 'Target Low', 'Target High', 'Target Mean', 'Target Median', 'Avg Rating', 'Rec', 'Analysts', '50d Avg', '50d Chg', '50d % Chg', '200d Avg', '200d Chg', '200d % Chg', 'Split', 'Split Date', 'Audit Risk', 'Board Risk', 'SH Rights Risk', 'Comp Risk', 'Total Risk', 'Insider %', 'Inst %', 'FY End', 'Next FY', 'Latest Qtr']
+# Stream the journal (last row per ticker) through the transform
+final_chunks = [transform_chunk(chunk) for chunk in JOURNAL.iter_chunks()]
+if final_chunks:
+    df_final = pd.concat(final_chunks, ignore_index=True)
+    df_final = df_final[[c for c in ordered_columns if c in df_final.columns]]
+else:
+    df_final = pd.DataFrame(columns=['Ticker', 'Type'])
+print(f"🧾 Built {len(df_final)} equity rows from the journal")
 
-df_merged = df_merged[[c for c in ordered_columns if c in df_merged.columns]]
+if args.tiered:
+    if quote_updates is not None:
+        quote_updates = quote_updates.rename(columns=rename_map)
+    df_final = merge_tiered(existing_final, df_final, quote_updates, tickers)
+    df_final = recalc_quote_dependent(df_final)
+    df_final = df_final[[c for c in ordered_columns if c in df_final.columns]]
 
-df_final = df_merged[df_merged["Type"].str.casefold().eq("equity")].copy()
+    # A successful get_info refreshes every category; a quote refresh only the daily fields
+    refreshed = sorted(JOURNAL.completed())
+    ledger = stamp(ledger, refreshed, list(ttls) + [QUOTE_COLUMN], now)
+    if quote_updates is not None:
+        ledger = stamp(ledger, quote_updates.index, [QUOTE_COLUMN], now)
+    save_ledger(ledger, REFRESH_LEDGER_PATH)
+    print(f"🗂️ Merged {len(refreshed)} full + {0 if quote_updates is None else len(quote_updates)} quote refreshes into {len(df_final)} rows")
 
 
 # Order columns based on schema
@@ -417,12 +444,8 @@ df_final = df_merged[df_merged["Type"].str.casefold().eq("equity")].copy()
 
 EXCEL_PATH = rel("Screener.xlsm")  # use the real filename here
 
-try:
-    write_to_excel(df_final, EXCEL_PATH)
-except Exception as e:
-    print(f"[WARNING] Could not write to Excel: {e}")
-finally:
-    df_final.to_csv(OUTPUT_CSV_PATH, index=False)
+# Every sink at once (a sink that fails is reported, the others still publish)
+SINKS.publish(Target('full_metrics', csv=OUTPUT_CSV_PATH, sheet='data_FullMetrics', workbook=EXCEL_PATH), df_final)
 
 print(df_final.columns.tolist())
 print(df_final.head())
@@ -437,13 +460,12 @@ print(df_final.head())
 #    df_split.to_csv(filename, index=False)
 #    print(f"✅ Saved {filename} with {len(cols)} columns")
 
+# Outputs are written, the next run starts a new journal
+JOURNAL.reset()
+
 # Write completion flag
 with open(FLAG_PATH, "w") as f:
     f.write("done")
 print(f"🚩 Dropped completion flag at {FLAG_PATH}")
 
-if os.path.exists(SOUND):
-    winsound.PlaySound(SOUND, winsound.SND_FILENAME | winsound.SND_ASYNC)
-    time.sleep(2)
-else:
-    print(f"Sound file not found: {SOUND}")
\ No newline at end of file
+play_sound(SOUND, hold=2)
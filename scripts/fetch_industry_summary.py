@@ -1,11 +1,14 @@
 import pandas as pd
 import os
 import numpy as np
-import xlwings as xw
-import winsound
-import time
 import os
 import sys
+import argparse
+
+from notify import play_sound
+from publish import PublishedFile
+from schema import fill_category, read_table
+from sinks import Target, open_sinks
 
 # Change working dir to the folder of the script so relative paths work
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
@@ -27,23 +30,26 @@ EXTRA_DIR = os.path.join(BASE_DIR, "Extra")
 SOUND_DIR = os.path.join(EXTRA_DIR, "sounds")
 SOUND = os.path.join(SOUND_DIR, "success_jingle.wav")
 
+parser = argparse.ArgumentParser(description="Industry summary of full_metrics.csv")
+parser.add_argument('--force', action='store_true', help='Rebuild even if full_metrics.csv has not changed since the last summary')
+args = parser.parse_args()
 
-# Load your full_metrics dataset
-df = pd.read_csv(FULL_METRICS)
+# Nothing to redo when full_metrics.csv hasn't been republished since this summary last ran
+SOURCE = PublishedFile(FULL_METRICS, read_table, reader='industry_summary')
+if not args.force and not SOURCE.changed():
+    print(f"⏭️ full_metrics.csv unchanged since the last industry summary (generation {SOURCE.last_seen()})")
+    sys.exit(0)
 
-# Ensure necessary columns are present and numeric
-numeric_cols = [
-    "Mkt Cap", "EV", "Rev", "Gr P", "EBITDA", "Op P", "Net Inc",
-    "Op CF", "FCF", "Avg Rating", "Analysts"
-]
-for col in numeric_cols:
-    df[col] = pd.to_numeric(df[col], errors='coerce')
 
-# Fill blanks in Sector with "none"
-df["Industry"] = df["Industry"].fillna("none")
+# Load your full_metrics dataset (typed by the schema registry: numeric columns
+# are already numeric, Industry is categorical)
+df = SOURCE.get()
+
+# Fill blanks in Industry with "none"
+df["Industry"] = fill_category(df["Industry"], "none")
 
 # Group by Industry and calculate aggregates
-grouped = df.groupby("Industry")
+grouped = df.groupby("Industry", observed=True)
 
 summary = grouped.agg({
     "Ticker": "count",
@@ -130,11 +136,11 @@ summary = summary.sort_values("T Mkt Cap", ascending=False)
 wb_path = SCREENER  # change this
 sheet_name = "data_Industries"    # or wherever you want it
 
-with xw.App(visible=False) as app:
-    wb = xw.Book(wb_path)
-    sht = wb.sheets[sheet_name]
-    sht.clear_contents()  # optional
-    sht.range("A1").options(index=False).value = summary
+# The sheet by default (queued with the Excel bridge, or written into the .xlsm when
+# there's no Excel); SCREENER_SINKS can add a CSV, Parquet or SQLite copy
+SINKS = open_sinks(('xlsx',))
+results = SINKS.publish(Target('industry_summary', sheet=sheet_name, workbook=wb_path, save=False), summary)
+if not any(isinstance(r, Exception) for r in results.values()):
+    SOURCE.done()
 
-winsound.PlaySound(SOUND, winsound.SND_FILENAME | winsound.SND_ASYNC)
-time.sleep(2)
\ No newline at end of file
+play_sound(SOUND, hold=2)
@@ -4,13 +4,15 @@ import os
 from datetime import datetime
 from tqdm import tqdm
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import random
 import pytz
-import platform
-import winsound
-import xlwings as xw
 import sys
+from batch_quotes import fetch_batch_quotes
+from concurrency import AIMDController
+from fetch_engine import FetchEngine
+from price_store import PRICE_COLUMNS, export_prices, load_prices, upsert_prices
+from providers import FastInfoProvider
+from session_pool import shared_pool
+from sinks import Target, open_sinks
 
 # Change working dir to the folder of the script so relative paths work
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
@@ -36,6 +38,9 @@ SOUND = os.path.join(SOUND_DIR, "success_jingle.wav")
 os.makedirs(LOCK_DIR, exist_ok=True)
 os.makedirs(FLAGS_DIR, exist_ok=True)
 
+# latest_prices.csv and the data_LatestPrices sheet, unless SCREENER_SINKS names others
+SINKS = open_sinks(('csv', 'xlsx'))
+
 def active_instance_count():
     return len([f for f in os.listdir(LOCK_DIR) if f.startswith("instance_")])
 
@@ -66,88 +71,31 @@ def load_filtered_tickers():
         lines = [line.strip().upper() for line in f if line.strip()]
         return lines[1:] if lines and lines[0].startswith("TICKER") else lines
 
-def load_existing_prices():
-    if not os.path.exists(LATEST_PRICES_PATH):
-        return pd.DataFrame(columns=['Ticker', 'Price', 'Type', 'Exchange', 'Prev Close', 'Open', 'High', 'Low', 'Mkt Cap', 'Vol', '10d Avg Vol', '3m Avg Vol', 'Sh', '52w High', '52w Low', '52w Chg', '50d Avg', '200d Avg', 'Timestamp'])
-
-    df = pd.read_csv(LATEST_PRICES_PATH)
-
-    for col in ['Ticker', 'Price', 'Type', 'Exchange', 'Prev Close', 'Open', 'High', 'Low', 'Mkt Cap', 'Vol', '10d Avg Vol', '3m Avg Vol', 'Sh', '52w High', '52w Low', '52w Chg', '50d Avg', '200d Avg', 'Timestamp']:
-        if col not in df.columns:
-            df[col] = None
-
-    df["Timestamp"] = pd.to_datetime(df["Timestamp"], errors="coerce", utc=True).dt.tz_convert(eastern)
-    return df
-
-def fetch_prices_multithreaded(tickers, max_workers=5, retries=1, max_wait=15):
-    data = []
-    failed = []
-
-    def fetch(ticker):
-        start_time = time.time()
-        for attempt in range(1, retries + 1):
-            try:
-                fast = yf.Ticker(ticker).fast_info
-                price = getattr(fast, 'last_price', None)
-                if price is None:
-                    raise Exception("No price data returned")
-                previous_close = getattr(fast, 'regular_market_previous_close', None)
-                open_price= getattr(fast, 'open', None)
-                day_high= getattr(fast, 'day_high', None)
-                day_low= getattr(fast, 'day_low', None)
-                last_volume = getattr(fast, 'last_volume', None)
-                ten_day_avg_volume = getattr(fast, 'ten_day_average_volume', None)
-                three_month_avg_volume = getattr(fast, 'three_month_average_volume', None)
-                mkt_cap = getattr(fast, 'market_cap', None)
-                exchange = getattr(fast, 'exchange', None)
-                type = getattr(fast, 'quote_type', None)
-                shares = getattr(fast, 'shares', None)
-                year_change = getattr(fast, 'year_change', None)
-                year_high = getattr(fast, 'year_high', None)
-                year_low = getattr(fast, 'year_low', None)
-                fifty_day_avg = getattr(fast, 'fifty_day_average', None)
-                two_hundred_day_avg = getattr(fast, 'two_hundred_day_average', None)
-                ts = datetime.now(eastern).isoformat()
-                return {
-                    'Ticker': ticker,
-                    'Price': price,
-                    'Type': type,
-                    'Exchange': exchange,
-                    'Prev Close': previous_close,
-                    'Open': open_price,
-                    'High': day_high,
-                    'Low': day_low,
-                    'Mkt Cap': mkt_cap,
-                    'Vol': last_volume,
-                    '10d Avg Vol': ten_day_avg_volume,
-                    '3m Avg Vol': three_month_avg_volume,
-                    'Sh': shares,
-                    '52w High': year_high,
-                    '52w Low': year_low,
-                    '52w Chg': year_change,
-                    '50d Avg': fifty_day_avg,
-                    '200d Avg': two_hundred_day_avg,
-                    'Timestamp': ts
-                }, None
-
-            except Exception as e:
-                elapsed = time.time() - start_time
-                if elapsed > max_wait or attempt == retries:
-                    return None, {
-                        'Ticker': ticker,
-                        'Reason': str(e),
-                        'When': datetime.now(eastern).isoformat()
-                    }
-                time.sleep(random.uniform(1.5, 2.5) * attempt)
-
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = {executor.submit(fetch, t): t for t in tickers}
-        for future in tqdm(as_completed(futures), total=len(futures), desc="Fetching prices (multi)"):
-            row, fail = future.result()
-            if row:
-                data.append(row)
-            if fail:
-                failed.append(fail)
+# Typed store read; pass columns to read only what the caller needs
+def load_existing_prices(columns=None):
+    return load_prices(columns or PRICE_COLUMNS)
+
+# A live refresh: quotes come from Yahoo, not the response cache, unless a cache is passed in
+def fetch_prices_multithreaded(tickers, max_workers=20, retries=1, max_wait=15, cache=None):
+    timestamp_fn = lambda: datetime.now(eastern).isoformat()
+    # Start at 5 workers and let the controller find the rate Yahoo allows, up to max_workers
+    controller = AIMDController(initial=5, maximum=max_workers)
+
+    pool = shared_pool(size=4)
+
+    # A few batch quote requests cover the whole filtered list; fast_info only for dropped symbols
+    data, fallback = fetch_batch_quotes(tickers, controller=controller, pool=pool, cache=cache)
+
+    provider = FastInfoProvider(
+        previous_close_attr='regular_market_previous_close',
+        timestamp_fn=timestamp_fn,
+        keep_failed_rows=False,
+        cache=cache
+    )
+    engine = FetchEngine(provider, controller=controller, retries=retries, max_total_wait=max_wait,
+                         backoff=(1.5, 2.5), desc="Fetching prices (async)", verbose=False)
+    fallback_data, failed = engine.run(fallback)
+    data.extend(fallback_data)
 
     if failed:
         fail_df = pd.DataFrame(failed)
@@ -174,57 +122,24 @@ def update_latest_prices():
         print("No new data fetched.")
         return
 
-    existing = load_existing_prices()
-
-    new_data["Timestamp"] = pd.to_datetime(new_data["Timestamp"], errors="coerce", utc=True).dt.tz_convert(eastern)
-    existing["Timestamp"] = pd.to_datetime(existing["Timestamp"], errors="coerce", utc=True).dt.tz_convert(eastern)
-
-    updated = existing.set_index("Ticker")
+    # One batched upsert; a quote only replaces a stored one with an older Timestamp
+    changed = upsert_prices(new_data)
+    print(f"💾 Upserted {changed} of {len(new_data)} rows")
 
-
-    # Ensure uniqueness (keep the last occurrence if duplicates exist)
-    updated = updated[~updated.index.duplicated(keep='last')]
-
-
-    for _, row in new_data.iterrows():
-        ticker = row["Ticker"]
-        new_time = row["Timestamp"]
-
-        if (
-            ticker not in updated.index
-            or pd.isna(updated.loc[ticker, "Timestamp"])
-            or new_time > updated.loc[ticker, "Timestamp"]
-        ):
-            updated.loc[ticker] = row[['Ticker', 'Price', 'Type', 'Exchange', 'Prev Close', 'Open', 'High', 'Low', 'Mkt Cap', 'Vol', '10d Avg Vol', '3m Avg Vol', 'Sh', '52w High', '52w Low', '52w Chg', '50d Avg', '200d Avg', 'Timestamp']]
-
-    updated = updated.reset_index()
-    updated.sort_values("Ticker", inplace=True)
-    updated.to_csv(LATEST_PRICES_PATH, index=False)
+    # The store's own Parquet export; the CSV and the sheet go out through the sinks
+    updated = export_prices(csv=False)
 
     # Save to Excel
     EXCEL_PATH = os.path.join(BASE_DIR, "Screener.xlsm")
 
-    try:
-        app = xw.apps.active  # attach to running Excel
-    except IndexError:
-        app = xw.App(visible=True)  # fallback, start Excel if none open
-
-    # Try to get already opened workbook
-    wb = None
-    for book in app.books:
-        if book.name == "Screener.xlsm":
-            wb = book
-            break
-    if wb is None:
-        wb = app.books.open(EXCEL_PATH)
-
-    sht = wb.sheets["data_LatestPrices"]
-    sht.used_range.clear_contents()
-    sht.range("A1").value = updated.columns.tolist()
-    sht.range("A2").value = updated.values
-    #wb.save()
-
-    # DO NOT call app.quit() or wb.close() to keep Excel and workbook open
+    # Through the Excel bridge, which keeps the workbook open: only cells that changed since
+    # the last push (by any price script); rows are rewritten only when the row set changed.
+    # Headless (workbook_backend) the sheet is rewritten inside the .xlsm
+    results = SINKS.publish(Target('latest_prices', csv=LATEST_PRICES_PATH, sheet='data_LatestPrices',
+                                   workbook=EXCEL_PATH, mode='delta', save=False, wait=True), updated)
+    reply = results.get('xlsx')
+    if isinstance(reply, dict):
+        print(f"📊 data_LatestPrices: {reply['cells']} cells in {reply['writes']} writes{' (full rewrite)' if reply['full'] else ''}")
     print(f"✅ Updated {len(new_data)} tickers at {datetime.now(eastern).strftime('%H:%M:%S')}")
 
 if __name__ == "__main__":
@@ -234,11 +149,7 @@ if __name__ == "__main__":
         with open(flag_file, "w") as f:
             f.write("done")
 
-        #if os.path.exists(SOUND):
-        #    winsound.PlaySound(SOUND, winsound.SND_FILENAME | winsound.SND_ASYNC)
-        #    time.sleep(4)
-        #else:
-        #    print(f"Sound file not found: {SOUND}")
+        #play_sound(SOUND, hold=4)
 
     finally:
         remove_lock(lock_file)
\ No newline at end of file
@@ -3,17 +3,22 @@ import yfinance as yf
 import pandas as pd
 import time
 from tqdm import tqdm
-import shutil
 import argparse
 from datetime import datetime, timedelta
 import pytz
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import random
-import platform
-import winsound
-import xlwings as xw
 import os
 import sys
+from batch_quotes import fetch_batch_quotes
+from concurrency import AIMDController
+from fetch_engine import FetchEngine
+from freshness import stale_tickers
+from notify import beep, play_sound
+from price_store import load_prices, upsert_prices, export_prices
+from snapshot_log import SnapshotLog
+from providers import FastInfoProvider, fetch_info
+from response_cache import shared_cache
+from session_pool import shared_pool
+from sinks import Target, open_sinks
 
 # Change working dir to the folder of the script so relative paths work
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
@@ -23,6 +28,13 @@ print(f"Current working dir: {os.getcwd()}", file=sys.stderr)
 # CLI setup
 parser = argparse.ArgumentParser(description="Fetch latest stock prices.")
 parser.add_argument('--commit', action='store_true', help='Overwrite old_prices.csv with latest data')
+parser.add_argument('--batch', action=argparse.BooleanOptionalAction, default=True,
+                    help='Fetch quotes in multi-symbol batches, falling back to per-symbol fast_info for dropped symbols')
+parser.add_argument('--max-age', type=float, default=15,
+                    help='Minutes a stored quote stays fresh during market hours (after the close it stays fresh until the next open)')
+parser.add_argument('--force', action='store_true', help='Refetch every ticker regardless of freshness')
+parser.add_argument('--csv', action=argparse.BooleanOptionalAction, default=True,
+                    help='Also export latest_prices.csv next to the canonical latest_prices.parquet')
 args = parser.parse_args()
 
 # ---- PATH SETUP ----
@@ -35,7 +47,6 @@ def rel(*parts):
 SEC_JSON_PATH = rel("Source Data", "company_tickers.json")
 FAILED_LOG_PATH = rel("Logs", "latest_prices_failed_tickers.csv")
 OUTPUT_CSV_PATH = rel("Source Data", "latest_prices.csv")
-OLD_PRICES = rel("Source Data", "old_latest_prices.csv")
 FLAG_PATH = rel("Flags", f"all_prices_done_{os.getpid()}.flag")
 EXTRA_DIR = os.path.join(ROOT_DIR, "Extra")
 SOUND_DIR = os.path.join(EXTRA_DIR, "sounds")
@@ -66,14 +77,23 @@ def countdown_timer(seconds):
 
 
 
+# Adaptive concurrency for the pre-flight check and the main fetch
+CONTROLLER = AIMDController(initial=5, maximum=32)
+# Pooled Yahoo sessions shared by the batch quotes, pre-flight and fast_info fallback
+POOL = shared_pool(size=8)
+# On-disk response cache (quotes younger than a minute are reused by a re-run); --force bypasses it
+CACHE = None if args.force else shared_cache()
+# latest_prices.csv (--csv) and the data_LatestPrices sheet, unless SCREENER_SINKS names others
+SINKS = open_sinks(('csv', 'xlsx') if args.csv else ('xlsx',))
+
 # Check to see if rate limited
-def preflight_test(tickers=['AAPL', 'MSFT', 'APUS'], max_retries=3, wait_minutes=15):
+def preflight_test(tickers=['AAPL', 'MSFT', 'APUS'], max_retries=6):
     for attempt in range(1, max_retries + 1):
         print(f"🔎 Pre-flight test attempt {attempt} for tickers: {tickers}")
         failures = []
         for ticker in tickers:
             try:
-                info = yf.Ticker(ticker).get_info()
+                info = fetch_info(ticker, pool=POOL)
                 if info and info != {}:
                     print(f"✅ {ticker} fetch successful. Proceeding with full fetch.")
                     return True
@@ -85,8 +105,9 @@ def preflight_test(tickers=['AAPL', 'MSFT', 'APUS'], max_retries=3, wait_minutes
 
         if len(failures) == len(tickers):  # both/all tickers failed
             if attempt < max_retries:
-                wait_time = wait_minutes * 60
-                print(f"⏳ Both failed. Waiting {wait_minutes} minutes before retrying pre-flight test...")
+                # Escalating cooldown (30s, 1m, 2m ... 15m) instead of a flat 15 minute wait
+                wait_time = int(CONTROLLER.backoff())
+                print(f"⏳ All failed. Waiting {wait_time}s before retrying pre-flight test...")
                 countdown_timer(wait_time)
                 beep()
             else:
@@ -101,137 +122,38 @@ def preflight_test(tickers=['AAPL', 'MSFT', 'APUS'], max_retries=3, wait_minutes
 #    exit(1)
 
 
-# Load existing prices (for skip logic & fallback)
-if os.path.exists(OUTPUT_CSV_PATH):
-    existing_df = pd.read_csv(OUTPUT_CSV_PATH, low_memory=False)
-    existing_df = existing_df.drop_duplicates(subset="Ticker", keep="last")  # <--- Add this
-    if 'Timestamp' in existing_df.columns:
-        existing_df['Timestamp'] = pd.to_datetime(existing_df['Timestamp'], errors='coerce')
-        if existing_df['Timestamp'].dt.tz is None:
-            existing_df['Timestamp'] = existing_df['Timestamp'].dt.tz_localize('US/Eastern', ambiguous='NaT', nonexistent='NaT')
-else:
-    existing_df = pd.DataFrame(columns=['Ticker', 'Price', 'Type', 'Exchange', 'Prev Close', 'Open', 'High', 'Low', 'Mkt Cap', 'Vol', '10d Avg Vol', '3m Avg Vol', 'Sh', '52w High', '52w Low', '52w Chg', '50d Avg', '200d Avg', 'Timestamp'])
-
-existing_dict = existing_df.set_index("Ticker").to_dict("index")
+# Load existing prices (only what the skip logic needs) from the price store
+existing_df = load_prices(['Ticker', 'Price', 'Timestamp'])
 
 
-# Beep
-def beep():
-    if platform.system() == "Windows":
-        winsound.Beep(1000, 500)
-    else:
-        print("\a", end="")  # System bell (may or may not work depending on terminal)
 
-# Start results with recovered tickers so we don't fetch them twice
 results = []
-tickers_to_fetch = tickers
-print(f"Will fetch {len(tickers_to_fetch)} tickers. No skipping based on freshness.")
 
-# Define market open cutoff (9:30 AM EST today) for freshness check
+# Staleness policy: skip tickers whose stored quote is newer than --max-age and the last market session
 now_est = datetime.now(EST)
-market_open_today = now_est.replace(hour=9, minute=30, second=0, microsecond=0)
-if now_est < market_open_today:
-    market_open_today -= timedelta(days=1)
-
-# Fetch function with retries
-def fetch_price(ticker, retries=3, max_wait=15):
-
-
-    start_time = time.time()
-    for attempt in range(1, retries+1):
-        try:
-            fast = yf.Ticker(ticker).fast_info
-            price = getattr(fast, 'last_price', None)
-            if price is None:
-                raise Exception("No price data")
-            previous_close = getattr(fast, 'previous_close', None)
-            open_price = getattr(fast, 'open', None)
-            day_high = getattr(fast, 'day_high', None)
-            day_low = getattr(fast, 'day_low', None)
-            last_volume = getattr(fast, 'last_volume', None)
-            ten_day_avg_volume = getattr(fast, 'ten_day_average_volume', None)
-            three_month_avg_volume = getattr(fast, 'three_month_average_volume', None)
-            mkt_cap = getattr(fast, 'market_cap', None)
-            exchange = getattr(fast, 'exchange', None)
-            type = getattr(fast, 'quote_type', None)
-            shares = getattr(fast, 'shares', None)
-            year_change = getattr(fast, 'year_change', None)
-            year_high = getattr(fast, 'year_high', None)
-            year_low = getattr(fast, 'year_low', None)
-            fifty_day_avg = getattr(fast, 'fifty_day_average', None)
-            two_hundred_day_avg = getattr(fast, 'two_hundred_day_average', None)
-            ts = get_est_timestamp()
-            return {
-                'Ticker': ticker,
-                'Price': price,
-                'Type': type,
-                'Exchange': exchange,
-                'Prev Close': previous_close,
-                'Open': open_price,
-                'High': day_high,
-                'Low': day_low,
-                'Mkt Cap': mkt_cap,
-                'Vol': last_volume,
-                '10d Avg Vol': ten_day_avg_volume,
-                '3m Avg Vol': three_month_avg_volume,
-                'Sh': shares,
-                '52w High': year_high,
-                '52w Low': year_low,
-                '52w Chg': year_change,
-                '50d Avg': fifty_day_avg,
-                '200d Avg': two_hundred_day_avg,
-                'Timestamp': ts
-            }, None
-        except Exception as e:
-            elapsed = time.time() - start_time
-            if elapsed > max_wait or attempt == retries:
-                print(f"❌ {ticker} failed: {e} (after {elapsed:.1f}s)")
-                return {'Ticker': ticker, 'Price': None, 'Timestamp': get_est_timestamp()}, {'Ticker': ticker, 'Reason': str(e), 'When': get_est_timestamp()}
-            else:
-                wait = random.uniform(1.5,3.5) * attempt
-                print(f"⚠️ {ticker} retry {attempt} in {wait:.1f}s")
-                time.sleep(wait)
-
-MAX_WORKERS = 5
-failures_main = []
-success_count = 0
-fail_count = 0
-
-with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-    futures = {executor.submit(fetch_price, t): t for t in tickers_to_fetch}
-    with tqdm(total=len(futures), desc="Multithreaded Price Fetch") as pbar:
-        for future in as_completed(futures):
-            row, fail = future.result()
-            results.append(row)
-            if fail:
-                failures_main.append(fail)
-                fail_count += 1
-            else:
-                success_count += 1
-            pbar.update(1)
+if args.force:
+    tickers_to_fetch = tickers
+else:
+    tickers_to_fetch = stale_tickers(existing_df, tickers, now=now_est, max_age=timedelta(minutes=args.max_age))
+print(f"Will fetch {len(tickers_to_fetch)} of {len(tickers)} tickers ({len(tickers) - len(tickers_to_fetch)} still fresh).")
+
+# Batched quotes first (hundreds of symbols per request), per-symbol fast_info only for what the batch dropped
+fallback_tickers = tickers_to_fetch
+if args.batch:
+    batch_rows, fallback_tickers = fetch_batch_quotes(tickers_to_fetch, controller=CONTROLLER, cache=CACHE)
+    results.extend(batch_rows)
+    print(f"📦 Batch quotes: {len(batch_rows)} fetched, {len(fallback_tickers)} left for per-symbol fallback")
+
+# Async fast_info fetch with retries (failed tickers keep a Price=None row)
+engine = FetchEngine(FastInfoProvider(timestamp_fn=get_est_timestamp, cache=CACHE), controller=CONTROLLER,
+                     retries=3, max_total_wait=15, desc="Async Price Fetch")
+rows, failures_main = engine.run(fallback_tickers)
+results.extend(rows)
+fail_count = len(failures_main)
+success_count = len(tickers_to_fetch) - fail_count
 
 print(f"\n✅ Fetched: {success_count} | ❌ Failed: {fail_count} | Total requested: {len(tickers_to_fetch)}")
-
-def write_to_excel(df, workbook_path, sheet_name="data_LatestPrices"):
-    try:
-        app = xw.apps.active # attach to running Excel
-    except IndexError:
-        app = xw.App(visible=True) # fallback, start Excel if none open
-
-    # Try to get already opened workbook
-    wb = None
-    for book in app.books:
-        if book.name == "Screener.xlsm":
-            wb = book
-            break
-    if wb is None:
-        wb = app.books.open(EXCEL_PATH)
-
-    sht = wb.sheets[sheet_name]
-    sht.used_range.clear_contents()
-    sht.range("A1").value = df.columns.tolist()
-    sht.range("A2").value = df.values
-    wb.save()
+print(f"📈 Concurrency: {CONTROLLER.stats()} | 🔌 Sessions: {POOL.metrics()}")
 
 # Final failures logged
 all_failures = failures_main
@@ -243,34 +165,33 @@ else:
         os.remove(FAILED_LOG_PATH)
     print("🎉 All tickers recovered!")
 
-# Backup old prices before overwrite
-if os.path.exists(OUTPUT_CSV_PATH):
-    shutil.copyfile(OUTPUT_CSV_PATH, OLD_PRICES)
-    print(f"📦 Archived previous latest_prices.csv to old_latest_prices.csv")
-
-# Save final merged data, preferring new data over old if available
-existing_dict.update({r['Ticker']: r for r in results})
-merged_rows = []
-for ticker, data in existing_dict.items():
-    data["Ticker"] = ticker
-    merged_rows.append(data)
+# Versioned history instead of an old_latest_prices copy: each run stores only the cells that changed
+SNAPSHOTS = SnapshotLog('latest_prices')
+SNAPSHOTS.seed(load_prices())
 
+# Batched upsert of the fetched rows (newer Timestamp wins), then read back the full table
+changed = upsert_prices(pd.DataFrame(results))
+print(f"💾 Upserted {changed} of {len(results)} rows")
+df_final = load_prices()
+run, cells, keyframe = SNAPSHOTS.record(df_final)
+print(f"🗃️ Snapshot run {run}: {cells} cells{' (keyframe)' if keyframe else ' changed'}")
 
-df_final = pd.DataFrame(merged_rows)
+# The store's own Parquet export; the CSV and the sheet go out through the sinks
+export_prices(df_final, csv=False)
 
 EXCEL_PATH = rel("Screener.xlsm")  # use the real filename here
-write_to_excel(df_final, EXCEL_PATH)
-
-df_final.to_csv(OUTPUT_CSV_PATH, index=False)
-print(f"✅ Saved latest prices to {OUTPUT_CSV_PATH}")
+# The Excel bridge keeps the workbook open across runs and writes only cells that changed
+# since the last push (a full rewrite only when the row set changed); the headless backend
+# rewrites the sheet inside the .xlsm
+results = SINKS.publish(Target('latest_prices', csv=OUTPUT_CSV_PATH, sheet='data_LatestPrices', workbook=EXCEL_PATH,
+                               mode='delta', wait=True), df_final)
+reply = results.get('xlsx')
+if isinstance(reply, dict):
+    print(f"📊 data_LatestPrices: {reply['cells']} cells in {reply['writes']} writes{' (full rewrite)' if reply['full'] else ''}")
 
 # Write completion flag
 with open(FLAG_PATH, "w") as f:
     f.write("done")
 print(f"🚩 Dropped completion flag at {FLAG_PATH}")
 
-if os.path.exists(SOUND):
-    winsound.PlaySound(SOUND, winsound.SND_FILENAME | winsound.SND_ASYNC)
-    time.sleep(4)
-else:
-    print(f"Sound file not found: {SOUND}")
\ No newline at end of file
+play_sound(SOUND, hold=4)
@@ -3,19 +3,23 @@ from tqdm import tqdm
 import numpy as np
 import requests
 from collections import defaultdict
-import random
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
 import pytz
 from datetime import datetime, timedelta
 import yfinance as yf
 import sys
-import platform
-import winsound
-import xlwings as xw
 import os
 import sys
 from curl_cffi import requests
+from concurrency import AIMDController
+from fetch_engine import FetchEngine
+from notify import beep, play_sound
+from providers import InfoProvider, fetch_info
+from publish import publish_csv
+from response_cache import shared_cache
+from session_pool import shared_pool
+from sinks import Target, open_sinks
+from symbol_table import shared_symbols
 
 # Change working dir to the folder of the script so relative paths work
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
@@ -65,8 +69,13 @@ with open(SEC_JSON_PATH, "w") as f:
     f.write(response.text)
 print("Downloaded and saved company_tickers.json")
 
-#NUM_SESSIONS = 5
-#session_pool = [requests.Session(impersonate="chrome") for _ in range(NUM_SESSIONS)]
+# Pooled Yahoo sessions: TLS + cookie/crumb negotiated once per session, not per ticker
+NUM_SESSIONS = 5
+POOL = shared_pool(size=NUM_SESSIONS)
+# On-disk get_info cache: re-runs and transform tweaks within 12h read it instead of the API
+CACHE = shared_cache()
+# Output tables go to the full-metrics CSV and data_ sheet unless SCREENER_SINKS says otherwise
+SINKS = open_sinks(('csv', 'xlsx'))
 
 
 data = response.json()
@@ -82,9 +91,13 @@ df = df.dropna(subset=['Ticker'])
 df["CIK"] = df["CIK"].astype(str).str.zfill(10)
 
 # Save SEC company list CSV
-df.to_csv(SEC_CSV_PATH, index=False)
+publish_csv(df, SEC_CSV_PATH, index=False)
 print(f"✅ Saved {len(df)} tickers from SEC to CSV")
 
+# Stable integer IDs (CIK-based where the SEC list has one) key the joins below
+SYMBOLS = shared_symbols()
+df['ID'] = SYMBOLS.assign(df['Ticker'], df['CIK'])
+
 # Read back all CSV's
 csv_paths = [
 #    SEC_CSV_PATH,
@@ -115,6 +128,8 @@ print(f"Combined tickers from all sources: {len(combined_df)} unique tickers")
 
 # Create final ticker list
 tickers = combined_df['Ticker'].dropna().unique()
+SYMBOLS.assign(tickers)
+ticker_set = set(tickers)
 
 
 
@@ -141,39 +156,32 @@ tickers = combined_df['Ticker'].dropna().unique()
 
 
 
+# Adaptive concurrency shared by the retries, the pre-flight check and the main fetch.
+# Grows while Yahoo keeps answering and backs off on 429s / empty get_info responses.
+CONTROLLER = AIMDController(initial=2, maximum=16)
+
 # --- *** ADDED: Retry previously failed tickers first *** ---
 if os.path.exists(FAILED_LOG_PATH):
     failed_df = pd.read_csv(FAILED_LOG_PATH)
     failed_tickers = failed_df['Ticker'].dropna().unique().tolist()
     # Filter to only tickers still in the SEC list
-    failed_tickers = [t for t in failed_tickers if t in tickers]
+    failed_tickers = [t for t in failed_tickers if t in ticker_set]
     print(f"Retrying {len(failed_tickers)} previously failed tickers...")
 else:
     failed_tickers = []
 
 def retry_failed_tickers(failure_list, max_retries=3):
-    recovered_rows = []
-    final_failures = []
-
-    for ticker in tqdm(failure_list, desc="🔁 Retrying failed tickers"):
-        for attempt in range(1, max_retries + 1):
-            try:
-                info = yf.Ticker(ticker).get_info()
-                if info:
-                    row = {"Ticker": ticker, "Timestamp": get_est_timestamp()}
-                    # Flatten dict: only keep str, int, float, bool, None
-                    for k, v in info.items():
-                        if isinstance(v, (str, int, float, bool)) or v is None:
-                            row[k] = v
-                    recovered_rows.append(row)
-                    tqdm.write(f"✅ Recovered {ticker} on attempt {attempt}")
-                    break
-            except Exception as e:
-                if attempt == max_retries:
-                    tqdm.write(f"❌ {ticker} failed: {e}")
-                    final_failures.append({"Ticker": ticker, "Error": str(e)})
-                else:
-                    time.sleep(0.5 * (2 ** (attempt - 1)))
+    # Accepts plain tickers (failed log) or failure dicts (main fetch)
+    retry_tickers = [f['Ticker'] if isinstance(f, dict) else f for f in failure_list]
+    engine = FetchEngine(InfoProvider(cache=CACHE), controller=CONTROLLER, retries=max_retries,
+                         backoff=(0.5, 1.0), desc="🔁 Retrying failed tickers")
+    rows, final_failures = engine.run(retry_tickers)
+
+    # Failed tickers come back as Ticker/Timestamp stubs, keep only real recoveries
+    still_failed = {f['Ticker'] for f in final_failures}
+    recovered_rows = [row for row in rows if row['Ticker'] not in still_failed]
+    for row in recovered_rows:
+        tqdm.write(f"✅ Recovered {row['Ticker']}")
     return recovered_rows, final_failures
 
 recovered_rows, final_failures = retry_failed_tickers(failed_tickers, max_retries=3)
@@ -185,37 +193,10 @@ results = recovered_rows.copy()
 
 
 # Exclude recovered tickers from main fetch (already got fresh data for those)
-recovered_tickers = [row['Ticker'] for row in recovered_rows]
+recovered_tickers = {row['Ticker'] for row in recovered_rows}
 tickers_to_fetch = [t for t in tickers if t not in recovered_tickers]
 print(f"Will fetch {len(tickers_to_fetch)} fresh tickers.")
 
-# ---- BATCHED yfinance fetch ----
-def fetch_ticker_info(ticker, retries=3, max_total_wait=15):
-    start_time = time.time()
-    for attempt in range(1, retries + 1):
-        try:
-            info = yf.Ticker(ticker).get_info()
-            if not info:
-                raise Exception("Empty response (possible rate limit)")
-
-            # Flatten dict into row
-            row = {'Ticker': ticker, 'Timestamp': get_est_timestamp()}
-            for k, v in info.items():
-                # Optionally filter out nested dicts/lists you don't want
-                if isinstance(v, (str, int, float, bool)) or v is None:
-                    row[k] = v
-                # Otherwise skip nested dict/list for now
-            return row, None
-        except Exception as e:
-            elapsed = time.time() - start_time
-            if elapsed > max_total_wait or attempt == retries:
-                tqdm.write(f"❌ {ticker}: {e} (after {elapsed:.1f}s)")
-                row = {'Ticker': ticker, 'Timestamp': get_est_timestamp()}
-                return row, {'Ticker': ticker, 'Error': str(e)}
-            else:
-                wait = random.uniform(1.5, 3.5) * attempt
-                tqdm.write(f"⚠️ {ticker}: retry {attempt}, waiting {wait:.1f}s")
-                time.sleep(wait)
 def countdown_timer(seconds):
     for remaining in range(seconds, 0, -1):
         mins, secs = divmod(remaining, 60)
@@ -224,20 +205,14 @@ def countdown_timer(seconds):
         time.sleep(1)
     print("\r✅ Retry time reached!                 ")
 
-def beep():
-    if platform.system() == "Windows":
-        import winsound
-        winsound.Beep(1000, 500)
-    else:
-        print("\a", end="")  # System bell (may or may not work depending on terminal)
 
-def preflight_test(tickers=['AAPL', 'MSFT', 'APUS'], max_retries=3, wait_minutes=15):
+def preflight_test(tickers=['AAPL', 'MSFT', 'APUS'], max_retries=6):
     for attempt in range(1, max_retries + 1):
         print(f"🔎 Pre-flight test attempt {attempt} for tickers: {tickers}")
         failures = []
         for ticker in tickers:
             try:
-                info = yf.Ticker(ticker).get_info()
+                info = fetch_info(ticker, pool=POOL)
                 if info and info != {}:
                     print(f"✅ {ticker} fetch successful. Proceeding with full fetch.")
                     return True
@@ -249,8 +224,9 @@ def preflight_test(tickers=['AAPL', 'MSFT', 'APUS'], max_retries=3, wait_minutes
 
         if len(failures) == len(tickers):  # both/all tickers failed
             if attempt < max_retries:
-                wait_time = wait_minutes * 60
-                print(f"⏳ Both failed. Waiting {wait_minutes} minutes before retrying pre-flight test...")
+                # Escalating cooldown (30s, 1m, 2m ... 15m) instead of a flat 15 minute wait
+                wait_time = int(CONTROLLER.backoff())
+                print(f"⏳ All failed. Waiting {wait_time}s before retrying pre-flight test...")
                 countdown_timer(wait_time)
                 beep()
             else:
@@ -265,26 +241,16 @@ if not preflight_test():
     exit(1)
 
 
-MAX_WORKERS = 1
-first_failures = []
-success_count = 0
-fail_count = 0
-
-with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-    futures = {executor.submit(fetch_ticker_info, t): t for t in tickers_to_fetch}
-
-    with tqdm(total=len(futures), desc="Multithreaded Fetch") as pbar:
-        for future in as_completed(futures):
-            row, fail = future.result()
-            results.append(row)
-            if fail:
-                first_failures.append(fail)
-                fail_count += 1
-            else:
-                success_count += 1
-            pbar.update(1)
+# ---- Async yfinance fetch (failed tickers keep a Ticker/Timestamp stub row) ----
+engine = FetchEngine(InfoProvider(cache=CACHE), controller=CONTROLLER, retries=3, max_total_wait=15, desc="Async Fetch")
+rows, first_failures = engine.run(tickers_to_fetch)
+results.extend(rows)
+fail_count = len(first_failures)
+success_count = len(tickers_to_fetch) - fail_count
 
 print(f"\n✅ Done! Fetched: {success_count} | ❌ Failed: {fail_count} | Total requested: {len(tickers_to_fetch)}")
+print(f"🗄️ Cache: {CACHE.stats() if CACHE else 'off'}")
+print(f"📈 Concurrency: {CONTROLLER.stats()} | 🔌 Sessions: {POOL.metrics()}")
 print(f"Total results length (including skipped + recovered): {len(results)}")
 
 # Retry logic for failed tickers from this main fetch
@@ -294,8 +260,9 @@ results.extend(recovered_rows_2)
 # Create output df, drop duplicates keeping last (favoring recovered/new data)
 output_df = pd.DataFrame(results).drop_duplicates(subset="Ticker", keep="last")
 
-# Merge with SEC info df to keep all company metadata
-df_merged = pd.merge(output_df, df, on='Ticker', how='left')
+# Merge with SEC info df to keep all company metadata (integer join on instrument ID)
+output_df['ID'] = SYMBOLS.ids(output_df['Ticker'])
+df_merged = pd.merge(output_df, df.drop(columns='Ticker'), on='ID', how='left')
 
 # Log remaining failures if any
 if final_failures:
@@ -352,19 +319,6 @@ def add_calculated_fields(df):
     return df
 
 
-def write_to_excel(df, workbook_path, sheet_name="data_mutualFullMetrics"):
-    app = xw.App(visible=False)
-    wb = xw.Book(workbook_path)
-    sht = wb.sheets[sheet_name]
-
-    sht.used_range.clear_contents()
-
-    # Start writing at A2 (headers), data below
-    sht.range("A1").value = df.columns.tolist()
-    sht.range("A2").value = df.values
-
-    wb.save()
-
 final_columns = [
 'Ticker', 'longName', 'typeDisp', 'fullExchangeName',
     'beta3Year', 'fiftyTwoWeekHigh', 'fiftyTwoWeekLow',
@@ -444,12 +398,8 @@ df_final.rename(columns=rename_map, inplace=True)
 
 EXCEL_PATH = rel("Screener.xlsm")  # use the real filename here
 
-try:
-    write_to_excel(df_final, EXCEL_PATH)
-except Exception as e:
-    print(f"[WARNING] Could not write to Excel: {e}")
-finally:
-    df_final.to_csv(OUTPUT_CSV_PATH, index=False)
+# Every sink at once (a sink that fails is reported, the others still publish)
+SINKS.publish(Target('mutual_fund_full_metrics', csv=MUTUAL_FUND_OUTPUT, sheet='data_mutualFullMetrics', workbook=EXCEL_PATH), df_final)
 
 print(df_final.columns.tolist())
 print(df_final.head())
@@ -469,8 +419,4 @@ with open(FLAG_PATH, "w") as f:
     f.write("done")
 print(f"🚩 Dropped completion flag at {FLAG_PATH}")
 
-if os.path.exists(SOUND):
-    winsound.PlaySound(SOUND, winsound.SND_FILENAME | winsound.SND_ASYNC)
-    time.sleep(2)
-else:
-    print(f"Sound file not found: {SOUND}")
\ No newline at end of file
+play_sound(SOUND, hold=2)
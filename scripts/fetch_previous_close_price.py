@@ -3,10 +3,15 @@ import yfinance as yf
 import pandas as pd
 import time
 from tqdm import tqdm
-import shutil
 import argparse
 import os
 from datetime import datetime
+from concurrency import is_throttle_error
+from providers import check_download, download_errors
+from session_pool import shared_pool
+from shared_limiter import shared_limiter
+from sinks import Target, open_sinks
+from snapshot_log import SnapshotLog
 
 # CLI setup
 parser = argparse.ArgumentParser(description="Fetch previous close stock prices.")
@@ -24,9 +29,11 @@ def rel(*parts):
 SEC_JSON_PATH = rel("Source Data", "company_tickers.json")
 FAILED_LOG_PATH = rel("Logs", "previous_close_prices_failed_tickers.csv")
 OUTPUT_CSV_PATH = rel("Source Data", "previous_close_prices.csv")
-OLD_PRICES = rel("Source Data", "previous_previous_close_prices.csv")
 FLAG_PATH = rel("Flags", f"previous_close_prices_done_{os.getpid()}.flag")
 
+# previous_close_prices.csv unless SCREENER_SINKS names other sinks
+SINKS = open_sinks(('csv',))
+
 # Load tickers from JSON
 with open(SEC_JSON_PATH, 'r') as f:
     data = json.load(f)
@@ -34,6 +41,11 @@ with open(SEC_JSON_PATH, 'r') as f:
 tickers = ['APUS'] + [v['ticker'] for v in data.values()]
 total = len(tickers)
 
+# yf.download reuses one pooled keep-alive session instead of negotiating its own
+shared_pool(size=1)
+# Machine-wide request budget / circuit breaker shared with the other fetch scripts
+LIMITER = shared_limiter()
+
 def chunk_list(lst, n):
     for i in range(0, len(lst), n):
         yield lst[i:i + n]
@@ -48,18 +60,25 @@ time.sleep(1.5)
 for batch in chunk_list(tickers, 50):
     tickers_str = " ".join(batch)
 
+    # A threaded download makes one request per ticker
+    LIMITER.acquire(len(batch))
     try:
-        yf_data = yf.download(
-            tickers_str,
-            period='1d',
-            interval='1m',
-            progress=False,
-            threads=True,
-            group_by='ticker',
-            auto_adjust=False
-        )
+        with download_errors() as errors:
+            yf_data = yf.download(
+                tickers_str,
+                period='1d',
+                interval='1m',
+                progress=False,
+                threads=True,
+                group_by='ticker',
+                auto_adjust=False
+            )
+        # yf.download only logs per-ticker throttles; raise them so the breaker hears about it
+        check_download(yf_data, errors)
+        LIMITER.record('ok')
     except Exception as e:
         print(f"Batch fetch failed: {e}")
+        LIMITER.record('throttled' if is_throttle_error(e) else 'error')
         time.sleep(4)
         for ticker in batch:
             failed.append({
@@ -121,15 +140,16 @@ for batch in chunk_list(tickers, 50):
 
 pbar.close()
 
-# Archive previous CSV before writing new one
+# Versioned history instead of a previous_previous_close_prices copy
+SNAPSHOTS = SnapshotLog('previous_close_prices')
 if os.path.exists(OUTPUT_CSV_PATH):
-    shutil.copyfile(OUTPUT_CSV_PATH, OLD_PRICES)
-    print(f"📦 Archived previous {os.path.basename(OUTPUT_CSV_PATH)} to {os.path.basename(OLD_PRICES)}")
+    SNAPSHOTS.seed(pd.read_csv(OUTPUT_CSV_PATH))
 
 # Save results
 df_final = pd.DataFrame(all_prices)
-df_final.to_csv(OUTPUT_CSV_PATH, index=False)
-print(f"✅ Saved previous close prices to {OUTPUT_CSV_PATH}")
+SINKS.publish(Target('previous_close_prices', csv=OUTPUT_CSV_PATH), df_final)
+run, cells, keyframe = SNAPSHOTS.record(df_final)
+print(f"🗃️ Snapshot run {run}: {cells} cells{' (keyframe)' if keyframe else ' changed'}")
 
 # Log failures
 if failed:
@@ -0,0 +1,76 @@
+from datetime import datetime, time as dtime, timedelta
+
+import pandas as pd
+import pytz
+
+# Staleness policy for stored quotes.
+#
+# A row is fresh when its Timestamp is newer than the cutoff:
+#   - market open:   the later of (now - max_age) and today's 9:30 open, so
+#                    nothing from before the open counts as fresh
+#   - market closed: the earlier of (now - max_age) and the last 16:00 close,
+#                    so anything fetched after the close is final until the next open
+# Weekends are skipped; exchange holidays are not modeled (a holiday just looks
+# like a closed session, which at worst refetches once).
+
+EST = pytz.timezone("US/Eastern")
+MARKET_OPEN = dtime(9, 30)
+MARKET_CLOSE = dtime(16, 0)
+DEFAULT_MAX_AGE = timedelta(minutes=15)
+
+
+def last_market_session(now=None):
+    now = now or datetime.now(EST)
+    day = now.date()
+    while True:
+        if day.weekday() < 5:
+            session_open = EST.localize(datetime.combine(day, MARKET_OPEN))
+            if session_open <= now:
+                return session_open, EST.localize(datetime.combine(day, MARKET_CLOSE))
+        day -= timedelta(days=1)
+
+
+def staleness_cutoff(now=None, max_age=DEFAULT_MAX_AGE):
+    now = now or datetime.now(EST)
+    session_open, session_close = last_market_session(now)
+    if now < session_close:
+        return max(now - max_age, session_open)
+    return min(now - max_age, session_close)
+
+
+# Stored timestamps mix offset-aware strings and naive Eastern strings; parse both
+def to_eastern(values):
+    s = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(s):
+        if s.dt.tz is None:
+            return s.dt.tz_localize(EST, ambiguous='NaT', nonexistent='NaT')
+        return s.dt.tz_convert(EST)
+
+    s = s.astype('string')
+    has_tz = s.str.contains(r'(?:[+-]\d\d:?\d\d|Z)$', regex=True, na=False)
+    out = pd.Series(pd.NaT, index=s.index, dtype='datetime64[ns, US/Eastern]')
+    if has_tz.any():
+        out[has_tz] = pd.to_datetime(s[has_tz], errors='coerce', utc=True).dt.tz_convert(EST)
+    if (~has_tz).any():
+        naive = pd.to_datetime(s[~has_tz], errors='coerce')
+        out[~has_tz] = naive.dt.tz_localize(EST, ambiguous='NaT', nonexistent='NaT')
+    return out
+
+
+def stale_mask(df, now=None, max_age=DEFAULT_MAX_AGE, price_column='Price'):
+    cutoff = staleness_cutoff(now, max_age)
+    ts = to_eastern(df['Timestamp']).reset_index(drop=True)
+    mask = ts.isna() | (ts < cutoff)
+    # Rows left behind by a failed fetch carry a Timestamp but no price
+    if price_column in df.columns:
+        mask |= df[price_column].isna().reset_index(drop=True)
+    mask.index = df.index
+    return mask
+
+
+# Tickers (in input order) that are missing from df or stale under the policy
+def stale_tickers(df, tickers, now=None, max_age=DEFAULT_MAX_AGE):
+    if df.empty or 'Timestamp' not in df.columns:
+        return list(tickers)
+    fresh = set(df.loc[~stale_mask(df, now, max_age), 'Ticker'])
+    return [t for t in tickers if t not in fresh]
@@ -0,0 +1,195 @@
+import argparse
+import glob
+import os
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from freshness import EST
+from publish import atomic_path, generation
+
+# Consolidated 1m bar store replacing the per-ticker CSVs in Source Data/History.
+#
+# Bars live in one Parquet dataset partitioned by trading date (Eastern):
+#   History/1m/date=2025-08-05/part-<written>-<pid>.parquet
+# Every file holds many tickers. Writes are append-only: each flush adds a new
+# part file (written under a temp name and renamed in, see publish.py) and never
+# rewrites existing ones, so a crash can't corrupt stored bars, and the store's
+# generation (1m.gen) moves with every flush. Overlapping fetches are resolved at read time (newest write wins), and
+# compact() folds a date's part files into one. load_history() reads N tickers
+# x M days in one vectorized call, pruning partitions by date and row groups
+# by ticker.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.abspath(os.path.join(BASE_DIR, ".."))
+HIST_DIR = os.path.join(ROOT_DIR, "Source Data", "History")
+STORE_DIR = os.path.join(HIST_DIR, "1m")
+
+BAR_COLUMNS = ['Volume', 'Open', 'High', 'Low', 'Close', 'Dividends', 'Stock Splits']
+SCHEMA = pa.schema([
+    ('Ticker', pa.string()),
+    ('Date', pa.timestamp('ns', tz='UTC')),
+    ('Volume', pa.int64()),
+    ('Open', pa.float64()),
+    ('High', pa.float64()),
+    ('Low', pa.float64()),
+    ('Close', pa.float64()),
+    ('Dividends', pa.float64()),
+    ('Stock Splits', pa.float64()),
+    ('Written', pa.int64()),
+])
+PARTITIONING = ds.partitioning(pa.schema([('date', pa.string())]), flavor="hive")
+
+
+def _partition_dir(day, root=STORE_DIR):
+    return os.path.join(root, f"date={day}")
+
+
+# Bars (Ticker, Date, OHLCV...) -> store schema, with the trading date of every bar
+def _prepare(bars):
+    df = bars.reset_index(drop=True).copy()
+    df['Ticker'] = df['Ticker'].astype(str)
+    dates = pd.to_datetime(df['Date'], utc=True)
+    df['Date'] = dates
+    df['Volume'] = pd.to_numeric(df['Volume'], errors='coerce').fillna(0).astype('int64')
+    for col in BAR_COLUMNS[1:]:
+        df[col] = pd.to_numeric(df.get(col, 0.0), errors='coerce').astype('float64')
+    df['Written'] = time.time_ns()
+    df = df.dropna(subset=['Date']).sort_values(['Ticker', 'Date'])
+    return df[[f.name for f in SCHEMA]], trading_day(df['Date'])
+
+
+# Eastern calendar day of each timestamp as 'YYYY-MM-DD' (formats only the unique days)
+def trading_day(dates):
+    days = dates.dt.tz_convert(EST).dt.tz_localize(None).dt.normalize()
+    labels = {d: d.strftime('%Y-%m-%d') for d in days.unique()}
+    return days.map(labels)
+
+
+# Append bars for any number of tickers; returns the trading dates written
+def append_history(bars, root=STORE_DIR):
+    if bars is None or bars.empty:
+        return []
+    df, day = _prepare(bars)
+    written = []
+    for d, part in df.groupby(day, sort=True):
+        os.makedirs(_partition_dir(d, root), exist_ok=True)
+        name = f"part-{time.time_ns()}-{os.getpid()}.parquet"
+        table = pa.Table.from_pandas(part, schema=SCHEMA, preserve_index=False)
+        with atomic_path(os.path.join(_partition_dir(d, root), name), counter=root) as tmp:
+            pq.write_table(table, tmp, row_group_size=100_000)
+        written.append(d)
+    return written
+
+
+# Bumped by every append / compaction: readers holding loaded bars reload only when it moves
+def store_generation(root=STORE_DIR):
+    return generation(root)
+
+
+def stored_dates(root=STORE_DIR):
+    return sorted(os.path.basename(p)[len("date="):] for p in glob.glob(os.path.join(root, "date=*")))
+
+
+def _dataset(root=STORE_DIR):
+    return ds.dataset(root, format="parquet", schema=SCHEMA.append(pa.field('date', pa.string())),
+                      partitioning=PARTITIONING)
+
+
+# Timestamp of the newest stored bar per ticker (Series indexed by Ticker, Eastern).
+# Only the last `lookback` stored dates are scanned: anything older is outside
+# the provider's 1m window anyway and needs a full fetch.
+def last_bars(tickers=None, lookback=8, root=STORE_DIR):
+    dates = stored_dates(root) if os.path.isdir(root) else []
+    if not dates:
+        return pd.Series(dtype='datetime64[ns, US/Eastern]', name='Date')
+    df = load_history(tickers, start=dates[-lookback:][0], columns=[], root=root)
+    return df.groupby('Ticker')['Date'].max()
+
+
+# Long frame of bars for tickers x [start, end] (dates as 'YYYY-MM-DD' or anything to_datetime takes).
+# written_after (ns) keeps only bars flushed after that write; keep_written keeps the Written column.
+def load_history(tickers=None, start=None, end=None, columns=None, root=STORE_DIR, written_after=None,
+                 keep_written=False):
+    columns = BAR_COLUMNS if columns is None else list(columns)
+    if not os.path.isdir(root) or not stored_dates(root):
+        return pd.DataFrame(columns=['Ticker', 'Date'] + columns + (['Written'] if keep_written else []))
+
+    expr = None
+    if start is not None:
+        expr = ds.field('date') >= pd.Timestamp(start).strftime('%Y-%m-%d')
+    if end is not None:
+        cond = ds.field('date') <= pd.Timestamp(end).strftime('%Y-%m-%d')
+        expr = cond if expr is None else expr & cond
+    if tickers is not None:
+        cond = ds.field('Ticker').isin(list(tickers))
+        expr = cond if expr is None else expr & cond
+    if written_after is not None:
+        cond = ds.field('Written') > written_after
+        expr = cond if expr is None else expr & cond
+
+    table = _dataset(root).to_table(columns=['Ticker', 'Date', 'Written'] + columns, filter=expr)
+    df = table.to_pandas()
+    # Newest write wins where fetches overlapped
+    df = df.sort_values('Written').drop_duplicates(['Ticker', 'Date'], keep='last')
+    if not keep_written:
+        df = df.drop(columns='Written')
+    df = df.sort_values(['Ticker', 'Date']).reset_index(drop=True)
+    df['Date'] = df['Date'].dt.tz_convert(EST)
+    return df
+
+
+# One field as a Date x Ticker matrix (e.g. Close across the whole screen)
+def load_panel(field='Close', tickers=None, start=None, end=None, root=STORE_DIR):
+    df = load_history(tickers, start, end, columns=[field], root=root)
+    return df.pivot(index='Date', columns='Ticker', values=field)
+
+
+# Fold each date's part files into one (deduplicated) file
+def compact(dates=None, root=STORE_DIR):
+    for d in dates or stored_dates(root):
+        parts = sorted(glob.glob(os.path.join(_partition_dir(d, root), "part-*.parquet")))
+        if len(parts) < 2:
+            continue
+        df = pq.ParquetDataset(parts, schema=SCHEMA).read().to_pandas()
+        df = df.sort_values('Written').drop_duplicates(['Ticker', 'Date'], keep='last').sort_values(['Ticker', 'Date'])
+        target = os.path.join(_partition_dir(d, root), f"part-{time.time_ns()}-{os.getpid()}.parquet")
+        with atomic_path(target, counter=root) as tmp:
+            pq.write_table(pa.Table.from_pandas(df, schema=SCHEMA, preserve_index=False), tmp, row_group_size=100_000)
+        # Old parts go only after the compacted file is complete
+        for p in parts:
+            os.remove(p)
+
+
+# One-time import of the legacy {ticker}_history.csv files
+def import_legacy_csvs(hist_dir=HIST_DIR, root=STORE_DIR, batch=100):
+    files = sorted(glob.glob(os.path.join(hist_dir, "*_history.csv")))
+    touched = set()
+    for i in range(0, len(files), batch):
+        frames = []
+        for path in files[i:i + batch]:
+            df = pd.read_csv(path, index_col=0)
+            df['Ticker'] = os.path.basename(path)[:-len("_history.csv")]
+            frames.append(df)
+        touched.update(append_history(pd.concat(frames, ignore_index=True), root))
+    compact(sorted(touched), root)
+    return len(files)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="1m history store maintenance")
+    parser.add_argument('--import-csv', action='store_true', help='Import the legacy per-ticker History/*_history.csv files')
+    parser.add_argument('--compact', action='store_true', help='Fold every date partition into a single file')
+    args = parser.parse_args()
+
+    if args.import_csv:
+        start = time.time()
+        n = import_legacy_csvs()
+        print(f"✅ Imported {n} history CSVs in {time.time() - start:.1f}s")
+    if args.compact:
+        compact()
+        print("✅ Compacted all date partitions")
+    print(f"📅 Stored dates: {stored_dates()}")
@@ -0,0 +1,265 @@
+import argparse
+import json
+import os
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from freshness import EST, MARKET_OPEN
+from history_store import HIST_DIR, STORE_DIR, load_history, stored_dates, trading_day
+from publish import atomic_path, generation
+from shared_limiter import _lock_file, _unlock_file
+
+# Memory-mapped minute x ticker x field panel of 1m bars.
+#
+# The panel is a raw float32 file laid out (minute, ticker, field), where the
+# minute axis is every regular-session minute (390 per trading day, 9:30 ET
+# first) of the days in meta.json. Both axes have spare capacity: new tickers
+# fill reserved slots and, because minutes are the outer axis, a new day fills
+# the reserved rows after the last one, in place. Slicing "all tickers at
+# 10:31" is one contiguous block and "AAPL over 5 days" a strided view, both
+# without copying or parsing, and every process that maps the file shares the
+# same OS page cache instead of loading its own copy. Missing bars are NaN.
+# The Parquet history store stays the source of truth; the panel is built and
+# extended from it. meta.json records the newest store write (Written, ns) the
+# panel holds, so an extension picks up every bar flushed since, whatever its
+# date: a new ticker's first 7-day fetch or a backfill lands as well as today.
+# meta.json is the only thing swapped (atomically): readers map the days and
+# tickers it lists, so days and tickers added after they opened stay out of
+# view until the next meta (cells they already see can fill in, like the last
+# day's newer minutes). When the layout has to change (out of reserved
+# slots or days, a backfill) the panel is rebuilt into a new versioned file
+# (panel_<n>.f32) and the new meta points at it; the file before it is removed
+# on the rebuild after, so a reader that just read the old meta can still map
+# it. Builds and extensions hold panel.lock, so only one runs at a time.
+
+PANEL_DIR = os.path.join(HIST_DIR, "panel")
+DATA_NAME = "panel.f32"            # panels built before versioned data files
+META_NAME = "meta.json"
+LOCK_NAME = "panel.lock"
+FIELDS = ['Open', 'High', 'Low', 'Close', 'Volume']
+SESSION_MINUTES = 390
+MIN_TICKER_CAPACITY = 1024
+DAY_HEADROOM = 10                  # trading days appended in place before a rebuild
+
+
+def _meta_path(root):
+    return os.path.join(root, META_NAME)
+
+
+def _data_path(root, meta):
+    return os.path.join(root, meta.get('data', DATA_NAME))
+
+
+@contextmanager
+def _panel_lock(root):
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, LOCK_NAME), "a+") as lock:
+        _lock_file(lock)
+        try:
+            yield
+        finally:
+            _unlock_file(lock)
+
+
+def _write_meta(meta, root):
+    with atomic_path(_meta_path(root)) as tmp:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+
+def _read_meta(root):
+    with open(_meta_path(root), encoding="utf-8") as f:
+        return json.load(f)
+
+
+class MinutePanel:
+    def __init__(self, root=PANEL_DIR, mode="r"):
+        self.root = root
+        # Read first: a rebuild or extension landing later shows up as stale()
+        self.generation = generation(_meta_path(root))
+        meta = _read_meta(root)
+        self.tickers = meta['tickers']
+        self.days = meta['days']
+        self.fields = meta['fields']
+        self.capacity = meta['capacity']
+        self.ticker_index = {t: i for i, t in enumerate(self.tickers)}
+        self.field_index = {f: i for i, f in enumerate(self.fields)}
+        shape = (len(self.days) * SESSION_MINUTES, self.capacity, len(self.fields))
+        if self.days:
+            # The file may hold reserved day rows past these; they aren't mapped
+            self.data = np.memmap(_data_path(root, meta), dtype=np.float32, mode=mode, shape=shape)
+        else:
+            self.data = np.empty(shape, dtype=np.float32)
+
+    # A newer panel has been published since this one was opened; reopen to see it
+    def stale(self):
+        return generation(_meta_path(self.root)) != self.generation
+
+    def timestamps(self):
+        opens = pd.to_datetime(self.days).tz_localize(EST) + pd.Timedelta(hours=MARKET_OPEN.hour, minutes=MARKET_OPEN.minute)
+        offsets = pd.to_timedelta(np.arange(SESSION_MINUTES), unit="min")
+        return pd.DatetimeIndex([o + off for o in opens for off in offsets])
+
+    def minute_index(self, ts):
+        ts = pd.Timestamp(ts)
+        ts = ts.tz_localize(EST) if ts.tzinfo is None else ts.tz_convert(EST)
+        day = self.days.index(ts.strftime('%Y-%m-%d'))
+        session_open = ts.normalize() + pd.Timedelta(hours=MARKET_OPEN.hour, minutes=MARKET_OPEN.minute)
+        minute = int((ts - session_open).total_seconds() // 60)
+        if not 0 <= minute < SESSION_MINUTES:
+            raise KeyError(f"{ts} is outside the regular session")
+        return day * SESSION_MINUTES + minute
+
+    def _field(self, field):
+        return slice(None) if field is None else self.field_index[field]
+
+    # tickers (x fields) at one minute: a view into the map
+    def cross_section(self, ts, field=None):
+        return self.data[self.minute_index(ts), :len(self.tickers), self._field(field)]
+
+    # minutes (x fields) for one ticker between two timestamps (inclusive): a strided view
+    def series(self, ticker, start=None, end=None, field=None):
+        i = self.ticker_index[ticker]
+        lo = 0 if start is None else self.minute_index(start)
+        hi = self.data.shape[0] if end is None else self.minute_index(end) + 1
+        return self.data[lo:hi, i, self._field(field)]
+
+    # Full Date x Ticker frame for one field (this one copies)
+    def frame(self, field='Close'):
+        values = self.data[:, :len(self.tickers), self.field_index[field]]
+        return pd.DataFrame(values, index=self.timestamps(), columns=self.tickers)
+
+
+def open_panel(root=PANEL_DIR):
+    return MinutePanel(root, mode="r")
+
+
+# Long bars frame -> (minute rows, ticker columns, values) for the panel's day / ticker axes
+def _positions(bars, days, ticker_index):
+    # Eastern wall-clock time, so minute offsets are plain integer arithmetic
+    wall = bars['Date'].dt.tz_convert(EST).dt.tz_localize(None)
+    day = wall.dt.normalize()
+    day_pos = day.map({pd.Timestamp(d): i for i, d in enumerate(days)})
+    open_offset = pd.Timedelta(hours=MARKET_OPEN.hour, minutes=MARKET_OPEN.minute)
+    minute = (wall - day - open_offset) // pd.Timedelta(minutes=1)
+    keep = day_pos.notna() & (minute >= 0) & (minute < SESSION_MINUTES)
+    rows = (day_pos[keep].astype(np.int64) * SESSION_MINUTES + minute[keep].astype(np.int64)).to_numpy()
+    cols = bars.loc[keep, 'Ticker'].map(ticker_index).astype(np.int64).to_numpy()
+    values = bars.loc[keep, FIELDS].to_numpy(dtype=np.float32)
+    return rows, cols, values
+
+
+# Build the panel from scratch for every stored date (or [start, end])
+def build_panel(start=None, end=None, root=PANEL_DIR, store=STORE_DIR):
+    with _panel_lock(root):
+        return _build_panel(start, end, root, store)
+
+
+# Written under a new name nobody maps yet, then published by the meta that points at it
+def _build_panel(start, end, root, store):
+    old = _read_meta(root) if os.path.exists(_meta_path(root)) else {}
+    bars = load_history(start=start, end=end, columns=FIELDS, root=store, keep_written=True)
+    days = sorted(trading_day(bars['Date']).unique()) if not bars.empty else []
+    tickers = sorted(bars['Ticker'].unique()) if not bars.empty else []
+    capacity = max(MIN_TICKER_CAPACITY, 2 * len(tickers))
+    day_capacity = len(days) + DAY_HEADROOM
+    version = old.get('version', 0) + 1
+    name = f"panel_{version}.f32"
+
+    # Sized for the reserved days up front; only the rows in use are written (NaN)
+    path = os.path.join(root, name)
+    with open(path, "wb") as f:
+        f.truncate(day_capacity * SESSION_MINUTES * capacity * len(FIELDS) * np.dtype(np.float32).itemsize)
+    if days:
+        data = np.memmap(path, dtype=np.float32, mode="r+", shape=(len(days) * SESSION_MINUTES, capacity, len(FIELDS)))
+        data[:] = np.nan
+        rows, cols, values = _positions(bars, days, {t: i for i, t in enumerate(tickers)})
+        data[rows, cols, :] = values
+        data.flush()
+        del data
+    written = int(bars['Written'].max()) if not bars.empty else 0
+    _write_meta({'data': name, 'version': version, 'tickers': tickers, 'days': days, 'fields': FIELDS,
+                 'capacity': capacity, 'day_capacity': day_capacity, 'written': written, 'updated': time.time()}, root)
+    _prune(root, keep={name, old.get('data', DATA_NAME)})
+    return len(days), len(tickers)
+
+
+# Data files older than the previous one; a file some reader still has mapped (Windows) waits for the next rebuild
+def _prune(root, keep):
+    for name in os.listdir(root):
+        if name.endswith(".f32") and name not in keep:
+            try:
+                os.remove(os.path.join(root, name))
+            except OSError:
+                pass
+
+
+# Add every bar the store received since the panel's last build / extension: days
+# after the panel's last day fill reserved rows, bars on days it already has (the
+# last day refreshed, a new ticker's first fetch) are written over, all in place.
+# New tickers take reserved slots. Running out of reserved slots or days, or bars
+# before the first day or on a day the panel skipped (the minute axis changes),
+# rebuild.
+def extend_panel(root=PANEL_DIR, store=STORE_DIR):
+    with _panel_lock(root):
+        return _extend_panel(root, store)
+
+
+def _extend_panel(root, store):
+    if not os.path.exists(_meta_path(root)):
+        return _build_panel(None, None, root, store)
+    meta = _read_meta(root)
+    if not meta['days'] or 'written' not in meta:
+        return _build_panel(None, None, root, store)
+
+    bars = load_history(columns=FIELDS, root=store, written_after=meta['written'], keep_written=True)
+    if bars.empty:
+        return 0, 0
+    tickers = list(meta['tickers'])
+    new_tickers = sorted(set(bars['Ticker']) - set(tickers))
+    last_day = meta['days'][-1]
+    bar_days = sorted(trading_day(bars['Date']).unique())
+    known = set(meta['days'])
+    new_days = [d for d in bar_days if d > last_day]
+    days = meta['days'] + new_days
+    # Panels from before reserved days have none
+    if (len(tickers) + len(new_tickers) > meta['capacity'] or len(days) > meta.get('day_capacity', len(meta['days']))
+            or any(d <= last_day and d not in known for d in bar_days)):
+        # Out of reserved ticker slots or days, or a day inside the panel's range: the layout changes, rebuild
+        return _build_panel(None, None, root, store)
+    tickers += new_tickers
+
+    old_rows = len(meta['days']) * SESSION_MINUTES
+    new_rows = len(days) * SESSION_MINUTES
+    # The file is never resized or replaced here: new rows and slots are past what the
+    # current meta lists, so readers only see them once the meta below is published
+    data = np.memmap(_data_path(root, meta), dtype=np.float32, mode="r+",
+                     shape=(new_rows, meta['capacity'], len(meta['fields'])))
+    data[old_rows:] = np.nan
+    rows, cols, values = _positions(bars, days, {t: i for i, t in enumerate(tickers)})
+    data[rows, cols, :] = values
+    data.flush()
+    del data
+
+    meta.update({'tickers': tickers, 'days': days, 'written': max(meta['written'], int(bars['Written'].max())),
+                 'updated': time.time()})
+    _write_meta(meta, root)
+    return len(new_days), len(new_tickers)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or extend the memory-mapped 1m panel")
+    parser.add_argument('--rebuild', action='store_true', help='Rebuild the panel from every stored date')
+    args = parser.parse_args()
+
+    start = time.time()
+    if args.rebuild:
+        n_days, n_tickers = build_panel()
+        print(f"✅ Built panel: {n_days} days x {n_tickers} tickers in {time.time() - start:.1f}s")
+    else:
+        n_days, n_tickers = extend_panel()
+        print(f"✅ Extended panel: +{n_days} days, +{n_tickers} tickers in {time.time() - start:.1f}s")
+    print(f"📅 Store dates: {len(stored_dates())}")
@@ -0,0 +1,43 @@
+import os
+import sys
+import time
+
+# Sound hooks for the end (and the waits) of a run.
+#
+# winsound only exists on Windows, so it is imported when a sound is actually
+# played rather than at the top of every script. Everywhere else -- the Linux
+# boxes, headless runs -- beep() and play_sound() do nothing and return at once,
+# so a server run doesn't sit through the jingle's hold time either.
+# SCREENER_QUIET=1 silences them on Windows too (scheduled overnight runs).
+
+QUIET = os.environ.get("SCREENER_QUIET", "") not in ("", "0")
+
+
+def _winsound():
+    if QUIET or sys.platform != "win32":
+        return None
+    try:
+        import winsound
+    except ImportError:
+        return None
+    return winsound
+
+
+def beep(frequency=1000, duration=500):
+    winsound = _winsound()
+    if winsound is not None:
+        winsound.Beep(frequency, duration)
+
+
+# Play a .wav without blocking, then keep the process alive `hold` seconds so it isn't cut off
+def play_sound(path, hold=0):
+    winsound = _winsound()
+    if winsound is None:
+        return False
+    if not os.path.exists(path):
+        print(f"Sound file not found: {path}")
+        return False
+    winsound.PlaySound(path, winsound.SND_FILENAME | winsound.SND_ASYNC)
+    if hold:
+        time.sleep(hold)
+    return True
@@ -0,0 +1,216 @@
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+from freshness import EST, to_eastern
+from publish import publish_csv, publish_parquet
+from schema import read_table
+from symbol_table import shared_symbols
+
+# Canonical store for latest prices.
+#
+# Source Data/prices.sqlite (WAL mode) holds one row per ticker. Refreshes are
+# batched upserts that only replace a row when the incoming quote is newer:
+#   INSERT ... ON CONFLICT(ticker) DO UPDATE ... WHERE excluded.ts > ts
+# so a refresh of 500 tickers touches 500 rows, concurrent writers (the price
+# scripts, the filtered-price instances) can't roll a quote back, and readers
+# always see a committed snapshot. Fields the new fetch left empty keep their
+# stored values (COALESCE), and fetched rows with no values at all (failed-ticker
+# stubs) are not written.
+# Prices and volumes are REAL, the Timestamp is an int64 UTC epoch in
+# nanoseconds; loads come back typed (float64, categorical Type / Exchange,
+# Eastern datetimes) and can read only the columns a caller needs. Each row
+# also carries its instrument ID from the symbol table (indexed), for joins
+# against the other stores on integers instead of ticker strings.
+# latest_prices.parquet and latest_prices.csv are exports of the table for
+# anything that reads files directly (Parquet only with pyarrow installed),
+# published atomically with a generation counter (publish.py).
+
+try:
+    import pyarrow  # noqa: F401
+    HAVE_PARQUET = True
+except ImportError:
+    HAVE_PARQUET = False
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.abspath(os.path.join(BASE_DIR, ".."))
+DB_PATH = os.path.join(ROOT_DIR, "Source Data", "prices.sqlite")
+PRICES_PATH = os.path.join(ROOT_DIR, "Source Data", "latest_prices.parquet")
+PRICES_CSV_PATH = os.path.join(ROOT_DIR, "Source Data", "latest_prices.csv")
+
+PRICE_COLUMNS = ['Ticker', 'Price', 'Type', 'Exchange', 'Prev Close', 'Open', 'High', 'Low', 'Mkt Cap', 'Vol',
+                 '10d Avg Vol', '3m Avg Vol', 'Sh', '52w High', '52w Low', '52w Chg', '50d Avg', '200d Avg',
+                 'Timestamp']
+CATEGORY_COLUMNS = ['Type', 'Exchange']
+FLOAT_COLUMNS = [c for c in PRICE_COLUMNS if c not in ['Ticker', 'Timestamp'] + CATEGORY_COLUMNS]
+# Stored alongside the price columns; loaded only when asked for
+STORE_COLUMNS = PRICE_COLUMNS + ['ID']
+
+# latest_prices column -> SQL column
+SQL_COLUMNS = {
+    'Ticker': 'ticker', 'Price': 'price', 'Type': 'type', 'Exchange': 'exchange', 'Prev Close': 'prev_close',
+    'Open': 'open', 'High': 'high', 'Low': 'low', 'Mkt Cap': 'mkt_cap', 'Vol': 'vol',
+    '10d Avg Vol': 'avg_vol_10d', '3m Avg Vol': 'avg_vol_3m', 'Sh': 'shares', '52w High': 'high_52w',
+    '52w Low': 'low_52w', '52w Chg': 'chg_52w', '50d Avg': 'avg_50d', '200d Avg': 'avg_200d', 'Timestamp': 'ts',
+    'ID': 'id',
+}
+SQL_TYPES = {'ticker': 'TEXT PRIMARY KEY', 'type': 'TEXT', 'exchange': 'TEXT', 'ts': 'INTEGER', 'id': 'INTEGER'}
+
+_init_lock = threading.Lock()
+_initialized = set()
+
+
+def connect(path=DB_PATH):
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    with _init_lock:
+        if path not in _initialized:
+            cols = ", ".join(f"{c} {SQL_TYPES.get(c, 'REAL')}" for c in SQL_COLUMNS.values())
+            conn.execute(f"CREATE TABLE IF NOT EXISTS latest_prices ({cols})")
+            # Stores created before instrument IDs
+            if 'id' not in {row[1] for row in conn.execute("PRAGMA table_info(latest_prices)")}:
+                conn.execute("ALTER TABLE latest_prices ADD COLUMN id INTEGER")
+            conn.execute("CREATE INDEX IF NOT EXISTS latest_prices_id ON latest_prices (id)")
+            _initialized.add(path)
+            if path == DB_PATH and conn.execute("SELECT COUNT(*) FROM latest_prices").fetchone()[0] == 0:
+                _seed(conn)
+            _backfill_ids(conn)
+    return conn
+
+
+def _backfill_ids(conn):
+    missing = [row[0] for row in conn.execute("SELECT ticker FROM latest_prices WHERE id IS NULL")]
+    if missing:
+        ids = shared_symbols().assign(missing)
+        with conn:
+            conn.executemany("UPDATE latest_prices SET id = ? WHERE ticker = ?", zip(ids.tolist(), missing))
+
+
+# First run after the switch: import the previous Parquet / CSV store
+def _seed(conn):
+    if HAVE_PARQUET and os.path.exists(PRICES_PATH):
+        legacy = pd.read_parquet(PRICES_PATH)
+        if 'Timestamp' in legacy.columns and pd.api.types.is_integer_dtype(legacy['Timestamp']):
+            legacy['Timestamp'] = _from_epoch(legacy['Timestamp'])
+    elif os.path.exists(PRICES_CSV_PATH):
+        legacy = read_table(PRICES_CSV_PATH)
+    else:
+        return
+    _upsert(conn, legacy.drop_duplicates(subset='Ticker', keep='last'))
+    print(f"📥 Seeded price store with {len(legacy)} rows")
+
+
+def empty_prices(columns=None):
+    return normalize_prices(pd.DataFrame(columns=columns or PRICE_COLUMNS))
+
+
+# Any price frame (fetched rows, legacy CSV) -> store dtypes, Timestamp as Eastern datetimes
+def normalize_prices(df):
+    df = df.copy()
+    if 'Ticker' in df.columns:
+        df['Ticker'] = df['Ticker'].astype(object)
+    for col in FLOAT_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('float64')
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    if 'Timestamp' in df.columns:
+        df['Timestamp'] = to_eastern(df['Timestamp']).dt.as_unit('ns').set_axis(df.index)
+    return df
+
+
+def _to_epoch(ts):
+    ts = pd.Series(ts)
+    epoch = pd.Series(pd.NA, index=ts.index, dtype='Int64')
+    valid = ts.notna()
+    epoch[valid] = ts[valid].dt.tz_convert('UTC').dt.tz_localize(None).astype('datetime64[ns]').astype(np.int64)
+    return epoch
+
+
+def _from_epoch(epoch):
+    return pd.to_datetime(epoch, unit='ns', utc=True).dt.tz_convert(EST)
+
+
+def load_prices(columns=None, tickers=None, ids=None, path=DB_PATH):
+    wanted = list(columns or PRICE_COLUMNS)
+    sql = f"SELECT {', '.join(SQL_COLUMNS[c] for c in wanted)} FROM latest_prices"
+    params = []
+    if tickers is not None:
+        params = list(tickers)
+        sql += f" WHERE ticker IN ({', '.join('?' * len(params))})"
+    elif ids is not None:
+        params = [int(i) for i in ids]
+        sql += f" WHERE id IN ({', '.join('?' * len(params))})"
+    conn = connect(path)
+    try:
+        rows = conn.execute(sql + " ORDER BY ticker", params).fetchall()
+    finally:
+        conn.close()
+
+    df = pd.DataFrame(rows, columns=wanted)
+    for col in FLOAT_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('float64')
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    if 'Timestamp' in df.columns:
+        df['Timestamp'] = _from_epoch(df['Timestamp'].astype('Int64'))
+    if 'ID' in df.columns:
+        df['ID'] = df['ID'].astype('int64')
+    return df
+
+
+# Rows where the fetch produced no values at all (failed-ticker stubs) carry nothing to merge
+def _has_values(df):
+    value_columns = [c for c in df.columns if c not in ('Ticker', 'Timestamp')]
+    return df[value_columns].notna().any(axis=1)
+
+
+def _upsert(conn, df):
+    df = normalize_prices(df.reindex(columns=PRICE_COLUMNS)).dropna(subset=['Ticker'])
+    df = df[_has_values(df)]
+    stored = df.astype(object)
+    stored['Timestamp'] = _to_epoch(df['Timestamp']).astype(object)
+    stored = stored.where(stored.notna(), None)
+    stored['ID'] = shared_symbols().assign(df['Ticker']).tolist()
+
+    cols = [SQL_COLUMNS[c] for c in STORE_COLUMNS]
+    updates = ", ".join(f"{c} = COALESCE(excluded.{c}, {c})" for c in cols if c not in ('ticker', 'id'))
+    sql = (f"INSERT INTO latest_prices ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))}) "
+           f"ON CONFLICT(ticker) DO UPDATE SET {updates} "
+           f"WHERE latest_prices.ts IS NULL OR excluded.ts > latest_prices.ts")
+    before = conn.total_changes
+    with conn:
+        conn.executemany(sql, stored[STORE_COLUMNS].itertuples(index=False, name=None))
+    return conn.total_changes - before
+
+
+# Batched upsert of fetched rows; a row only replaces a stored one with an older Timestamp.
+# Returns the number of rows inserted or updated.
+def upsert_prices(df, path=DB_PATH):
+    if df is None or df.empty:
+        return 0
+    conn = connect(path)
+    try:
+        return _upsert(conn, df)
+    finally:
+        conn.close()
+
+
+# Write the Parquet / CSV exports from the table (or from an already loaded frame)
+def export_prices(df=None, parquet=True, csv=True, path=PRICES_PATH, csv_path=PRICES_CSV_PATH):
+    df = load_prices() if df is None else df
+    if parquet and HAVE_PARQUET:
+        exported = df.copy()
+        exported['Timestamp'] = _to_epoch(exported['Timestamp'])
+        publish_parquet(exported, path, index=False)
+    if csv:
+        publish_csv(df, csv_path, index=False)
+    return df
+
@@ -0,0 +1,225 @@
+import logging
+import re
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+import pytz
+import yfinance as yf
+
+from batch_quotes import QUOTE_URL
+from concurrency import RateLimitError, is_throttle_error
+from fetch_engine import Provider, get_est_timestamp
+from response_cache import INFO_TTL, QUOTE_TTL
+from session_pool import shared_pool
+
+EST = pytz.timezone("US/Eastern")
+
+QUOTE_SUMMARY_URL = "https://query2.finance.yahoo.com/v10/finance/quoteSummary"
+INFO_MODULES = ['financialData', 'quoteType', 'defaultKeyStatistics', 'assetProfile', 'summaryDetail']
+
+
+# Same payload as yf.Ticker(t).get_info() (quoteSummary modules merged with the
+# v7 quote), but over a pooled session instead of a fresh negotiation per ticker.
+# With a cache, a payload younger than ttl is served from disk.
+def fetch_info(ticker, pool=None, cache=None, ttl=INFO_TTL):
+    if cache is not None:
+        return cache.read_through("yahoo", "get_info", ticker, lambda: fetch_info(ticker, pool), ttl)
+    pool = pool or shared_pool()
+    params = {'modules': ",".join(INFO_MODULES), 'formatted': 'false', 'corsDomain': 'finance.yahoo.com', 'symbol': ticker}
+    summary = pool.get_json(f"{QUOTE_SUMMARY_URL}/{ticker}", params=params)
+    quote = pool.get_json(QUOTE_URL, params={'symbols': ticker, 'formatted': 'false'})
+
+    merged = {}
+    for payload, key in ((summary, 'quoteSummary'), (quote, 'quoteResponse')):
+        result = ((payload or {}).get(key) or {}).get('result') or []
+        if result:
+            merged.update(result[0])
+
+    info = {}
+    for k, v in merged.items():
+        if isinstance(v, dict):
+            for k1, v1 in v.items():
+                if v1 is not None:
+                    info[k1] = v1
+        elif v is not None:
+            info[k] = v
+    return {k: v['raw'] if isinstance(v, dict) and 'raw' in v else v for k, v in info.items()}
+
+
+# ---- get_info payload -> flat row (full metrics scripts) ----
+class InfoProvider(Provider):
+    name = "yahoo.get_info"
+
+    def __init__(self, pool=None, cache=None):
+        self.pool = pool or shared_pool()
+        self.cache = cache
+
+    def fetch(self, ticker):
+        info = fetch_info(ticker, pool=self.pool, cache=self.cache)
+        if not info:
+            raise RateLimitError("Empty response (possible rate limit)")
+
+        # Flatten dict into row, skipping nested dicts/lists
+        row = {'Ticker': ticker, 'Timestamp': datetime.now(EST)}
+        for k, v in info.items():
+            if isinstance(v, (str, int, float, bool)) or v is None:
+                row[k] = v
+        return row
+
+    def failed_row(self, ticker):
+        return {'Ticker': ticker, 'Timestamp': datetime.now(EST)}
+
+    def failure_record(self, ticker, error):
+        return {'Ticker': ticker, 'Error': str(error)}
+
+
+# ---- yf.Ticker(t).fast_info -> latest_prices.csv row (per-symbol fallback for batch quotes) ----
+class FastInfoProvider(Provider):
+    name = "yfinance.fast_info"
+
+    def __init__(self, previous_close_attr='previous_close', timestamp_fn=get_est_timestamp, keep_failed_rows=True,
+                 cache=None, ttl=QUOTE_TTL):
+        self.previous_close_attr = previous_close_attr
+        self.timestamp_fn = timestamp_fn
+        self.keep_failed_rows = keep_failed_rows
+        self.cache = cache
+        self.ttl = ttl
+
+    # Cached rows keep the Timestamp of the original fetch
+    def fetch(self, ticker):
+        if self.cache is not None:
+            return self.cache.read_through("yfinance", f"fast_info.{self.previous_close_attr}", ticker,
+                                           lambda: self._fetch(ticker), self.ttl)
+        return self._fetch(ticker)
+
+    def _fetch(self, ticker):
+        fast = yf.Ticker(ticker).fast_info
+        price = getattr(fast, 'last_price', None)
+        if price is None:
+            raise Exception("No price data returned")
+        return {
+            'Ticker': ticker,
+            'Price': price,
+            'Type': getattr(fast, 'quote_type', None),
+            'Exchange': getattr(fast, 'exchange', None),
+            'Prev Close': getattr(fast, self.previous_close_attr, None),
+            'Open': getattr(fast, 'open', None),
+            'High': getattr(fast, 'day_high', None),
+            'Low': getattr(fast, 'day_low', None),
+            'Mkt Cap': getattr(fast, 'market_cap', None),
+            'Vol': getattr(fast, 'last_volume', None),
+            '10d Avg Vol': getattr(fast, 'ten_day_average_volume', None),
+            '3m Avg Vol': getattr(fast, 'three_month_average_volume', None),
+            'Sh': getattr(fast, 'shares', None),
+            '52w High': getattr(fast, 'year_high', None),
+            '52w Low': getattr(fast, 'year_low', None),
+            '52w Chg': getattr(fast, 'year_change', None),
+            '50d Avg': getattr(fast, 'fifty_day_average', None),
+            '200d Avg': getattr(fast, 'two_hundred_day_average', None),
+            'Timestamp': self.timestamp_fn()
+        }
+
+    def failed_row(self, ticker):
+        if not self.keep_failed_rows:
+            return None
+        return {'Ticker': ticker, 'Price': None, 'Timestamp': self.timestamp_fn()}
+
+    def failure_record(self, ticker, error):
+        return {'Ticker': ticker, 'Reason': str(error), 'When': self.timestamp_fn()}
+
+
+# ---- yf.download of one batch of tickers -> long 1m bars frame (fetch_1m_history) ----
+BAR_FIELDS = ['Volume', 'Open', 'High', 'Low', 'Close', 'Dividends', 'Stock Splits']
+
+
+# yf.download result (Ticker, Field) columns -> one row per ticker and bar; the
+# union-of-timestamps rows a ticker had no bar for are dropped
+def split_download(data, tickers):
+    columns = ['Ticker', 'Date'] + BAR_FIELDS
+    if data is None or data.empty:
+        return pd.DataFrame(columns=columns)
+    if not isinstance(data.columns, pd.MultiIndex):
+        data = pd.concat({tickers[0]: data}, axis=1)
+    # yfinance upper-cases symbols; hand rows back under the names we asked for
+    names = {t.upper(): t for t in tickers}
+    bars = data.stack(level=0, future_stack=True).rename_axis(['Date', 'Ticker']).reset_index()
+    bars = bars.dropna(subset=['Open', 'High', 'Low', 'Close'], how='all')
+    bars['Ticker'] = bars['Ticker'].map(lambda t: names.get(t, t))
+    return bars.reindex(columns=columns)
+
+
+# yf.download catches every per-ticker error, YFRateLimitError included, and only
+# logs it ("['AAPL', 'MSFT']: <error>") before returning whatever it got.
+# download_errors() collects those lines, logged from this thread, as {error: [tickers]}.
+class _DownloadErrors(logging.Handler):
+    def __init__(self, errors):
+        super().__init__(logging.ERROR)
+        self.errors = errors
+        self.thread = threading.get_ident()
+
+    def emit(self, record):
+        if record.thread != self.thread:
+            return
+        syms, sep, error = record.getMessage().partition("]: ")
+        if sep and syms.startswith("["):
+            self.errors.setdefault(error, []).extend(re.findall(r"'([^']+)'", syms))
+
+
+@contextmanager
+def download_errors():
+    errors = {}
+    handler = _DownloadErrors(errors)
+    logger = logging.getLogger("yfinance")
+    logger.addHandler(handler)
+    try:
+        yield errors
+    finally:
+        logger.removeHandler(handler)
+
+
+# What yfinance says when a symbol simply has no bars for the range
+NO_DATA_MARKERS = ("possibly delisted", "no price data", "no timezone", "data doesn't exist", "no data found")
+
+
+# A rate limit on any ticker throttles the whole batch. Other errors only fail it when
+# nothing came back at all; "no data" answers are left to the caller as missing tickers.
+def check_download(data, errors):
+    throttled = [e for e in errors if is_throttle_error(e)]
+    if throttled:
+        raise RateLimitError(f"{throttled[0]} ({sum(len(errors[e]) for e in throttled)} tickers)")
+    if data is None or data.empty:
+        failures = [e for e in errors if not any(m in e.lower() for m in NO_DATA_MARKERS)]
+        if failures:
+            raise Exception(f"Download failed for {len(errors[failures[0]])} tickers: {failures[0]}")
+
+
+class HistoryBatchProvider(Provider):
+    name = "yfinance.download"
+
+    # Keys are (start, tickers): start None fetches the whole period, otherwise bars from start on
+    def __init__(self, interval='1m', period='7d'):
+        self.interval = interval
+        self.period = period
+
+    def cost(self, batch):
+        return len(batch[1])
+
+    def fetch(self, batch):
+        start, tickers = batch
+        # Threads stay off inside a call: the engine's controller is the only bound on concurrency.
+        # auto_adjust like Ticker.history's default, the incremental paths and the legacy CSV
+        # import, so the store only ever holds adjusted bars
+        with download_errors() as errors:
+            data = yf.download(list(tickers), start=start, period=None if start is not None else self.period,
+                               interval=self.interval, group_by='ticker', actions=True, auto_adjust=True,
+                               threads=False, progress=False, multi_level_index=True)
+        # Throttled tickers raise RateLimitError (AIMD cut, breaker, retry). No bars without
+        # one is a normal answer (weekend, holiday, a re-run straight after a fetch): the
+        # batch's tickers are reported as missing
+        check_download(data, errors)
+        return split_download(data, list(tickers))
+
+    def failure_record(self, batch, error):
+        return {'Tickers': " ".join(batch[1]), 'Reason': str(error), 'When': get_est_timestamp()}
@@ -0,0 +1,181 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from shared_limiter import _lock_file, _unlock_file
+
+# Atomic, crash-safe publishing of the files other processes read
+# (latest_prices.csv / .parquet, full_metrics.csv and the asset-class outputs,
+# history parts, the minute panel).
+#
+# A file is written next to its target under a temp name, fsynced and swapped
+# in with os.replace, so a reader (the workbook, another script) sees either
+# the old file or the new one -- never a truncated one -- and a crash mid-write
+# leaves the previous version intact. Every publish also bumps a generation
+# counter in a small sidecar file, <file>.gen, holding
+#   "<generation> <written, ns since epoch> <bytes>"
+# Readers compare the generation they last loaded with generation(path), a
+# read of a few bytes, and only reparse the file when it moved; PublishedFile
+# wraps that for Python readers, and VBA can read the sidecar the same way. A
+# PublishedFile with a reader name also remembers, across runs, the generation
+# that reader last finished with (Source Data/Readers), so a one-shot script
+# can skip its work entirely when its input hasn't been republished.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.abspath(os.path.join(BASE_DIR, ".."))
+LOCK_PATH = os.path.join(ROOT_DIR, "Locks", "publish.lock")
+READERS_DIR = os.path.join(ROOT_DIR, "Source Data", "Readers")
+
+# Windows won't replace a file another process holds open without delete sharing
+# (Excel with the CSV open); wait that out for a while before giving up
+REPLACE_RETRIES = 40
+REPLACE_WAIT = 0.25
+
+_thread_lock = threading.Lock()
+
+
+def gen_path(path):
+    return path + ".gen"
+
+
+def temp_path(path):
+    folder, name = os.path.split(os.path.abspath(path))
+    return os.path.join(folder, f".{name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+
+def _fsync(path):
+    with open(path, "r+b") as f:
+        os.fsync(f.fileno())
+
+
+# Makes the rename itself durable; directories can't be opened for fsync on Windows
+def _fsync_dir(folder):
+    if os.name == "nt":
+        return
+    fd = os.open(folder, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _replace(tmp, path):
+    for attempt in range(REPLACE_RETRIES):
+        try:
+            os.replace(tmp, path)
+            return
+        except PermissionError:
+            if attempt == REPLACE_RETRIES - 1:
+                raise
+            time.sleep(REPLACE_WAIT)
+
+
+# Generation of the last publish of path (0 if it was never published)
+def generation(path):
+    try:
+        with open(gen_path(path), encoding="utf-8") as f:
+            return int(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def _bump(path, size):
+    os.makedirs(os.path.dirname(LOCK_PATH), exist_ok=True)
+    # Threads of this process serialize here, processes on the file lock
+    with _thread_lock, open(LOCK_PATH, "a+") as lock:
+        _lock_file(lock)
+        try:
+            gen = generation(path) + 1
+            tmp = temp_path(gen_path(path))
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(f"{gen} {time.time_ns()} {size}\n")
+                f.flush()
+                os.fsync(f.fileno())
+            _replace(tmp, gen_path(path))
+        finally:
+            _unlock_file(lock)
+    return gen
+
+
+# Swap a finished temp file in as path; counter is whose generation to bump
+# (path itself by default, or e.g. a store directory its part files belong to).
+# Returns the new generation.
+def commit(tmp, path, counter=None):
+    _fsync(tmp)
+    size = os.path.getsize(tmp)
+    _replace(tmp, path)
+    _fsync_dir(os.path.dirname(os.path.abspath(path)))
+    return _bump(counter or path, size)
+
+
+# with atomic_path(path) as tmp: write tmp however you like; it replaces path on success
+@contextmanager
+def atomic_path(path, counter=None):
+    tmp = temp_path(path)
+    try:
+        yield tmp
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    commit(tmp, path, counter)
+
+
+def publish_csv(df, path, **kwargs):
+    with atomic_path(path) as tmp:
+        df.to_csv(tmp, **kwargs)
+    return generation(path)
+
+
+def publish_parquet(df, path, **kwargs):
+    with atomic_path(path) as tmp:
+        df.to_parquet(tmp, **kwargs)
+    return generation(path)
+
+
+# A published file loaded once per generation: get() reparses only after a new publish.
+# With a reader name, done() records the loaded generation for that reader's next run.
+class PublishedFile:
+    def __init__(self, path, loader, reader=None):
+        self.path = path
+        self.loader = loader
+        self.reader = reader
+        self.generation = None
+        self.data = None
+
+    def _bookmark_path(self):
+        return os.path.join(READERS_DIR, f"{self.reader}--{os.path.basename(self.path)}.seen")
+
+    # Generation this reader finished with last run (None if unknown)
+    def last_seen(self):
+        if self.reader is None:
+            return None
+        try:
+            with open(self._bookmark_path(), encoding="utf-8") as f:
+                return int(f.read().split()[0])
+        except (OSError, ValueError, IndexError):
+            return None
+
+    def changed(self):
+        gen = generation(self.path)
+        if self.data is not None:
+            return gen != self.generation
+        # Generation 0: never published through publish.py, so there's no telling
+        return gen == 0 or gen != self.last_seen()
+
+    def done(self):
+        if self.reader is None or self.generation is None:
+            return
+        os.makedirs(READERS_DIR, exist_ok=True)
+        with atomic_path(self._bookmark_path()) as tmp:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(f"{self.generation}\n")
+
+    def get(self):
+        # Read the counter first: a publish landing mid-load shows up as changed next time
+        gen = generation(self.path)
+        if self.data is None or gen != self.generation:
+            self.data = self.loader(self.path)
+            self.generation = gen
+        return self.data
@@ -0,0 +1,164 @@
+import os
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import pytz
+
+from publish import publish_csv
+
+# Tiered refresh for full metrics, driven by the categories in dictionary.csv.
+#
+# Every category gets a time-to-live. A ticker is refetched with get_info only
+# when one of its categories has expired; the ledger (full_metrics_refresh.csv)
+# records when each ticker's categories were last refreshed. Fundamentals expire
+# "after filings": once the next 10-Q is due (latest quarter + one quarter + the
+# 45 day filing window), with a one-quarter backstop. Between full refreshes the
+# price-driven categories are refreshed daily from the batch quote endpoint,
+# which covers hundreds of tickers per request.
+
+EST = pytz.timezone("US/Eastern")
+
+FILINGS = "filings"
+DEFAULT_TTL = timedelta(days=7)
+CATEGORY_TTL = {
+    "Identity": timedelta(days=30),
+    "Risk & Governance": timedelta(days=30),
+    "Ownership": timedelta(days=30),
+    "Share Structure": timedelta(days=14),
+    "Analyst Sentiment": timedelta(days=7),
+    "Dividend": timedelta(days=7),
+    "Liquidity & Trading": timedelta(days=7),
+    "Historical & Technical": timedelta(days=7),
+    "Valuation": timedelta(days=7),
+    "Price-Based Valuation Multiples": timedelta(days=7),
+    "Enterprise Value Multiples": timedelta(days=7),
+    "Balance Sheet Health": FILINGS,
+    "Earnings": FILINGS,
+    "Margins": FILINGS,
+    "Cashflow": FILINGS,
+    "Growth": FILINGS,
+    "Per Share Financials": FILINGS,
+    "Financial Reporting": FILINGS,
+}
+QUARTER = timedelta(days=91)
+FILING_LAG = timedelta(days=45)
+FILING_BACKSTOP = timedelta(days=100)
+
+# Daily quote refresh for the categories whose fields the v7 quote carries
+QUOTE_TTL = timedelta(days=1)
+QUOTE_CATEGORIES = ["Liquidity & Trading", "Historical & Technical", "Valuation", "Price-Based Valuation Multiples"]
+QUOTE_COLUMN = "Quote"
+
+# get_info key <- v7 quote key (fields a batch quote can refresh)
+QUOTE_INFO_FIELDS = {
+    'previousClose': 'regularMarketPreviousClose',
+    'open': 'regularMarketOpen',
+    'dayLow': 'regularMarketDayLow',
+    'dayHigh': 'regularMarketDayHigh',
+    'volume': 'regularMarketVolume',
+    'fiftyTwoWeekLow': 'fiftyTwoWeekLow',
+    'fiftyTwoWeekHigh': 'fiftyTwoWeekHigh',
+    '52WeekChange': 'fiftyTwoWeekChangePercent',
+    'marketCap': 'marketCap',
+    'fiftyDayAverage': 'fiftyDayAverage',
+    'fiftyDayAverageChange': 'fiftyDayAverageChange',
+    'fiftyDayAverageChangePercent': 'fiftyDayAverageChangePercent',
+    'twoHundredDayAverage': 'twoHundredDayAverage',
+    'twoHundredDayAverageChange': 'twoHundredDayAverageChange',
+    'twoHundredDayAverageChangePercent': 'twoHundredDayAverageChangePercent',
+    'trailingPE': 'trailingPE',
+    'forwardPE': 'forwardPE',
+    'priceToBook': 'priceToBook',
+}
+
+
+# {category: ttl} for every dictionary.csv category that maps to a YF field
+def category_ttls(dict_csv_path):
+    schema = pd.read_csv(dict_csv_path, encoding="utf-8-sig")
+    schema = schema[schema["Sheet"].eq("Screener") & schema["YF Code"].notna()]
+    return {cat: CATEGORY_TTL.get(cat, DEFAULT_TTL) for cat in schema["Category"].dropna().unique()}
+
+
+def load_ledger(path, categories):
+    columns = list(categories) + [QUOTE_COLUMN]
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=columns, index=pd.Index([], name="Ticker"))
+    ledger = pd.read_csv(path, index_col="Ticker")
+    ledger = ledger[~ledger.index.duplicated(keep="last")].reindex(columns=columns)
+    for col in columns:
+        ledger[col] = pd.to_datetime(ledger[col], errors="coerce", utc=True).dt.tz_convert(EST)
+    return ledger
+
+
+def save_ledger(ledger, path):
+    publish_csv(ledger.sort_index(), path, index_label="Ticker")
+
+
+def stamp(ledger, tickers, columns, now):
+    ledger = ledger.reindex(ledger.index.union(pd.Index(tickers, name="Ticker")))
+    for col in columns:
+        if col not in ledger.columns:
+            ledger[col] = pd.Series(pd.NaT, index=ledger.index, dtype="datetime64[ns, US/Eastern]")
+        ledger.loc[list(tickers), col] = now
+    return ledger
+
+
+def _stamps(ledger, tickers, col):
+    if col in ledger.columns:
+        return ledger[col].reindex(tickers)
+    return pd.Series(pd.NaT, index=tickers, dtype="datetime64[ns, US/Eastern]")
+
+
+# Returns (tickers needing a full get_info refresh, tickers needing only a quote refresh)
+def plan_refresh(ledger, tickers, ttls, now, latest_qtr=None):
+    index = pd.Index(tickers, name="Ticker")
+    full = pd.Series(False, index=index)
+    if latest_qtr is None:
+        latest_qtr = pd.Series(pd.NaT, index=index, dtype="datetime64[ns, US/Eastern]")
+    next_filing = latest_qtr.reindex(index) + QUARTER + FILING_LAG
+
+    for cat, ttl in ttls.items():
+        last = _stamps(ledger, index, cat)
+        if ttl == FILINGS:
+            filed_since = next_filing.notna() & (next_filing <= now) & (last < next_filing)
+            expired = last.isna() | (last < now - FILING_BACKSTOP) | filed_since
+        else:
+            expired = last.isna() | (last < now - ttl)
+        full |= expired.to_numpy()
+
+    quote_stamps = [_stamps(ledger, index, c) for c in QUOTE_CATEGORIES + [QUOTE_COLUMN]]
+    last_quote = pd.concat(quote_stamps, axis=1).max(axis=1)
+    quote = ~full & (last_quote.isna() | (last_quote < now - QUOTE_TTL)).to_numpy()
+    return list(index[full.to_numpy()]), list(index[quote.to_numpy()])
+
+
+# Raw v7 quotes -> frame of get_info-named fields, indexed by Ticker
+def quote_info_frame(quotes):
+    rows = {}
+    for ticker, quote in quotes.items():
+        rows[ticker] = {key: quote.get(field) for key, field in QUOTE_INFO_FIELDS.items()}
+    frame = pd.DataFrame.from_dict(rows, orient="index", columns=list(QUOTE_INFO_FIELDS))
+    frame.index.name = "Ticker"
+    # get_info reports the 52 week change as a fraction, the quote as percent
+    frame['52WeekChange'] = pd.to_numeric(frame['52WeekChange'], errors="coerce") / 100
+    return frame
+
+
+# Keep untouched rows, replace refetched rows, then patch quote-refreshed fields
+def merge_tiered(existing, fresh, quote_updates, universe):
+    merged = existing.set_index("Ticker")
+    fresh = fresh.set_index("Ticker")
+    merged = pd.concat([merged[~merged.index.isin(fresh.index)], fresh])
+    if quote_updates is not None and not quote_updates.empty:
+        merged.update(quote_updates[quote_updates.columns.intersection(merged.columns)])
+    merged = merged[merged.index.isin(set(universe))]
+    return merged.reset_index()
+
+
+def recalc_quote_dependent(df):
+    # PEG uses the forward P/E, which the quote refresh updates
+    if "P/E (FWD)" in df.columns and "EPS Gr %" in df.columns:
+        peg = pd.to_numeric(df["P/E (FWD)"], errors="coerce") / pd.to_numeric(df["EPS Gr %"], errors="coerce")
+        df["PEG R"] = peg.where(np.isfinite(peg))
+    return df
@@ -0,0 +1,154 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# On-disk cache of raw provider responses, shared by all fetch scripts.
+#
+# Entries are keyed by (provider, endpoint, ticker) and store the raw payload
+# with its fetch time and TTL, so a re-run after a crash, a transform tweak or
+# an asset-class variant reads the cache instead of the rate-limited API.
+# The file is size-bounded: once it grows past max_bytes the least recently
+# used entries are evicted. SQLite in WAL mode lets several scripts share it;
+# the total size lives in a one-row cache_meta table that every write updates in
+# its own transaction, so all of them evict against the same number.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.abspath(os.path.join(BASE_DIR, ".."))
+CACHE_PATH = os.path.join(ROOT_DIR, "Source Data", "Cache", "responses.sqlite")
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+INFO_TTL = 12 * 3600       # get_info payloads
+QUOTE_TTL = 60             # fast_info / v7 quote rows
+
+
+class ResponseCache:
+    def __init__(self, path=CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                provider TEXT NOT NULL,
+                endpoint TEXT NOT NULL,
+                ticker TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                ttl REAL NOT NULL,
+                last_access REAL NOT NULL,
+                size INTEGER NOT NULL,
+                payload TEXT NOT NULL,
+                PRIMARY KEY (provider, endpoint, ticker)
+            )""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses (last_access)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS cache_meta (id INTEGER PRIMARY KEY CHECK (id = 0), total INTEGER NOT NULL)")
+        # A cache file from before the running total: count it once
+        self._db.execute("INSERT OR IGNORE INTO cache_meta SELECT 0, COALESCE(SUM(size), 0) FROM responses")
+        self._size = self._total_size()
+
+    # Returns the cached payload, or None when missing or older than its TTL (or max_age, if given)
+    def get(self, provider, endpoint, ticker, max_age=None):
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT fetched_at, ttl, payload FROM responses WHERE provider=? AND endpoint=? AND ticker=?",
+                (provider, endpoint, ticker)).fetchone()
+            if row is None or now - row[0] > (row[1] if max_age is None else max_age):
+                self.misses += 1
+                return None
+            self._db.execute(
+                "UPDATE responses SET last_access=? WHERE provider=? AND endpoint=? AND ticker=?",
+                (now, provider, endpoint, ticker))
+            self.hits += 1
+        return json.loads(row[2])
+
+    def put(self, provider, endpoint, ticker, payload, ttl):
+        data = json.dumps(payload, default=str)
+        now = time.time()
+        with self._lock:
+            # One write transaction: other scripts share the file, so the running total moves
+            # inside it (not per process) and the eviction decision can't race theirs
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                old = self._db.execute(
+                    "SELECT size FROM responses WHERE provider=? AND endpoint=? AND ticker=?",
+                    (provider, endpoint, ticker)).fetchone()
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (provider, endpoint, ticker, now, ttl, now, len(data), data))
+                self._size = self._add_size(len(data) - (old[0] if old else 0))
+                if self._size > self.max_bytes:
+                    self._evict()
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def _total_size(self):
+        return self._db.execute("SELECT total FROM cache_meta WHERE id = 0").fetchone()[0]
+
+    def _add_size(self, delta):
+        self._db.execute("UPDATE cache_meta SET total = total + ? WHERE id = 0", (delta,))
+        return self._total_size()
+
+    # Drop least recently used entries until the cache is back under 90% of its budget
+    def _evict(self):
+        target = self.max_bytes * 0.9
+        doomed, freed = [], 0
+        # Walks the LRU index only as far as needed
+        for rowid, size in self._db.execute("SELECT rowid, size FROM responses ORDER BY last_access"):
+            if self._size - freed <= target:
+                break
+            doomed.append((rowid,))
+            freed += size
+        self._db.executemany("DELETE FROM responses WHERE rowid=?", doomed)
+        self._size = self._add_size(-freed)
+        self.evictions += len(doomed)
+
+    # Read-through: cached payload if fresh, else fetch_fn() stored under the key
+    def read_through(self, provider, endpoint, ticker, fetch_fn, ttl):
+        payload = self.get(provider, endpoint, ticker)
+        if payload is None:
+            payload = fetch_fn()
+            if payload:
+                self.put(provider, endpoint, ticker, payload, ttl)
+        return payload
+
+    def clear(self, provider=None):
+        with self._lock:
+            if provider is None:
+                self._db.execute("DELETE FROM responses")
+            else:
+                self._db.execute("DELETE FROM responses WHERE provider=?", (provider,))
+            self._db.execute("UPDATE cache_meta SET total = (SELECT COALESCE(SUM(size), 0) FROM responses) WHERE id = 0")
+            self._size = self._total_size()
+
+    def stats(self):
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            self._size = self._total_size()
+        return {'entries': entries, 'bytes': self._size, 'hits': self.hits,
+                'misses': self.misses, 'evictions': self.evictions}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+def shared_cache(path=CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = ResponseCache(path, max_bytes)
+        return _shared_cache
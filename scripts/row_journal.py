@@ -0,0 +1,104 @@
+import json
+import os
+import threading
+
+import pandas as pd
+
+# Append-only journal of completed rows for long fetch runs.
+#
+# Each finished row is appended as one JSON line and flushed as soon as its
+# fetch completes, so a crash, rate-limit lockout or Ctrl-C loses at most the
+# requests in flight. A restart reads the journal back, skips the tickers it
+# already holds, and the final outputs are built by streaming it in chunks.
+# A ticker journaled twice (e.g. recovered on retry) keeps its last row.
+
+FSYNC_EVERY = 50
+
+
+class RowJournal:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+        self._pending = 0
+
+    def exists(self):
+        return os.path.exists(self.path) and os.path.getsize(self.path) > 0
+
+    # Start over: drop what a previous run left behind
+    def reset(self):
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def append(self, row):
+        line = json.dumps(row, default=str)
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+                # Terminate a line cut short by a crash so it doesn't swallow the next row
+                if self._file.tell() > 0:
+                    with open(self.path, "rb") as f:
+                        f.seek(-1, os.SEEK_END)
+                        if f.read(1) != b"\n":
+                            self._file.write("\n")
+            self._file.write(line + "\n")
+            self._file.flush()
+            self._pending += 1
+            if self._pending >= FSYNC_EVERY:
+                os.fsync(self._file.fileno())
+                self._pending = 0
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+
+    # FetchEngine on_result hook: journal successful rows as they complete
+    def on_result(self, key, row, fail):
+        if row is not None and not fail:
+            self.append(row)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+                self._file = None
+                self._pending = 0
+
+    def _lines(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # A line cut short by a crash mid-write
+                    continue
+
+    # Tickers with a journaled row
+    def completed(self):
+        return {row.get('Ticker') for row in self._lines()} - {None}
+
+    # Journaled rows as DataFrames of up to chunksize rows, last row per ticker only
+    def iter_chunks(self, chunksize=2000):
+        last = {}
+        for i, row in enumerate(self._lines()):
+            last[row.get('Ticker')] = i
+        keep = set(last.values())
+
+        chunk = []
+        for i, row in enumerate(self._lines()):
+            if i in keep:
+                chunk.append(row)
+                if len(chunk) >= chunksize:
+                    yield pd.DataFrame(chunk)
+                    chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk)
+
+    def __len__(self):
+        return len(self.completed())
@@ -0,0 +1,134 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Column types for the tables the scripts read back (full_metrics.csv,
+# latest_prices.csv, the asset-class *_full_metrics.csv outputs).
+#
+# Every column is a dictionary.csv Short Name, and RENAME_MAP maps Yahoo's
+# get_info keys onto them. Low-cardinality labels load as categoricals, counts
+# and scores as nullable ints, identifiers and date strings as strings, and
+# everything else as float64 (money and share counts keep full precision for
+# sums and Excel). read_table() declares those dtypes to the (multithreaded,
+# with pyarrow installed) CSV parser, so nothing needs pd.to_numeric column by
+# column afterwards; columns the registry doesn't know are still inferred.
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    HAVE_ARROW = True
+except ImportError:
+    HAVE_ARROW = False
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.abspath(os.path.join(BASE_DIR, ".."))
+DICT_CSV_PATH = os.path.join(ROOT_DIR, "Source Data", "dictionary.csv")
+
+# get_info key -> Short Name for the equity screener (full_metrics.csv)
+RENAME_MAP = {'industry': 'Industry', 'sector': 'Sector', 'country': 'Country', 'state': 'State', 'fullTimeEmployees': 'Employees', 'quoteType': 'Type', 'fullExchangeName': 'Exchange', 'previousClose': 'Prev Close', 'open': 'Open', 'dayLow': 'Low', 'dayHigh': 'High', 'volume': 'Vol', 'beta': 'Beta', 'fiftyTwoWeekLow': '52w Low', 'fiftyTwoWeekHigh': '52w High', '52WeekChange': '52w % Chg', 'marketCap': 'Mkt Cap', 'enterpriseValue': 'EV', 'sharesOutstanding': 'Sh', 'floatShares': 'Float', 'sharesShort': 'Short Int', 'sharesShortPriorMonth': 'Short Int PM', 'quickRatio': 'Quick R', 'currentRatio': 'Curr R', 'totalCash': 'Cash', 'totalDebt': 'Debt', 'debtToEquity': 'D/E', 'totalRevenue': 'Rev', 'grossProfits': 'Gr P', 'ebitda': 'EBITDA', 'netIncomeToCommon': 'Net Inc', 'returnOnAssets': 'ROA', 'returnOnEquity': 'ROE', 'trailingEps': 'EPS (TTM)', 'forwardEps': 'EPS (FWD)', 'grossMargins': 'Gr M', 'ebitdaMargins': 'EBITDA M', 'operatingMargins': 'Op M', 'profitMargins': 'Net Inc M', 'operatingCashflow': 'Op CF', 'freeCashflow': 'FCF', 'earningsGrowth': 'EPS Gr %', 'earningsQuarterlyGrowth': 'EPS Qtr Gr %', 'revenueGrowth': 'Rev Gr %', 'revenuePerShare': 'Rev/Sh', 'totalCashPerShare': 'Cash/Sh', 'bookValue': 'BV/Sh', 'trailingPE': 'P/E (TTM)', 'forwardPE': 'P/E (FWD)', 'priceToSalesTrailing12Months': 'P/S (TTM)', 'priceToBook': 'P/B', 'enterpriseToRevenue': 'EV/Rev', 'enterpriseToEbitda': 'EV/EBITDA', 'trailingAnnualDividendRate': 'Div Rate', 'trailingAnnualDividendYield': 'Div Yield', 'targetLowPrice': 'Target Low', 'targetHighPrice': 'Target High', 'targetMeanPrice': 'Target Mean', 'targetMedianPrice': 'Target Median', 'recommendationMean': 'Avg Rating', 'recommendationKey': 'Rec', 'numberOfAnalystOpinions': 'Analysts', 'fiftyDayAverage': '50d Avg', 'fiftyDayAverageChange': '50d Chg', 'fiftyDayAverageChangePercent': '50d % Chg', 'twoHundredDayAverage': '200d Avg', 'twoHundredDayAverageChange': '200d Chg', 'twoHundredDayAverageChangePercent': '200d % Chg', 'lastSplitFactor': 'Split', 'lastSplitDate': 'Split Date', 'auditRisk': 'Audit Risk', 'boardRisk': 'Board Risk', 'shareHolderRightsRisk': 'SH Rights Risk', 'compensationRisk': 'Comp Risk', 'overallRisk': 'Total Risk', 'heldPercentInsiders': 'Insider %', 'heldPercentInstitutions': 'Inst %', 'lastFiscalYearEnd': 'FY End', 'nextFiscalYearEnd': 'Next FY', 'mostRecentQuarter': 'Latest Qtr'}
+
+CATEGORY_COLUMNS = ['Type', 'Exchange', 'Sector', 'Industry', 'Country', 'State', 'Rec', 'Category', 'Family']
+TEXT_COLUMNS = ['Ticker', 'Name', 'CIK', 'Split', 'Split Date', 'FY End', 'Next FY', 'Latest Qtr', 'City',
+                'Lead Inv', 'Last Raise Date', 'Last Class', 'Founded', 'Timestamp']
+INT_COLUMNS = {
+    'Employees': 'Int64', 'First Trade': 'Int64',
+    'Analysts': 'Int32', 'T Analysts': 'Int32', '# of Companies': 'Int32', 'Rounds': 'Int32',
+    'Audit Risk': 'Int8', 'Board Risk': 'Int8', 'SH Rights Risk': 'Int8', 'Comp Risk': 'Int8',
+    'Total Risk': 'Int8', 'Risk Rating': 'Int8', 'Overall Rating': 'Int8',
+}
+
+
+def _dictionary_columns(path=DICT_CSV_PATH):
+    columns = list(RENAME_MAP.values())
+    if os.path.exists(path):
+        schema = pd.read_csv(path, encoding="utf-8-sig", usecols=["Short Name"])
+        columns += schema["Short Name"].dropna().str.strip().tolist()
+    return list(dict.fromkeys(columns))
+
+
+def build_dtypes(path=DICT_CSV_PATH):
+    dtypes = {}
+    for col in _dictionary_columns(path) + TEXT_COLUMNS + list(INT_COLUMNS):
+        if col in CATEGORY_COLUMNS:
+            dtypes[col] = 'category'
+        elif col in TEXT_COLUMNS:
+            dtypes[col] = 'string'
+        elif col in INT_COLUMNS:
+            dtypes[col] = INT_COLUMNS[col]
+        else:
+            dtypes[col] = 'float64'
+    return dtypes
+
+
+DTYPES = build_dtypes()
+
+
+# Float column -> nullable int, unless a value doesn't fit (then it stays float)
+def _to_int(values, dtype):
+    values = pd.to_numeric(values, errors='coerce')
+    finite = values[np.isfinite(values)]
+    info = np.iinfo(dtype.lower())
+    if ((finite % 1) == 0).all() and finite.between(info.min, info.max).all():
+        return values.where(np.isfinite(values)).astype(dtype)
+    return values.astype('float64')
+
+
+# Cast a frame already in memory (fresh fetch rows, a CSV read without the schema)
+def apply_schema(df):
+    df = df.copy()
+    for col in df.columns:
+        dtype = DTYPES.get(col)
+        if dtype is None or str(df[col].dtype) == dtype:
+            continue
+        if dtype == 'category':
+            df[col] = df[col].astype('category')
+        elif dtype == 'string':
+            df[col] = df[col].astype('string')
+        elif dtype in INT_COLUMNS.values():
+            df[col] = _to_int(df[col], dtype)
+        else:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('float64')
+    return df
+
+
+def _arrow_type(dtype):
+    if dtype == 'category':
+        return pa.dictionary(pa.int32(), pa.string())
+    if dtype == 'string':
+        return pa.string()
+    return pa.float64()
+
+
+def _read_arrow(path, wanted, dtypes):
+    convert = pa_csv.ConvertOptions(column_types={c: _arrow_type(d) for c, d in dtypes.items()},
+                                    include_columns=wanted, strings_can_be_null=True)
+    table = pa_csv.read_csv(path, convert_options=convert)
+    return table.to_pandas(types_mapper={pa.string(): pd.StringDtype()}.get)
+
+
+# Typed CSV read: dtypes are declared to the parser; ints load as floats and are narrowed after
+def read_table(path, columns=None):
+    header = pd.read_csv(path, nrows=0).columns
+    wanted = [c for c in header if columns is None or c in columns]
+    dtypes = {c: DTYPES[c] for c in wanted if c in DTYPES}
+    try:
+        if HAVE_ARROW:
+            df = _read_arrow(path, wanted, dtypes)
+        else:
+            parse = {c: ('float64' if d in INT_COLUMNS.values() else d) for c, d in dtypes.items()}
+            df = pd.read_csv(path, usecols=wanted, dtype=parse)
+    except (ValueError, TypeError):
+        # A stray non-numeric value somewhere (ArrowInvalid is a ValueError): infer, then coerce
+        return apply_schema(pd.read_csv(path, usecols=wanted, low_memory=False))
+    for col, dtype in dtypes.items():
+        if dtype in INT_COLUMNS.values():
+            df[col] = _to_int(df[col], dtype)
+    return df
+
+
+# fillna on a categorical needs the fill value among its categories
+def fill_category(values, value):
+    if value not in values.cat.categories:
+        values = values.cat.add_categories([value])
+    return values.fillna(value)
@@ -0,0 +1,169 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from curl_cffi import requests
+from yfinance.data import YfData
+
+from concurrency import RateLimitError
+
+# Pooled Yahoo HTTP sessions shared by all fetch workers.
+#
+# Each session does its TLS handshake and cookie / crumb negotiation once and is
+# then reused (keep-alive) for every ticker it serves. Workers get the least
+# loaded healthy session, preferring the one their thread used last so curl's
+# per-thread connection stays warm. A session that keeps getting throttled is
+# evicted and replaced with a fresh one (new cookies, new crumb).
+# yfinance's own calls (fast_info fallback, history, download) go through its
+# process-wide YfData singleton, which is handed one pooled session once.
+
+COOKIE_URL = "https://fc.yahoo.com"
+CRUMB_URL = "https://query1.finance.yahoo.com/v1/test/getcrumb"
+
+
+class PooledSession:
+    def __init__(self, session_id, impersonate):
+        self.id = session_id
+        self.session = requests.Session(impersonate=impersonate)
+        self.crumb = None
+        self.in_flight = 0
+        self.requests = 0
+        self.throttles = 0
+        self.created = time.time()
+        self.lock = threading.Lock()
+
+    def ensure_crumb(self, timeout=30):
+        with self.lock:
+            if self.crumb:
+                return self.crumb
+            try:
+                # Only sets the consent cookies, the response itself is usually a 404
+                self.session.get(COOKIE_URL, timeout=timeout, allow_redirects=True)
+            except Exception:
+                pass
+            r = self.session.get(CRUMB_URL, timeout=timeout)
+            if r.status_code == 429:
+                raise RateLimitError("Too Many Requests (crumb)")
+            crumb = r.text.strip()
+            if r.status_code != 200 or not crumb or "<html" in crumb.lower():
+                raise Exception(f"Could not negotiate Yahoo crumb (HTTP {r.status_code})")
+            self.crumb = crumb
+            return crumb
+
+    def close(self):
+        try:
+            self.session.close()
+        except Exception:
+            pass
+
+
+class SessionPool:
+    def __init__(self, size=8, impersonate="chrome", max_throttles=3):
+        self.size = size
+        self.impersonate = impersonate
+        self.max_throttles = max_throttles
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._next_id = 0
+        self._sessions = [self._new_session() for _ in range(size)]
+        # The session handed to yfinance's singleton stays open even once evicted
+        self._yf_session = None
+        self.evictions = 0
+        self.handshakes = 0
+
+    def _new_session(self):
+        self._next_id += 1
+        return PooledSession(self._next_id, self.impersonate)
+
+    def _pick(self):
+        last = getattr(self._local, 'session', None)
+        if last is not None and last in self._sessions and last.in_flight == 0:
+            return last
+        return min(self._sessions, key=lambda s: (s.in_flight, s.requests))
+
+    @contextmanager
+    def session(self):
+        with self._lock:
+            pooled = self._pick()
+            pooled.in_flight += 1
+        self._local.session = pooled
+        try:
+            yield pooled
+        finally:
+            with self._lock:
+                pooled.in_flight -= 1
+                pooled.requests += 1
+                # Last request on an evicted session: nothing else can pick it now
+                drop = pooled.in_flight == 0 and pooled not in self._sessions
+            if drop:
+                self._close(pooled)
+
+    def _close(self, pooled):
+        if pooled is not self._yf_session:
+            pooled.close()
+
+    def mark_throttled(self, pooled):
+        with self._lock:
+            pooled.throttles += 1
+            if pooled.throttles >= self.max_throttles and pooled in self._sessions:
+                self._sessions[self._sessions.index(pooled)] = self._new_session()
+                self.evictions += 1
+                # Requests still in flight on it finish normally; the last one closes it (session())
+                if pooled.in_flight == 0:
+                    self._close(pooled)
+
+    # stale: the crumb a request was rejected with. Only that crumb is discarded, so when
+    # several requests hit the expiry at once the first renews it and the rest reuse the new one.
+    def _ensure_crumb(self, pooled, timeout, stale=None):
+        with pooled.lock:
+            if stale is not None and pooled.crumb == stale:
+                pooled.crumb = None
+            renew = pooled.crumb is None
+        if renew:
+            with self._lock:
+                self.handshakes += 1
+        return pooled.ensure_crumb(timeout)
+
+    def get_json(self, url, params=None, timeout=30):
+        with self.session() as pooled:
+            params = dict(params or {})
+            params['crumb'] = self._ensure_crumb(pooled, timeout)
+            r = pooled.session.get(url, params=params, timeout=timeout)
+            if r.status_code == 401:
+                # Crumb expired: renegotiate once on this session
+                params['crumb'] = self._ensure_crumb(pooled, timeout, stale=params['crumb'])
+                r = pooled.session.get(url, params=params, timeout=timeout)
+            if r.status_code == 429:
+                self.mark_throttled(pooled)
+                raise RateLimitError("429 Too Many Requests")
+            r.raise_for_status()
+            return r.json()
+
+    # Point yfinance's shared YfData at one of our sessions (set once: it is a singleton)
+    def share_with_yfinance(self):
+        with self._lock:
+            self._yf_session = self._sessions[0]
+            YfData(session=self._yf_session.session)
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'size': len(self._sessions),
+                'in_flight': sum(s.in_flight for s in self._sessions),
+                'requests': sum(s.requests for s in self._sessions),
+                'handshakes': self.handshakes,
+                'evictions': self.evictions,
+            }
+
+
+_shared_pool = None
+_shared_lock = threading.Lock()
+
+
+def shared_pool(size=8):
+    global _shared_pool
+    with _shared_lock:
+        if _shared_pool is None:
+            _shared_pool = SessionPool(size=size)
+            _shared_pool.share_with_yfinance()
+        return _shared_pool
@@ -0,0 +1,174 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from tqdm import tqdm
+
+# Machine-wide token bucket and circuit breaker shared by every fetch process.
+#
+# Several scripts (and up to five fetch_latest_filtered_prices.py instances)
+# can run at once, each with its own AIMD controller. The per-process
+# controllers stay, but every request first takes a token from one bucket
+# whose state lives in Locks/yahoo_limiter.json, guarded by an OS file lock,
+# so the combined request rate is bounded. Throttled requests from any process
+# are counted in the same file; a burst of them opens the breaker and every
+# process pauses together (30s, 60s, 120s ... capped) instead of each one
+# hammering Yahoo into a lockout. The first success after a pause closes it.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.abspath(os.path.join(BASE_DIR, ".."))
+LIMITER_PATH = os.path.join(ROOT_DIR, "Locks", "yahoo_limiter.json")
+
+DEFAULT_RATE = 10.0        # requests per second, all processes combined
+DEFAULT_BURST = 20
+FAILURE_THRESHOLD = 8      # throttles within FAILURE_WINDOW seconds open the breaker
+FAILURE_WINDOW = 30.0
+
+if os.name == "nt":
+    import msvcrt
+
+    def _lock_file(f):
+        f.seek(0)
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                # LK_LOCK gives up after ~10s of contention; keep waiting
+                continue
+
+    def _unlock_file(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def _lock_file(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+    def _unlock_file(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class SharedLimiter:
+    def __init__(self, path=LIMITER_PATH, rate=DEFAULT_RATE, burst=DEFAULT_BURST,
+                 failure_threshold=FAILURE_THRESHOLD, failure_window=FAILURE_WINDOW, cooldown=(30, 900)):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.lock_path = path + ".lock"
+        self.rate = rate
+        self.burst = burst
+        self.failure_threshold = failure_threshold
+        self.failure_window = failure_window
+        self.cooldown = cooldown
+        self.waited = 0.0
+        self.trips = 0
+        self._thread_lock = threading.Lock()
+
+    @contextmanager
+    def _state(self):
+        # Threads of this process serialize here, processes on the file lock
+        with self._thread_lock, open(self.lock_path, "a+") as lock:
+            _lock_file(lock)
+            try:
+                try:
+                    with open(self.path, encoding="utf-8") as f:
+                        state = json.load(f)
+                except (OSError, ValueError):
+                    state = {}
+                state.setdefault('tokens', float(self.burst))
+                state.setdefault('updated', time.time())
+                state.setdefault('failures', [])
+                state.setdefault('open_until', 0.0)
+                state.setdefault('trips', 0)
+                yield state
+                with open(self.path, "w", encoding="utf-8") as f:
+                    json.dump(state, f)
+            finally:
+                _unlock_file(lock)
+
+    # Take n tokens if available (at most the burst at once); returns 0 on success, else seconds to wait
+    def try_acquire(self, n=1):
+        n = min(n, self.burst)
+        with self._state() as state:
+            now = time.time()
+            if state['open_until'] > now:
+                return state['open_until'] - now
+            state['tokens'] = min(self.burst, state['tokens'] + (now - state['updated']) * self.rate)
+            state['updated'] = now
+            if state['tokens'] >= n:
+                state['tokens'] -= n
+                return 0.0
+            return (n - state['tokens']) / self.rate
+
+    # Blocking variant for the synchronous history scripts. A batch costing more than the
+    # burst pays in installments of at most the burst, so every request is counted
+    def acquire(self, n=1):
+        while n > 0:
+            part = min(n, self.burst)
+            wait = self.try_acquire(part)
+            if wait <= 0:
+                n -= part
+                continue
+            self.waited += wait
+            time.sleep(wait)
+
+    async def aacquire(self, n=1):
+        while n > 0:
+            part = min(n, self.burst)
+            wait = self.try_acquire(part)
+            if wait <= 0:
+                n -= part
+                continue
+            self.waited += wait
+            await asyncio.sleep(wait)
+
+    # outcome is 'ok', 'error' or 'throttled' (same as AIMDController.record)
+    def record(self, outcome):
+        if outcome == 'error':
+            return
+        with self._state() as state:
+            now = time.time()
+            if outcome == 'ok':
+                if state['trips'] and state['open_until'] <= now:
+                    state['trips'] = 0
+                    state['failures'] = []
+                return
+
+            failures = [t for t in state['failures'] if now - t < self.failure_window] + [now]
+            state['failures'] = failures
+            if len(failures) >= self.failure_threshold and state['open_until'] <= now:
+                base, cap = self.cooldown
+                pause = min(cap, base * 2 ** state['trips'])
+                state['open_until'] = now + pause
+                state['trips'] += 1
+                state['failures'] = []
+                self.trips += 1
+                tqdm.write(f"🛑 Circuit breaker open: pausing all fetch processes for {pause:.0f}s")
+
+    def state(self):
+        with self._state() as state:
+            return {
+                'tokens': round(state['tokens'], 1),
+                'open_for': max(0.0, round(state['open_until'] - time.time(), 1)),
+                'recent_throttles': len(state['failures']),
+                'trips': state['trips'],
+            }
+
+    def stats(self):
+        return {'waited': round(self.waited, 1), 'trips': self.trips, **self.state()}
+
+
+_shared_limiter = None
+_shared_lock = threading.Lock()
+
+
+def shared_limiter():
+    global _shared_limiter
+    with _shared_lock:
+        if _shared_limiter is None:
+            _shared_limiter = SharedLimiter()
+        return _shared_limiter
@@ -0,0 +1,189 @@
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+
+import pandas as pd
+
+from publish import publish_csv, publish_parquet
+from workbook_backend import SCREENER_PATH, write_sheet
+
+# Where a run's output tables go.
+#
+# A script describes each table it produces once, as a Target (a name plus the
+# destinations it already has: the CSV it has always written, its data_ sheet),
+# and hands the frame to SINKS.publish(target, df). Which sinks receive it is
+# configuration, not code:
+#
+#   csv      publish_csv to target.csv (default Source Data/Outputs/<name>.csv)
+#   parquet  publish_parquet to target.parquet (default Source Data/Outputs/<name>.parquet)
+#   sqlite   table <name> in Source Data/Outputs/outputs.sqlite, swapped in whole
+#   xlsx     the target's sheet through workbook_backend (the Excel bridge, or
+#            straight into the .xlsm on a headless box)
+#   null     nothing; for timing the fetch and transform on their own
+#
+# Each script passes its usual sinks to open_sinks(); SCREENER_SINKS
+# (comma separated, e.g. "csv,parquet" or "null") overrides them for a run. The
+# sinks of one publish run concurrently, each in its own thread, and a failing
+# sink is reported without stopping the others. Run-completion flags (Flags/)
+# stay with the scripts: they mark the end of a run, not a table.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.abspath(os.path.join(BASE_DIR, ".."))
+OUTPUT_DIR = os.path.join(ROOT_DIR, "Source Data", "Outputs")
+SQLITE_PATH = os.path.join(OUTPUT_DIR, "outputs.sqlite")
+
+try:
+    import pyarrow  # noqa: F401
+    HAVE_PARQUET = True
+except ImportError:
+    HAVE_PARQUET = False
+
+
+# One output table and where its file / sheet destinations are
+class Target:
+    def __init__(self, name, csv=None, parquet=None, sheet=None, workbook=SCREENER_PATH, mode='bulk',
+                 key='Ticker', save=True, wait=False):
+        self.name = name
+        self.csv = csv
+        self.parquet = parquet
+        self.sheet = sheet
+        self.workbook = workbook
+        self.mode = mode
+        self.key = key
+        self.save = save
+        self.wait = wait
+
+
+class Sink:
+    kind = None
+
+    # Write df for target; returns whatever is worth reporting (None if the sink skipped it)
+    def write(self, target, df):
+        raise NotImplementedError
+
+
+class CsvSink(Sink):
+    kind = 'csv'
+
+    def write(self, target, df):
+        path = os.path.abspath(target.csv or os.path.join(OUTPUT_DIR, f"{target.name}.csv"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return publish_csv(df, path, index=False)
+
+
+class ParquetSink(Sink):
+    kind = 'parquet'
+
+    def write(self, target, df):
+        if not HAVE_PARQUET:
+            print(f"⚠️ Parquet sink skipped for {target.name}: pyarrow is not installed")
+            return None
+        path = os.path.abspath(target.parquet or os.path.join(OUTPUT_DIR, f"{target.name}.parquet"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return publish_parquet(_arrow_safe(df), path, index=False)
+
+
+class SqliteSink(Sink):
+    kind = 'sqlite'
+
+    def __init__(self, path=SQLITE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    # Loaded into a staging table, then swapped in one transaction: readers see the old table or the new one
+    def write(self, target, df):
+        staging = f"{target.name}__{os.getpid()}"
+        with closing(self._connect()) as conn:
+            try:
+                df.to_sql(staging, conn, if_exists='replace', index=False, chunksize=10_000)
+            except Exception:
+                conn.execute(f'DROP TABLE IF EXISTS "{staging}"')
+                raise
+            with conn:
+                conn.execute(f'DROP TABLE IF EXISTS "{target.name}"')
+                conn.execute(f'ALTER TABLE "{staging}" RENAME TO "{target.name}"')
+        return len(df)
+
+
+class XlsxSink(Sink):
+    kind = 'xlsx'
+
+    def write(self, target, df):
+        if not target.sheet:
+            return None
+        reply = write_sheet(target.sheet, df, mode=target.mode, workbook=target.workbook, save=target.save,
+                            wait=target.wait, key=target.key)
+        if not reply.get('ok'):
+            raise RuntimeError(reply.get('error'))
+        return reply
+
+
+class NullSink(Sink):
+    kind = 'null'
+
+    def write(self, target, df):
+        return len(df)
+
+
+SINK_TYPES = {cls.kind: cls for cls in (CsvSink, ParquetSink, SqliteSink, XlsxSink, NullSink)}
+
+
+# Object columns Arrow can't type (numbers mixed with text, as get_info returns) go over as text
+def _arrow_safe(df):
+    mixed = [c for c in df.columns if df[c].dtype == object
+             and pd.api.types.infer_dtype(df[c], skipna=True) in ('mixed', 'mixed-integer')]
+    if not mixed:
+        return df
+    df = df.copy()
+    for col in mixed:
+        df[col] = df[col].astype(str).where(df[col].notna(), None)
+    return df
+
+
+class Sinks:
+    def __init__(self, kinds):
+        unknown = [k for k in kinds if k not in SINK_TYPES]
+        if unknown:
+            raise ValueError(f"Unknown sink(s) {unknown}; expected some of {list(SINK_TYPES)}")
+        self.sinks = [SINK_TYPES[k]() for k in dict.fromkeys(kinds)]
+
+    @property
+    def kinds(self):
+        return [s.kind for s in self.sinks]
+
+    def _timed(self, sink, target, df):
+        start = time.perf_counter()
+        return sink.write(target, df), time.perf_counter() - start
+
+    # Fan df out to every sink at once; returns {kind: result}, with the exception for a sink that failed
+    def publish(self, target, df):
+        results = {}
+        if not self.sinks:
+            return results
+        with ThreadPoolExecutor(max_workers=len(self.sinks), thread_name_prefix="sink") as pool:
+            futures = {s.kind: pool.submit(self._timed, s, target, df) for s in self.sinks}
+        timings = []
+        for kind, future in futures.items():
+            try:
+                results[kind], elapsed = future.result()
+                timings.append(f"{kind} {elapsed:.2f}s")
+            except Exception as e:
+                results[kind] = e
+                print(f"⚠️ {kind} sink failed for {target.name}: {type(e).__name__}: {e}")
+        print(f"📦 {target.name}: {len(df):,} rows -> {', '.join(timings) or 'no sink'}")
+        return results
+
+
+# The script's usual sinks, unless SCREENER_SINKS names others for this run
+def open_sinks(default):
+    chosen = os.environ.get("SCREENER_SINKS", "").strip()
+    kinds = [k.strip().lower() for k in chosen.split(",") if k.strip()] if chosen else list(default)
+    return Sinks(kinds)
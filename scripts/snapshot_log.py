@@ -0,0 +1,252 @@
+import argparse
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+import pandas as pd
+
+from freshness import EST
+from symbol_table import shared_symbols
+
+# Versioned snapshots of whole quote tables (latest prices, previous closes).
+#
+# Every run of a price script records its full table here instead of copying
+# the previous file aside. A run is stored as the cells that changed since
+# the previous run (instrument ID, field, value), and every KEYFRAME_EVERY
+# runs -- or when a delta would be nearly as big -- as a full keyframe, so
+# reconstructing "as of run N" reads one keyframe plus at most a handful of
+# deltas. A quiet intraday refresh of 10k tickers costs a few hundred cells
+# instead of a full copy, which makes keeping every run cheap.
+#
+#   runs:   one row per recorded run (per log name), with its keyframe
+#   fields: field name -> number and kind (float / ts / text)
+#   cells:  (run, sid, fid, value); value NULL = became empty, fid 0 = row removed
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.abspath(os.path.join(BASE_DIR, ".."))
+SNAPSHOT_PATH = os.path.join(ROOT_DIR, "Source Data", "price_snapshots.sqlite")
+
+KEYFRAME_EVERY = 48
+KEYFRAME_RATIO = 0.5       # a delta above this fraction of the table becomes a keyframe
+REMOVED = 0
+
+
+def _kind(values):
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return 'ts'
+    if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+        return 'float'
+    return 'text'
+
+
+# Column -> (storage values as an object array, null mask)
+def _encode(values, kind):
+    if kind == 'ts':
+        values = pd.Series(values)
+        if values.dt.tz is None:
+            values = values.dt.tz_localize(EST, ambiguous='NaT', nonexistent='NaT')
+        null = values.isna().to_numpy()
+        stored = values.dt.as_unit('ns').array.asi8.astype(object)
+    elif kind == 'float':
+        values = pd.to_numeric(pd.Series(values), errors='coerce').astype('float64')
+        null = values.isna().to_numpy()
+        stored = values.to_numpy().astype(object)
+    else:
+        values = pd.Series(values).astype(object)
+        null = values.isna().to_numpy()
+        stored = values.astype(str).to_numpy().astype(object)
+    stored[null] = None
+    return stored, null
+
+
+def _decode(values, kind):
+    if kind == 'ts':
+        return pd.to_datetime(pd.Series(values, dtype='Int64'), unit='ns', utc=True).dt.tz_convert(EST)
+    if kind == 'float':
+        return pd.to_numeric(values, errors='coerce').astype('float64')
+    return values.astype(object).where(values.notna(), None)
+
+
+class SnapshotLog:
+    def __init__(self, name, path=SNAPSHOT_PATH, keyframe_every=KEYFRAME_EVERY):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.name = name
+        self.path = path
+        self.keyframe_every = keyframe_every
+        with closing(self._connect()) as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS runs (run INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, "
+                         "seq INTEGER NOT NULL, taken INTEGER NOT NULL, keyframe INTEGER NOT NULL, rows INTEGER, cells INTEGER)")
+            conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS runs_name_seq ON runs (name, seq)")
+            conn.execute("CREATE TABLE IF NOT EXISTS fields (fid INTEGER PRIMARY KEY, name TEXT NOT NULL, "
+                         "field TEXT NOT NULL, kind TEXT NOT NULL, UNIQUE (name, field))")
+            conn.execute("CREATE TABLE IF NOT EXISTS cells (run INTEGER NOT NULL, sid INTEGER NOT NULL, fid INTEGER NOT NULL, "
+                         "value, PRIMARY KEY (run, sid, fid)) WITHOUT ROWID")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def __len__(self):
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM runs WHERE name = ?", (self.name,)).fetchone()[0]
+
+    def _fields(self, conn):
+        rows = conn.execute("SELECT fid, field, kind FROM fields WHERE name = ?", (self.name,)).fetchall()
+        return {field: (fid, kind) for fid, field, kind in rows}
+
+    def runs(self):
+        with closing(self._connect()) as conn, conn:
+            rows = conn.execute("SELECT seq, run, taken, keyframe, rows, cells FROM runs WHERE name = ? ORDER BY seq",
+                                (self.name,)).fetchall()
+        df = pd.DataFrame(rows, columns=['Seq', 'Run', 'Taken', 'Keyframe', 'Rows', 'Cells'])
+        df['Taken'] = pd.to_datetime(df['Taken'], unit='ns', utc=True).dt.tz_convert(EST)
+        df['Keyframe'] = df['Keyframe'] == df['Run']
+        return df
+
+    # seq >= 0 counts from the first run, negative from the latest (-1 = latest);
+    # at (a timestamp) picks the last run taken at or before it
+    def _resolve(self, conn, seq=None, at=None):
+        if at is not None:
+            at = pd.Timestamp(at)
+            at = at.tz_localize(EST) if at.tzinfo is None else at
+            row = conn.execute("SELECT run, keyframe FROM runs WHERE name = ? AND taken <= ? ORDER BY seq DESC LIMIT 1",
+                               (self.name, int(at.value))).fetchone()
+        elif seq is None or seq < 0:
+            offset = 0 if seq is None else -seq - 1
+            row = conn.execute("SELECT run, keyframe FROM runs WHERE name = ? ORDER BY seq DESC LIMIT 1 OFFSET ?",
+                               (self.name, offset)).fetchone()
+        else:
+            row = conn.execute("SELECT run, keyframe FROM runs WHERE name = ? AND seq = ?", (self.name, seq)).fetchone()
+        return row
+
+    # Encoded state (sid index, fid columns, storage values) as of a run
+    def _state(self, conn, run, keyframe):
+        cells = pd.DataFrame(
+            conn.execute("SELECT c.run, c.sid, c.fid, c.value FROM cells c JOIN runs r ON r.run = c.run "
+                         "WHERE r.name = ? AND c.run BETWEEN ? AND ? ORDER BY c.run", (self.name, keyframe, run)).fetchall(),
+            columns=['run', 'sid', 'fid', 'value'])
+        if cells.empty:
+            return pd.DataFrame(index=pd.Index([], name='sid', dtype='int64'))
+        # A removal drops everything the row had before it
+        removed = cells[cells['fid'] == REMOVED].groupby('sid')['run'].max()
+        if not removed.empty:
+            cutoff = cells['sid'].map(removed)
+            cells = cells[cutoff.isna() | (cells['run'] > cutoff)]
+        cells = cells.drop_duplicates(['sid', 'fid'], keep='last')
+        return cells.pivot(index='sid', columns='fid', values='value')
+
+    # The table as it was after a run: as_of() latest, as_of(-2) the run before, as_of(0) the first,
+    # as_of(at='2025-09-15 10:30') the last run at or before that time
+    def as_of(self, seq=None, at=None, key='Ticker'):
+        with closing(self._connect()) as conn, conn:
+            row = self._resolve(conn, seq, at)
+            if row is None:
+                return None
+            state = self._state(conn, *row)
+            fields = self._fields(conn)
+        out = {key: shared_symbols().tickers(state.index)}
+        for field, (fid, kind) in fields.items():
+            if fid in state.columns:
+                out[field] = _decode(state[fid].reset_index(drop=True), kind).to_numpy()
+        return pd.DataFrame(out).sort_values(key, ignore_index=True)
+
+    # Record a full table as the next run; returns (seq, cells written, keyframe?)
+    def record(self, df, key='Ticker', taken=None):
+        taken = pd.Timestamp.now(tz=EST) if taken is None else pd.Timestamp(taken)
+        df = df.dropna(subset=[key]).drop_duplicates(subset=key, keep='last')
+        sids = shared_symbols().assign(df[key])
+
+        with closing(self._connect()) as conn, conn:
+            conn.execute("BEGIN IMMEDIATE")
+            fields = self._fields(conn)
+            for col in df.columns.drop(key):
+                if col not in fields:
+                    kind = _kind(df[col])
+                    fid = conn.execute("INSERT INTO fields (name, field, kind) VALUES (?, ?, ?)",
+                                       (self.name, col, kind)).lastrowid
+                    fields[col] = (fid, kind)
+
+            last = self._resolve(conn)
+            seq = 0 if last is None else conn.execute("SELECT seq FROM runs WHERE run = ?", (last[0],)).fetchone()[0] + 1
+            previous = self._state(conn, *last) if last is not None else None
+            full = previous is None or seq % self.keyframe_every == 0
+
+            cells = self._diff(df.drop(columns=key), sids, fields, None if full else previous)
+            if not full and len(cells) > KEYFRAME_RATIO * max(1, df.size):
+                full = True
+                cells = self._diff(df.drop(columns=key), sids, fields, None)
+
+            cur = conn.execute("INSERT INTO runs (name, seq, taken, keyframe, rows, cells) VALUES (?, ?, ?, 0, ?, ?)",
+                               (self.name, seq, int(taken.value), len(df), len(cells)))
+            run = cur.lastrowid
+            keyframe = run if full else last[1]
+            conn.execute("UPDATE runs SET keyframe = ? WHERE run = ?", (keyframe, run))
+            conn.executemany("INSERT INTO cells (run, sid, fid, value) VALUES (?, ?, ?, ?)",
+                             ((run, s, f, v) for s, f, v in cells))
+        return seq, len(cells), full
+
+    # (sid, fid, value) cells to write: every non-null cell for a keyframe, else only what changed
+    def _diff(self, df, sids, fields, previous):
+        cells = []
+        for col in df.columns:
+            fid, kind = fields[col]
+            stored, null = _encode(df[col].to_numpy() if kind != 'ts' else df[col], kind)
+            if previous is None:
+                keep = ~null
+            else:
+                before = previous[fid] if fid in previous.columns else pd.Series(dtype=object)
+                before = before.reindex(sids).to_numpy()
+                was_null = pd.isna(before)
+                same = (null & was_null) | (~null & ~was_null & (stored == before))
+                keep = ~same
+            cells.extend(zip(sids[keep].tolist(), [fid] * int(keep.sum()), stored[keep].tolist()))
+        if previous is not None:
+            gone = previous.index.difference(pd.Index(sids))
+            cells.extend((int(s), REMOVED, None) for s in gone)
+        return cells
+
+    # First run of a script: the table it is about to replace becomes run 0
+    def seed(self, df, key='Ticker'):
+        if len(self) or df is None or df.empty:
+            return False
+        self.record(df, key=key)
+        return True
+
+    # Drop runs older than the keyframe that reconstructs `keep_days` ago
+    def prune(self, keep_days=30):
+        cutoff = pd.Timestamp.now(tz=EST) - pd.Timedelta(days=keep_days)
+        with closing(self._connect()) as conn, conn:
+            row = self._resolve(conn, at=cutoff)
+            if row is None:
+                return 0
+            old = [r[0] for r in conn.execute("SELECT run FROM runs WHERE name = ? AND run < ?", (self.name, row[1]))]
+            conn.executemany("DELETE FROM cells WHERE run = ?", ((r,) for r in old))
+            conn.executemany("DELETE FROM runs WHERE run = ?", ((r,) for r in old))
+        return len(old)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or export price snapshots")
+    parser.add_argument('name', help='Snapshot log name (latest_prices, previous_close_prices)')
+    parser.add_argument('--as-of', type=int, default=None, help='Run to rebuild: 0 = first, -1 = latest, -2 = the one before')
+    parser.add_argument('--at', default=None, help='Rebuild the last run taken at or before this time')
+    parser.add_argument('--out', default=None, help='Write the rebuilt table to this CSV')
+    parser.add_argument('--prune', type=int, default=None, help='Drop runs older than this many days')
+    args = parser.parse_args()
+
+    log = SnapshotLog(args.name)
+    if args.prune is not None:
+        print(f"🧹 Pruned {log.prune(args.prune)} runs")
+    runs = log.runs()
+    print(f"🗃️ {len(runs)} runs, {int(runs['Keyframe'].sum())} keyframes, {int(runs['Cells'].sum())} cells stored")
+    if args.out:
+        start = time.time()
+        table = log.as_of(args.as_of, at=args.at)
+        if table is None:
+            print("No matching run")
+        else:
+            table.to_csv(args.out, index=False)
+            print(f"✅ Wrote {len(table)} rows to {args.out} in {time.time() - start:.2f}s")
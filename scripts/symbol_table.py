@@ -0,0 +1,161 @@
+import json
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Persistent ticker -> integer instrument ID table.
+#
+# Source Data/symbols.sqlite assigns every ticker a stable int64 once and never
+# changes it, so IDs can key stores and joins across runs. Tickers with an SEC
+# CIK get CIK * 1000 + n (share classes of one filer, e.g. BRK-A / BRK-B, stay
+# adjacent), everything else (crypto, indices, funds, private names) 10**13 + n.
+# Lookups go through a hash index held in memory: encoding a 100k-ticker column
+# is one vectorized get_indexer call, and membership tests are set lookups
+# instead of scans over lists or arrays. New tickers are assigned inside an
+# IMMEDIATE transaction, so concurrent scripts never hand out the same ID.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.abspath(os.path.join(BASE_DIR, ".."))
+SYMBOLS_PATH = os.path.join(ROOT_DIR, "Source Data", "symbols.sqlite")
+SEC_JSON_PATH = os.path.join(ROOT_DIR, "Source Data", "company_tickers.json")
+
+CIK_SCALE = 1000
+NO_CIK_BASE = 10 ** 13
+UNKNOWN = -1
+
+
+def _cik_number(cik):
+    try:
+        cik = int(float(cik))
+    except (TypeError, ValueError):
+        return None
+    return cik if 0 < cik < NO_CIK_BASE // CIK_SCALE else None
+
+
+class SymbolTable:
+    def __init__(self, path=SYMBOLS_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        conn = self._connect()
+        try:
+            conn.execute("CREATE TABLE IF NOT EXISTS symbols (id INTEGER PRIMARY KEY, ticker TEXT NOT NULL UNIQUE, cik TEXT)")
+        finally:
+            conn.close()
+        self._reload()
+        if path == SYMBOLS_PATH and not self._ids:
+            self._seed()
+
+    # First run: SEC tickers take their CIK-based IDs before anything else claims them
+    def _seed(self):
+        if not os.path.exists(SEC_JSON_PATH):
+            return
+        with open(SEC_JSON_PATH, encoding="utf-8") as f:
+            companies = list(json.load(f).values())
+        self.assign([c.get('ticker') for c in companies], [c.get('cik_str') for c in companies])
+        print(f"🔢 Seeded symbol table with {len(self)} SEC tickers")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _reload(self, conn=None):
+        owned = conn is None
+        conn = conn or self._connect()
+        try:
+            rows = conn.execute("SELECT ticker, id FROM symbols ORDER BY id").fetchall()
+        finally:
+            if owned:
+                conn.close()
+        self._set_rows(rows)
+
+    def _set_rows(self, rows):
+        self._ids = dict(rows)
+        self._index = pd.Index([t for t, _ in rows], dtype=object)
+        self._id_array = np.array([i for _, i in rows], dtype=np.int64)
+        self._tickers = {i: t for t, i in rows}
+
+    # Next free slot per CIK block and in the no-CIK range
+    def _next_ids(self):
+        ids = self._id_array
+        with_cik = ids[ids < NO_CIK_BASE]
+        next_seq = {}
+        for cik, seq in zip(with_cik // CIK_SCALE, with_cik % CIK_SCALE):
+            next_seq[int(cik)] = max(next_seq.get(int(cik), 0), int(seq) + 1)
+        no_cik = ids[ids >= NO_CIK_BASE]
+        return next_seq, int(no_cik.max() - NO_CIK_BASE + 1) if len(no_cik) else 0
+
+    # IDs for tickers (array aligned with the input), assigning new ones where needed
+    def assign(self, tickers, ciks=None):
+        tickers = pd.Series(tickers, dtype=object).reset_index(drop=True)
+        ciks = pd.Series([None] * len(tickers) if ciks is None else ciks, dtype=object).reset_index(drop=True)
+        new = tickers.notna() & ~tickers.isin(self._index)
+        if new.any():
+            with self._lock:
+                conn = self._connect()
+                try:
+                    conn.execute("BEGIN IMMEDIATE")
+                    # Another process may have assigned some of them meanwhile
+                    self._reload(conn)
+                    next_seq, next_free = self._next_ids()
+                    rows = []
+                    for ticker, cik in zip(tickers[new], ciks[new]):
+                        if ticker in self._ids:
+                            continue
+                        number = _cik_number(cik)
+                        if number is not None and next_seq.get(number, 0) < CIK_SCALE:
+                            seq = next_seq.get(number, 0)
+                            next_seq[number] = seq + 1
+                            sid = number * CIK_SCALE + seq
+                        else:
+                            sid = NO_CIK_BASE + next_free
+                            next_free += 1
+                        self._ids[ticker] = sid
+                        rows.append((sid, ticker, None if number is None else str(number).zfill(10)))
+                    conn.executemany("INSERT INTO symbols (id, ticker, cik) VALUES (?, ?, ?)", rows)
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+                finally:
+                    conn.close()
+                self._set_rows(sorted(self._ids.items(), key=lambda r: r[1]))
+        return self.ids(tickers)
+
+    # IDs for known tickers, UNKNOWN (-1) elsewhere; never writes
+    def ids(self, tickers):
+        pos = self._index.get_indexer(pd.Index(tickers, dtype=object))
+        if not len(self._id_array):
+            return np.full(len(pos), UNKNOWN, dtype=np.int64)
+        return np.where(pos >= 0, self._id_array[pos], UNKNOWN)
+
+    def id(self, ticker):
+        return self._ids.get(ticker, UNKNOWN)
+
+    def ticker(self, sid):
+        return self._tickers.get(sid)
+
+    def tickers(self, ids):
+        return [self._tickers.get(int(i)) for i in ids]
+
+    def __contains__(self, ticker):
+        return ticker in self._ids
+
+    def __len__(self):
+        return len(self._ids)
+
+
+_shared_symbols = None
+_shared_lock = threading.Lock()
+
+
+def shared_symbols():
+    global _shared_symbols
+    with _shared_lock:
+        if _shared_symbols is None:
+            _shared_symbols = SymbolTable()
+        return _shared_symbols
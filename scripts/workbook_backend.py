@@ -0,0 +1,150 @@
+import argparse
+import importlib.util
+import os
+import re
+import sys
+import threading
+import time
+
+from excel_writer import excel_values
+from publish import atomic_path
+from shared_limiter import _lock_file, _unlock_file
+
+# Where the data_* sheets go: a live Excel, or straight into the .xlsm file.
+#
+#   excel  the Excel bridge (excel_bridge.submit): the open workbook is updated
+#          in place, delta writes for the price sheets. Needs Windows + xlwings.
+#   xlsx   headless: openpyxl loads the .xlsm with keep_vba=True (the VBA project
+#          and the macro-enabled content type are carried over untouched),
+#          replaces the sheet's cells with the frame and publishes the package
+#          atomically (publish.atomic_path, so the .gen counter moves too). No
+#          Excel involved, so this is what the Linux servers use to hand out a
+#          ready workbook. Formulas elsewhere recalculate when Excel next opens
+#          it; openpyxl drops charts and images, keep those off the data_ sheets'
+#          workbook if it is published this way.
+#
+# SCREENER_BACKEND picks one; unset, it's excel on Windows when xlwings is
+# installed and xlsx everywhere else. write_sheet() takes the same arguments as
+# submit() and answers like the bridge does ({'ok': ..., 'rows': ..., ...}).
+#
+#   python workbook_backend.py                               which backend this machine uses
+#   python workbook_backend.py data_FullMetrics "Source Data/full_metrics.csv"
+#                                                            load a published file into a sheet
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.abspath(os.path.join(BASE_DIR, ".."))
+SCREENER_PATH = os.path.join(ROOT_DIR, "Screener.xlsm")
+LOCK_DIR = os.path.join(ROOT_DIR, "Locks")
+
+BACKENDS = ('excel', 'xlsx')
+
+# Control characters openpyxl refuses to store (they do turn up in company names)
+ILLEGAL_CHARACTERS = re.compile(r"[\000-\010]|[\013-\014]|[\016-\037]")
+
+_thread_lock = threading.Lock()
+
+
+def default_backend():
+    chosen = os.environ.get("SCREENER_BACKEND", "").strip().lower()
+    if chosen in BACKENDS:
+        return chosen
+    if chosen:
+        print(f"⚠️ Unknown SCREENER_BACKEND {chosen!r}; expected one of {BACKENDS}")
+    if os.name == "nt" and importlib.util.find_spec("xlwings") is not None:
+        return 'excel'
+    return 'xlsx'
+
+
+BACKEND = default_backend()
+
+
+def _cell_value(value):
+    if isinstance(value, str):
+        return ILLEGAL_CHARACTERS.sub("", value)
+    return value
+
+
+# ---- Headless: openpyxl into the .xlsm package ----
+def _fill_sheet(ws, df):
+    # Overwrite in place rather than recreating the sheet, so its code name (which the
+    # VBA project refers to), column widths and formats survive
+    old_rows, old_cols = ws.max_row, ws.max_column
+    rows, cols = len(df) + 1, df.shape[1]
+    for j, name in enumerate(df.columns, start=1):
+        ws.cell(row=1, column=j).value = str(name)
+    for i, row in enumerate(excel_values(df).tolist(), start=2):
+        for j, value in enumerate(row, start=1):
+            ws.cell(row=i, column=j).value = _cell_value(value)
+    # Then drop whatever the previous, larger table left below and to the right
+    # (emptied cells would still be saved, keeping the old used range)
+    if old_rows > rows:
+        ws.delete_rows(rows + 1, old_rows - rows)
+    if old_cols > cols:
+        ws.delete_cols(cols + 1, old_cols - cols)
+
+
+# {sheet: frame} into the workbook file in one load / save; returns seconds taken
+def write_xlsx(path, sheets):
+    from openpyxl import load_workbook
+
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No workbook at {path} (the headless backend fills an existing .xlsm)")
+    os.makedirs(LOCK_DIR, exist_ok=True)
+    lock_path = os.path.join(LOCK_DIR, f"workbook_{os.path.basename(path)}.lock")
+    start = time.perf_counter()
+    # Every writer loads, edits and saves the whole package: serialize them, or two
+    # scripts writing different sheets would each save over the other's sheet
+    with _thread_lock, open(lock_path, "a+") as lock:
+        _lock_file(lock)
+        try:
+            wb = load_workbook(path, keep_vba=True, keep_links=True)
+            for sheet, df in sheets.items():
+                ws = wb[sheet] if sheet in wb.sheetnames else wb.create_sheet(sheet)
+                _fill_sheet(ws, df)
+            with atomic_path(path) as tmp:
+                wb.save(tmp)
+        finally:
+            _unlock_file(lock)
+    return time.perf_counter() - start
+
+
+# Same signature as excel_bridge.submit; save / wait / key only matter to the Excel backend
+def write_sheet(sheet, df, mode='bulk', workbook=SCREENER_PATH, save=False, wait=False, key='Ticker', backend=None):
+    backend = backend or BACKEND
+    if backend == 'excel':
+        from excel_bridge import submit
+        reply = submit(sheet, df, mode=mode, workbook=workbook, save=save, wait=wait, key=key)
+        if reply.get('queued'):
+            print(f"📤 Queued {len(df):,} rows for {sheet}")
+        return reply
+    try:
+        elapsed = write_xlsx(os.path.abspath(workbook), {sheet: df})
+    except Exception as e:
+        print(f"❌ {sheet}: headless workbook write failed: {type(e).__name__}: {e}")
+        return {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+    print(f"📗 {sheet}: {len(df):,} rows written into {os.path.basename(workbook)} in {elapsed:.2f}s")
+    # The file has no notion of a previous push, so every write is a full one
+    return {'ok': True, 'rows': len(df), 'cells': int(df.size), 'writes': 1, 'full': True}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write data_* sheets through the configured workbook backend")
+    parser.add_argument('sheet', nargs='?', help='Sheet to fill, e.g. data_FullMetrics')
+    parser.add_argument('source', nargs='?', help='CSV or Parquet file to load into it')
+    parser.add_argument('--workbook', default=SCREENER_PATH, help='Workbook to write (default: Screener.xlsm)')
+    parser.add_argument('--backend', choices=BACKENDS, help='Override SCREENER_BACKEND for this run')
+    args = parser.parse_args()
+
+    if not args.sheet:
+        print(f"Workbook backend: {args.backend or BACKEND}")
+        sys.exit(0)
+    if not args.source:
+        parser.error("a source file is needed to fill a sheet")
+
+    import pandas as pd
+    if args.source.endswith(".parquet"):
+        frame = pd.read_parquet(args.source)
+    else:
+        frame = pd.read_csv(args.source, encoding="utf-8-sig", low_memory=False)
+    reply = write_sheet(args.sheet, frame, workbook=args.workbook, save=True, wait=True, backend=args.backend)
+    sys.exit(0 if reply.get('ok') else 1)